@@ -0,0 +1,38 @@
+class AnswerIndex:
+    """Inverted index from normalized answer token to the live riddles using it.
+
+    A guess is checked against every open riddle in a channel with one dict
+    lookup per guess token, instead of scanning each riddle's answer.
+    """
+
+    def __init__(self):
+        self.postings = {}  # token -> set of riddle_ids
+        self.tokens = {}    # riddle_id -> frozenset of its tokens, for removal
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def add(self, riddle_id, answer_tokens):
+        tokens = frozenset(answer_tokens)
+        self.remove(riddle_id)
+        self.tokens[riddle_id] = tokens
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(riddle_id)
+
+    def remove(self, riddle_id):
+        for token in self.tokens.pop(riddle_id, ()):
+            ids = self.postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(riddle_id)
+            if not ids:
+                del self.postings[token]
+
+    def match(self, guess_tokens):
+        """Riddle ids whose answer shares at least one token with the guess."""
+        matched = set()
+        for token in set(guess_tokens):
+            ids = self.postings.get(token)
+            if ids:
+                matched |= ids
+        return matched
@@ -0,0 +1,227 @@
+import argparse
+import asyncio
+import glob
+import gzip
+import os
+import shutil
+import tarfile
+import tempfile
+from datetime import datetime, timezone
+
+import db
+
+
+# Table -> columns that are exported and restored. Generated columns such as
+# search_vector are left out; Postgres rebuilds them on insert.
+EXPORT_TABLES = {
+    "user_submitted_questions": (
+        "riddle_id", "user_id", "question", "answer", "created_at", "posted_at",
+        "posted_channel_id", "revealed_at", "closes_at",
+    ),
+    "users": ("user_id", "score", "streak", "created_at"),
+    "score_events": ("event_id", "user_id", "score_delta", "streak_delta", "reset_streak", "reason", "created_at", "compacted"),
+    "leaderboard_snapshots": ("snapshot_date", "user_id", "score", "streak", "rank"),
+    "riddle_stats": (
+        "riddle_id", "kind", "posted_at", "revealed_at", "participants", "guesses", "solvers",
+        "solver_attempts", "first_solve_seconds", "solve_seconds_total", "solve_histogram",
+    ),
+    "round_participants": ("riddle_id", "user_id", "solved_at", "penalized_at"),
+    "job_schedules": ("guild_id", "job", "run_time", "timezone", "channel_id"),
+    "job_runs": ("guild_id", "job", "run_date", "started_at", "finished_at"),
+    "bot_state": ("key", "value", "updated_at"),
+}
+
+# Each table's primary key, which orders the export and splits it into chunks
+EXPORT_KEYS = {
+    "user_submitted_questions": ("riddle_id",),
+    "users": ("user_id",),
+    "score_events": ("event_id",),
+    "leaderboard_snapshots": ("snapshot_date", "user_id"),
+    "riddle_stats": ("riddle_id",),
+    "round_participants": ("riddle_id", "user_id"),
+    "job_schedules": ("guild_id", "job"),
+    "job_runs": ("guild_id", "job", "run_date"),
+    "bot_state": ("key",),
+}
+
+# Rows per exported file, so no single file (or restore transaction's
+# staging table) grows with the table
+CHUNK_ROWS = int(os.getenv("BACKUP_CHUNK_ROWS") or 100000)
+
+# Sequences to move past restored ids so new inserts don't collide
+SERIAL_COLUMNS = {
+    "user_submitted_questions": "riddle_id",
+    "score_events": "event_id",
+}
+
+
+async def export_table(conn, table, directory, chunk_rows=CHUNK_ROWS):
+    """Stream one table into gzipped CSV files of at most chunk_rows rows,
+    {table}.0000.csv.gz onwards. Memory use is one COPY chunk."""
+    columns = ", ".join(EXPORT_TABLES[table])
+    key = ", ".join(EXPORT_KEYS[table])
+    # The first key of every chunk, from one pass over the primary key index
+    starts = await conn.fetch(f"""
+        SELECT {key} FROM (
+            SELECT {key}, ROW_NUMBER() OVER (ORDER BY {key}) AS n FROM {table}
+        ) numbered
+        WHERE (n - 1) % $1 = 0
+        ORDER BY {key}
+    """, chunk_rows)
+    placeholders = ", ".join(f"${i}" for i in range(1, len(EXPORT_KEYS[table]) + 1))
+    paths = []
+    # An empty table still gets a file, so restore can tell it was exported
+    for i, start in enumerate(starts or [None]):
+        if start is None:
+            where, args = "TRUE", ()
+        else:
+            where, args = f"({key}) >= ({placeholders})", tuple(start)
+        path = os.path.join(directory, f"{table}.{i:04d}.csv.gz")
+        with gzip.open(path, "wb") as out:
+            # Given a file object, asyncpg does each write (and so the gzip
+            # compression) in an executor thread, off the event loop
+            await conn.copy_from_query(
+                f"SELECT {columns} FROM {table} WHERE {where} ORDER BY {key} LIMIT {chunk_rows}",
+                *args,
+                output=out,
+                format="csv",
+                header=True,
+            )
+        paths.append(path)
+    print(f"[backup] Exported {table} -> {len(paths)} file(s) in {directory}")
+    return paths
+
+
+async def export_all(directory, tables=None):
+    if db.db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    os.makedirs(directory, exist_ok=True)
+    if db.backend is not None:
+        # Embedded backends copy the whole database file in one go
+        return [await db.backend.backup_to(directory)]
+    paths = []
+    async with db.db_pool.acquire() as conn:
+        # One snapshot across all tables so the files agree with each other
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            for table in tables or EXPORT_TABLES:
+                paths += await export_table(conn, table, directory)
+    return paths
+
+
+def bundle(paths, archive_path):
+    # Members are already gzipped, so the tar itself is stored uncompressed
+    with tarfile.open(archive_path, "w") as tar:
+        for path in paths:
+            tar.add(path, arcname=os.path.basename(path))
+    return archive_path
+
+
+def table_files(directory, table):
+    """A table's export files in order; {table}.csv.gz is the older single-file layout."""
+    paths = sorted(glob.glob(os.path.join(glob.escape(directory), f"{table}.[0-9][0-9][0-9][0-9].csv.gz")))
+    single = os.path.join(directory, f"{table}.csv.gz")
+    return paths or ([single] if os.path.exists(single) else [])
+
+
+def unpack(archive_path, directory):
+    """Extract the CSV files of an /exportdata archive into directory."""
+    with tarfile.open(archive_path) as tar:
+        for member in tar.getmembers():
+            name = os.path.basename(member.name)
+            if not member.isfile() or not name.endswith(".csv.gz"):
+                continue
+            with tar.extractfile(member) as source, open(os.path.join(directory, name), "wb") as out:
+                shutil.copyfileobj(source, out)
+    return directory
+
+
+async def restore_table(conn, table, paths):
+    """Stream a table's gzipped CSV files back in through a staging table; existing rows win."""
+    columns = EXPORT_TABLES[table]
+    column_list = ", ".join(columns)
+    async with conn.transaction():
+        await conn.execute(
+            f"CREATE TEMP TABLE restore_stage ON COMMIT DROP AS SELECT {column_list} FROM {table} WITH NO DATA"
+        )
+        for path in paths:
+            with gzip.open(path, "rb") as source:
+                await conn.copy_to_table(
+                    "restore_stage", source=source, columns=columns, format="csv", header=True
+                )
+        result = await conn.execute(
+            f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM restore_stage ON CONFLICT DO NOTHING"
+        )
+        serial = SERIAL_COLUMNS.get(table)
+        if serial:
+            sequence = await conn.fetchval("SELECT pg_get_serial_sequence($1, $2)", table, serial)
+            sequence = sequence or f"{table}_{serial}_seq"
+            await conn.execute(
+                f"SELECT setval($1, GREATEST((SELECT COALESCE(MAX({serial}), 0) FROM {table}), 1))",
+                sequence
+            )
+    print(f"[backup] Restored {table} from {len(paths)} file(s): {result}")
+    return int(result.split()[-1])
+
+
+async def restore_all(source, tables=None):
+    """Restore from an export directory or the tar archive /exportdata sends."""
+    if db.db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    if db.backend is not None:
+        raise RuntimeError(f"Restore a {db.backend.name} database by putting the backup file in place of the live one.")
+    workdir = None
+    if os.path.isfile(source):
+        workdir = tempfile.mkdtemp(prefix="riddle-restore-")
+        directory = await asyncio.to_thread(unpack, source, workdir)
+    else:
+        directory = source
+    restored = {}
+    try:
+        async with db.db_pool.acquire() as conn:
+            for table in tables or EXPORT_TABLES:
+                paths = table_files(directory, table)
+                if not paths:
+                    print(f"[backup] ⚠️ No export for {table} in {source}, skipping")
+                    continue
+                restored[table] = await restore_table(conn, table, paths)
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return restored
+
+
+def default_export_dir():
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    return os.path.join(os.getenv("BACKUP_DIR") or "backups", stamp)
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or restore Riddle of the Day data")
+    sub = parser.add_subparsers(dest="action", required=True)
+    export_cmd = sub.add_parser("export", help="Stream tables to gzipped CSV files")
+    export_cmd.add_argument("directory", nargs="?", default=None)
+    export_cmd.add_argument("--table", action="append", choices=list(EXPORT_TABLES))
+    restore_cmd = sub.add_parser("restore", help="Load gzipped CSV files back in")
+    restore_cmd.add_argument("source", help="Export directory or /exportdata archive")
+    restore_cmd.add_argument("--table", action="append", choices=list(EXPORT_TABLES))
+    args = parser.parse_args(argv)
+
+    if not os.getenv("DATABASE_URL"):
+        print("ERROR: DATABASE_URL is not set.")
+        raise SystemExit(1)
+
+    await db.create_db_pool()
+    try:
+        if args.action == "export":
+            directory = args.directory or default_export_dir()
+            paths = await export_all(directory, args.table)
+            print(f"✅ Exported {len(paths)} table(s) to {directory}")
+        else:
+            restored = await restore_all(args.source, args.table)
+            print(f"✅ Restored {sum(restored.values())} row(s) across {len(restored)} table(s)")
+    finally:
+        await db.close_db_pools()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
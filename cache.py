@@ -0,0 +1,53 @@
+# In-process caches for data the hot paths read on every guess or command.
+# Warmed at startup (see main.warm_caches) and kept current by the db
+# functions that write the underlying rows.
+
+scores = {}  # user_id (int) -> [score, streak]
+scores_loaded = False
+unused_riddle_count = None
+
+
+def load_scores(all_data):
+    """Replace the score cache from db.get_all_scores_and_streaks() output."""
+    global scores_loaded
+    scores.clear()
+    for user_id, data in all_data.items():
+        scores[int(user_id)] = [data["score"] or 0, data["streak"] or 0]
+    scores_loaded = True
+
+
+def apply_score_event(user_id, score_delta=0, streak_delta=0, reset_streak=False):
+    """Mirror a score_events row onto the cache, same rules as compaction."""
+    if not scores_loaded:
+        return
+    entry = scores.setdefault(int(user_id), [0, 0])
+    entry[0] = max(entry[0] + score_delta, 0)
+    entry[1] = max((0 if reset_streak else entry[1]) + streak_delta, 0)
+
+
+def get_score(user_id):
+    """Cached score, or None if the cache can't answer."""
+    if not scores_loaded:
+        return None
+    entry = scores.get(int(user_id))
+    return entry[0] if entry else 0
+
+
+def get_streak(user_id):
+    if not scores_loaded:
+        return None
+    entry = scores.get(int(user_id))
+    return entry[1] if entry else 0
+
+
+def get_max_total():
+    """Highest cached score + streak, or None if the cache can't answer."""
+    if not scores_loaded:
+        return None
+    return max((score + streak for score, streak in scores.values()), default=0)
+
+
+def invalidate_scores():
+    global scores_loaded
+    scores.clear()
+    scores_loaded = False
@@ -0,0 +1,53 @@
+import hashlib
+import json
+import os
+
+import db
+
+
+def command_tree_hash(tree, guild=None):
+    """Stable hash of the command payloads tree.sync() would upload."""
+    payload = []
+    for command in tree.get_commands(guild=guild):
+        try:
+            payload.append(command.to_dict(tree))
+        except TypeError:
+            # discord.py < 2.4 takes no tree argument
+            payload.append(command.to_dict())
+    payload.sort(key=lambda c: (c.get("type", 1), c["name"]))
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+async def sync_commands_if_changed(tree, client):
+    """Call tree.sync() only when the command definitions changed since the last sync.
+
+    The hash is stored per application id, so pointing a different bot token
+    at the same database still syncs. Set FORCE_COMMAND_SYNC=1 to always sync.
+    """
+    key = f"command_tree_hash:{client.application_id}"
+    current = command_tree_hash(tree)
+
+    force = (os.getenv("FORCE_COMMAND_SYNC") or "").lower() in ("1", "true", "yes")
+    try:
+        stored = await db.get_bot_state(key)
+    except Exception as e:
+        print(f"[command_sync] Could not read stored command hash, syncing anyway: {e}")
+        stored = None
+
+    if stored == current and not force:
+        print(f"[command_sync] Command tree unchanged ({current[:12]}), skipping sync.")
+        return False
+
+    try:
+        synced = await tree.sync()
+        print(f"Synced {len(synced)} commands.")
+    except Exception as e:
+        print(f"Failed to sync commands: {e}")
+        return False
+
+    try:
+        await db.set_bot_state(key, current)
+    except Exception as e:
+        print(f"[command_sync] Synced but failed to store command hash: {e}")
+    return True
@@ -3,9 +3,24 @@ from discord import app_commands, Embed, Interaction
 from discord.ui import View, Button
 import os
 import asyncio
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import shutil
+import tempfile
 import traceback
-from db import get_user, insert_submitted_question, increment_score, increment_streak
-from views import LeaderboardView, ListRiddlesView
+from db import ensure_user, find_riddle_by_question, add_riddle, delete_riddle, get_max_total, get_riddle_stats, get_user, insert_submitted_question, increment_score, increment_streak, record_score_event, import_riddles, upsert_job_schedule, get_leaderboard_with_movement, get_user_rank_movement
+from views import LeaderboardView, ListRiddlesView, SearchRiddlesView
+import backup
+import perf
+import memstats
+import pubsub
+import cache
+import db
+import resilience
+from resilience import CircuitOpenError
+from riddle_io import parse_riddle_file, MAX_IMPORT_BYTES
+from riddle_stats import SOLVE_TIME_LABELS, format_duration, median_bucket
+from ranks import get_score_rank, get_streak_rank, tier_label, SCORE_TIERS, STREAK_TIERS
 
 
 
@@ -18,37 +33,42 @@ def set_db_pool(pool):
     db_pool = pool
 
 
+# Same idea for the job scheduler owned by main.py
+scheduler = None
 
-# Utility functions for ranks (unchanged)
-def get_rank(score=0, streak=0):
-    # Prioritize streak if provided
-    if streak > 0:
-        if streak >= 30:
-            return "👑⛳ Hole in One Legend (30+ day streak)"
-        elif streak >= 20:
-            return "🦅 Eagle Master (20+ day streak)"
-        elif streak >= 10:
-            return "🐦 Birdie Streaker (10+ day streak)"
-        elif streak >= 5:
-            return "🐤 Par Player (5+ day streak)"
-        elif streak >= 3:
-            return "🏌️ Duffer (3+ day streak)"
-        else:
-            return "Greenhorn 🌱"
-
-    # Fallback to score if no streak
-    if score <= 0:
-        return "Dice Roller 🎲"
-    elif score <= 5:
-        return "Safe Square User ⭐ "
-    elif score <= 15:
-        return "Triple Six Samauri 🎲🥷"
-    elif score <= 25:
-        return "Piece Eater 🏠🔙 "
-    elif score <= 50:
-        return "Safe Zone Master 🔒"
-    else:
-        return "Goal Collector 👑🥅"
+def set_scheduler(sched):
+    global scheduler
+    scheduler = sched
+
+
+# And for the guess queue, so /perfstats can report its backlog
+guess_queue = None
+
+def set_guess_queue(queue):
+    global guess_queue
+    guess_queue = queue
+
+
+# Rapid-fire rounds live in main.py's round state, so main hands us the starter
+start_rapid_fire = None
+rapid_fire_max_riddles = 10
+
+def set_rapid_fire(starter, max_riddles):
+    global start_rapid_fire, rapid_fire_max_riddles
+    start_rapid_fire = starter
+    rapid_fire_max_riddles = max_riddles
+
+
+
+def format_rank_change(rank, prev_rank):
+    if prev_rank is None:
+        return "🆕"
+    moved = prev_rank - rank
+    if moved > 0:
+        return f"↑{moved}"
+    if moved < 0:
+        return f"↓{-moved}"
+    return "—"
 
 # -------------------
 # Your commands below
@@ -62,20 +82,12 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
         if db_pool is None:
             print("[ensure_user_exists] ERROR: db_pool is None")
             return
-        async with db_pool.acquire() as conn:
-            # Try insert, ignore if already exists
-            try:
-                await conn.execute(
-                    """
-                    INSERT INTO users (user_id, score, streak, created_at)
-                    VALUES ($1, 0, 0, CURRENT_TIMESTAMP )
-                    ON CONFLICT (user_id) DO NOTHING
-                    """,
-                    user_id
-                )
-                print(f"[ensure_user_exists] Ensured user {user_id} exists")
-            except Exception as e:
-                print(f"[ensure_user_exists] ERROR inserting user {user_id}: {e}")
+        # Try insert, ignore if already exists
+        try:
+            await ensure_user(user_id)
+            print(f"[ensure_user_exists] Ensured user {user_id} exists")
+        except Exception as e:
+            print(f"[ensure_user_exists] ERROR inserting user {user_id}: {e}")
 
 
     @tree.command(name="myranks", description="Show your riddle score, streak, and rank")
@@ -96,9 +108,16 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
 
         print(f"[myranks] Fetching user with id: {uid}")
         try:
-            async with db_pool.acquire() as conn:
-                row = await conn.fetchrow("SELECT score, streak FROM users WHERE user_id = $1", uid)
+            row = await get_user(uid)
             print(f"[myranks] DB query result: {row}")
+        except CircuitOpenError:
+            # Database is down; answer from the score cache if it's warm
+            row = None
+            if cache.get_score(uid) is not None:
+                row = {"score": cache.get_score(uid), "streak": cache.get_streak(uid)}
+            else:
+                await interaction.followup.send("⚠️ Stats are temporarily unavailable, please try again shortly.", ephemeral=True)
+                return
         except Exception as e:
             print(f"[myranks] ERROR querying DB: {e}")
             import traceback
@@ -111,21 +130,16 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
         user_total = score_val + streak_val
 
         try:
-            async with db_pool.acquire() as conn:
-                rows = await conn.fetch("SELECT score, streak FROM users")
-                max_total = 0
-                for r in rows:
-                    s = r["score"] or 0
-                    st = r["streak"] or 0
-                    total = s + st
-                    if total > max_total:
-                        max_total = total
+            # Aggregate read; served by the replica when one is configured
+            max_total = await get_max_total()
+        except CircuitOpenError:
+            max_total = cache.get_max_total() or 0
         except Exception as e:
             print(f"[myranks] ERROR fetching global score+streak: {e}")
             max_total = 0
 
         # Calculate ranks
-        rank = get_rank(score_val)
+        rank = get_score_rank(score_val)
         streak_rank = get_streak_rank(streak_val)
 
         score_text = f"{score_val}"
@@ -139,7 +153,19 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
             color=discord.Color.green()
         )
 
+        try:
+            movement = await get_user_rank_movement(uid)
+        except Exception as e:
+            print(f"[myranks] ERROR fetching rank movement: {e}")
+            movement = None
+
         embed.add_field(name="Score", value=score_text, inline=False)
+        if movement:
+            embed.add_field(
+                name="Leaderboard Position",
+                value=f"#{movement['rank']} ({format_rank_change(movement['rank'], movement['prev_rank'])} since yesterday)",
+                inline=False
+            )
         embed.add_field(name="Rank", value=rank or "No rank", inline=False)
         embed.add_field(name="Streak", value=streak_text, inline=False)
         embed.add_field(name="Streak Rank", value=streak_rank or "No streak rank", inline=False)
@@ -173,18 +199,9 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
         print(f"[submitriddle] Ensuring user {uid} exists in DB")
 
         try:
-            async with db_pool.acquire() as conn:
-                # Insert user if not exists
-                await conn.execute("""
-                    INSERT INTO users (user_id, score, streak, created_at)
-                    VALUES ($1, 0, 0, NOW())
-                    ON CONFLICT (user_id) DO NOTHING
-                """, uid)
-
-                existing = await conn.fetchrow(
-                    "SELECT * FROM user_submitted_questions WHERE LOWER(TRIM(question)) = LOWER(TRIM($1))",
-                    question
-                )
+            # Insert user if not exists
+            await ensure_user(uid)
+            existing = await find_riddle_by_question(question)
             print(f"[submitriddle] Duplicate check result: {existing}")
         except Exception as e:
             print(f"[submitriddle] ERROR checking for duplicate question: {e}")
@@ -200,27 +217,22 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
             return
 
         try:
-            async with db_pool.acquire() as conn:
-                await conn.execute(
-                    """
-                    INSERT INTO user_submitted_questions (user_id, question, answer, created_at)
-                    VALUES ($1, $2, $3, CURRENT_TIMESTAMP)
-                    """,
-                    uid, question, answer
-                )
+            riddle_id = await add_riddle(uid, question, answer)
             print("[submitriddle] Inserted submitted question")
+            pubsub.publish("riddle_added", {
+                "riddle_id": riddle_id,
+                "question": question,
+                "answer": answer,
+                "user_id": uid,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }, local=True)
         except Exception as e:
             print(f"[submitriddle] ERROR inserting submitted question: {e}")
             await interaction.followup.send("❌ Failed to submit your riddle.", ephemeral=True)
             return
 
         try:
-            async with db_pool.acquire() as conn:
-                await conn.execute(
-                    """
-                    UPDATE users SET score = score + 1 WHERE user_id = $1
-                    """, uid
-                )
+            await record_score_event(uid, score_delta=1, reason="riddle_submitted")
             print("[submitriddle] Updated user score by 1")
         except Exception as e:
             print(f"[submitriddle] ERROR updating user score: {e}")
@@ -257,6 +269,235 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
 )
 
 
+    @tree.command(name="importriddles", description="Bulk import riddles from a CSV, JSON or JSONL file")
+    @app_commands.describe(file="CSV with question,answer[,user_id] columns, or JSON/JSONL objects with the same keys")
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def importriddles(interaction: discord.Interaction, file: discord.Attachment):
+        print(f"[importriddles] Command invoked with {file.filename} ({file.size} bytes)")
+        await interaction.response.defer(ephemeral=True)
+
+        if file.size > MAX_IMPORT_BYTES:
+            await interaction.followup.send(
+                f"❌ File is too large ({file.size // 1024} KB). Limit is {MAX_IMPORT_BYTES // 1024} KB.",
+                ephemeral=True
+            )
+            return
+
+        try:
+            data = await file.read()
+            records, bad_rows = parse_riddle_file(file.filename, data)
+        except (ValueError, UnicodeDecodeError) as e:
+            print(f"[importriddles] ERROR parsing file: {e}")
+            await interaction.followup.send(f"❌ Could not read that file: {e}", ephemeral=True)
+            return
+
+        if not records:
+            await interaction.followup.send("❌ No valid riddles found in that file.", ephemeral=True)
+            return
+
+        try:
+            inserted, skipped = await import_riddles(records)
+        except Exception as e:
+            print(f"[importriddles] ERROR importing: {e}")
+            await interaction.followup.send("❌ Database error while importing riddles.", ephemeral=True)
+            return
+
+        if inserted:
+            pubsub.publish("riddles_imported", {"inserted": inserted}, local=True)
+
+        lines = [
+            f"✅ Imported **{inserted}** riddle(s).",
+            f"⏭️ Skipped **{skipped}** duplicate(s).",
+        ]
+        if bad_rows:
+            lines.append(f"⚠️ Ignored **{bad_rows}** row(s) missing a question or answer.")
+        await interaction.followup.send("\n".join(lines), ephemeral=True)
+
+
+    @tree.command(name="exportdata", description="Export riddles, users and score history as a backup file")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def exportdata(interaction: discord.Interaction):
+        print("[exportdata] Command invoked")
+        await interaction.response.defer(ephemeral=True)
+
+        workdir = tempfile.mkdtemp(prefix="riddle-export-")
+        try:
+            paths = await backup.export_all(workdir)
+            archive = await asyncio.to_thread(backup.bundle, paths, os.path.join(workdir, "riddle-backup.tar"))
+            size = os.path.getsize(archive)
+            limit = interaction.guild.filesize_limit if interaction.guild else 8 * 1024 * 1024
+            if size > limit:
+                # Too big for Discord; keep a copy on disk for the operator
+                kept = backup.default_export_dir()
+                os.makedirs(kept, exist_ok=True)
+                for path in paths:
+                    shutil.copy(path, kept)
+                await interaction.followup.send(
+                    f"⚠️ Backup is {size // 1024} KB, over the upload limit. Saved on the bot host in `{kept}`.",
+                    ephemeral=True
+                )
+                return
+            await interaction.followup.send(
+                f"✅ Backup of {len(paths)} file(s). Restore with `python backup.py restore riddle-backup.tar`.",
+                file=discord.File(archive),
+                ephemeral=True
+            )
+            print(f"[exportdata] Sent backup ({size} bytes)")
+        except Exception as e:
+            print(f"[exportdata] ERROR: {e}")
+            await interaction.followup.send("❌ Failed to export data.", ephemeral=True)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+    @tree.command(name="setschedule", description="Set when a daily job runs for this server (posts in this channel)")
+    @app_commands.describe(
+        job="Which daily job to reschedule",
+        at="Time of day as HH:MM (24h)",
+        timezone="IANA timezone, e.g. UTC or America/New_York"
+    )
+    @app_commands.choices(job=[
+        app_commands.Choice(name="Purge channel", value="daily_purge"),
+        app_commands.Choice(name="Upcoming riddle announcement", value="riddle_announcement"),
+        app_commands.Choice(name="Post riddle", value="daily_riddle_post"),
+        app_commands.Choice(name="Reveal answer", value="reveal_riddle_answer"),
+    ])
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def setschedule(interaction: discord.Interaction, job: app_commands.Choice[str], at: str, timezone: str = "UTC"):
+        print(f"[setschedule] Command invoked: {job.value} at {at} {timezone}")
+        if interaction.guild_id is None:
+            await interaction.response.send_message("❌ This command can only be used in a server.", ephemeral=True)
+            return
+
+        try:
+            run_time = datetime.strptime(at.strip(), "%H:%M").time()
+        except ValueError:
+            await interaction.response.send_message("❌ Time must be HH:MM in 24-hour format, e.g. 18:30.", ephemeral=True)
+            return
+        try:
+            ZoneInfo(timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            await interaction.response.send_message(f"❌ Unknown timezone `{timezone}`.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        try:
+            await upsert_job_schedule(interaction.guild_id, job.value, run_time, timezone, interaction.channel_id)
+            if scheduler is not None:
+                scheduler.set_schedule(interaction.guild_id, job.value, run_time, timezone, interaction.channel_id)
+            # The leader may be another replica; it applies the change from this event
+            pubsub.publish("schedule_changed", {
+                "guild_id": interaction.guild_id,
+                "job": job.value,
+                "run_time": run_time.strftime("%H:%M"),
+                "timezone": timezone,
+                "channel_id": interaction.channel_id,
+            })
+        except Exception as e:
+            print(f"[setschedule] ERROR: {e}")
+            await interaction.followup.send("❌ Failed to save the schedule.", ephemeral=True)
+            return
+
+        next_run = scheduler.next_run(interaction.guild_id, job.value) if scheduler else None
+        next_text = f" Next run: <t:{int(next_run.timestamp())}:F>." if next_run else ""
+        await interaction.followup.send(
+            f"✅ **{job.name}** will run daily at {run_time:%H:%M} {timezone} in {interaction.channel.mention}.{next_text}",
+            ephemeral=True
+        )
+
+
+    @tree.command(name="rapidfire", description="Post several riddles at once in this channel for a limited time")
+    @app_commands.describe(
+        count="How many riddles to open at once",
+        minutes="How long they stay open before the answers are revealed"
+    )
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def rapidfire(interaction: discord.Interaction, count: app_commands.Range[int, 2, 25] = 5, minutes: app_commands.Range[int, 1, 180] = 60):
+        print(f"[rapidfire] Command invoked: {count} riddles for {minutes} minutes")
+        if start_rapid_fire is None:
+            await interaction.response.send_message("❌ Rapid-fire rounds are not available right now.", ephemeral=True)
+            return
+        if count > rapid_fire_max_riddles:
+            await interaction.response.send_message(
+                f"❌ At most {rapid_fire_max_riddles} riddles can be open at once.", ephemeral=True
+            )
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        try:
+            opened = await start_rapid_fire(interaction.channel, count, minutes)
+        except Exception as e:
+            print(f"[rapidfire] ERROR: {e}")
+            traceback.print_exc()
+            await interaction.followup.send("❌ Failed to start the rapid-fire round.", ephemeral=True)
+            return
+
+        if not opened:
+            await interaction.followup.send("⚠️ There are no unused riddles to post.", ephemeral=True)
+            return
+        await interaction.followup.send(
+            f"✅ Opened {len(opened)} riddle(s) for {minutes} minute(s) in {interaction.channel.mention}.",
+            ephemeral=True
+        )
+
+
+    @tree.command(name="riddlestats", description="Show how a revealed riddle played out")
+    @app_commands.describe(riddle_id="The ID number of the riddle")
+    async def riddlestats(interaction: discord.Interaction, riddle_id: int):
+        print(f"[riddlestats] Command invoked with riddle_id={riddle_id}")
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            stats = await get_riddle_stats(riddle_id)
+        except Exception as e:
+            print(f"[riddlestats] ERROR: {e}")
+            await interaction.followup.send("❌ An error occurred while fetching riddle stats.", ephemeral=True)
+            return
+
+        if stats is None:
+            await interaction.followup.send(
+                f"❌ No stats for riddle #{riddle_id}. Stats are recorded when a riddle's answer is revealed.",
+                ephemeral=True
+            )
+            return
+
+        participants = stats["participants"]
+        solvers = stats["solvers"]
+        solve_rate = f"{solvers / participants:.0%}" if participants else "—"
+        mean_solve = stats["solve_seconds_total"] / solvers if solvers else None
+        attempts = f"{stats['solver_attempts'] / solvers:.1f}" if solvers else "—"
+
+        embed = discord.Embed(
+            title=f"📊 Riddle #{riddle_id} Stats",
+            description=stats.get("question") or "*Riddle no longer in the bank*",
+            color=discord.Color.blurple()
+        )
+        if stats.get("answer"):
+            embed.add_field(name="Answer", value=stats["answer"], inline=False)
+        embed.add_field(name="Solve Rate", value=f"{solve_rate} ({solvers}/{participants})", inline=True)
+        embed.add_field(name="Guesses", value=str(stats["guesses"]), inline=True)
+        embed.add_field(name="Attempts per Solver", value=attempts, inline=True)
+        embed.add_field(name="First Solve", value=format_duration(stats["first_solve_seconds"]), inline=True)
+        embed.add_field(name="Average Solve", value=format_duration(mean_solve), inline=True)
+        embed.add_field(name="Median Solve", value=median_bucket(stats["solve_histogram"]) or "—", inline=True)
+
+        histogram = stats["solve_histogram"]
+        peak = max(histogram, default=0)
+        if peak:
+            lines = [
+                f"`{label:>6}` {'█' * max(1, round(count * 12 / peak)) if count else ''} {count}"
+                for label, count in zip(SOLVE_TIME_LABELS, histogram)
+            ]
+            embed.add_field(name="Time to Solve", value="\n".join(lines), inline=False)
+
+        kind = "Rapid-fire" if stats["kind"] == "rapid" else "Daily"
+        if stats.get("revealed_at"):
+            embed.set_footer(text=f"{kind} riddle, revealed {stats['revealed_at']:%Y-%m-%d %H:%M} UTC")
+        else:
+            embed.set_footer(text=f"{kind} riddle")
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+
     @tree.command(name="addpoints", description="Add points to a user")
     @app_commands.describe(user="The user to add points to", amount="Number of points to add (positive integer)")
     @app_commands.checks.has_permissions(manage_guild=True)
@@ -412,17 +653,15 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
         await interaction.response.defer(ephemeral=True)
 
         try:
-            async with db_pool.acquire() as conn:
-                result = await conn.execute(
-                    "DELETE FROM user_submitted_questions WHERE riddle_id = $1",
-                    riddle_id
-                )
-            print(f"[removeriddle] DB execute result: {result}")
+            removed = await delete_riddle(riddle_id)
+            print(f"[removeriddle] Removed {removed} row(s)")
 
-            if result.endswith("0"):
+            if not removed:
                 await interaction.followup.send(f"❌ No riddle found with ID #{riddle_id}.", ephemeral=True)
                 print(f"[removeriddle] No riddle found with ID #{riddle_id}")
             else:
+                # Close it if it is live here or on another replica
+                pubsub.publish("riddle_removed", {"riddle_id": riddle_id}, local=True)
                 await interaction.followup.send(f"✅ Removed riddle #{riddle_id}.", ephemeral=True)
                 print(f"[removeriddle] Removed riddle #{riddle_id}")
         except Exception as e:
@@ -432,22 +671,28 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
 
 
     @tree.command(name="listriddles", description="List all submitted riddles with pagination")
-    async def listriddles(interaction: discord.Interaction):
+    @app_commands.describe(status="Only show posted or unposted riddles", submitter="Only show riddles submitted by this user")
+    @app_commands.choices(status=[
+        app_commands.Choice(name="Posted", value="posted"),
+        app_commands.Choice(name="Unposted", value="unposted"),
+    ])
+    async def listriddles(interaction: discord.Interaction, status: app_commands.Choice[str] = None, submitter: discord.User = None):
         print("[listriddles] Command invoked")
         await interaction.response.defer(ephemeral=True)
 
-        async with db_pool.acquire() as conn:
-            riddles = await conn.fetch("SELECT * FROM user_submitted_questions ORDER BY created_at DESC")
-        print(f"[listriddles] Fetched {len(riddles)} riddles")
-
-        if not riddles:
-            await interaction.followup.send("No riddles have been submitted yet.", ephemeral=True)
-            print("[listriddles] No riddles found")
-            return
-
         try:
-            view = ListRiddlesView(riddles, interaction.user.id, interaction.client)
+            view = ListRiddlesView(
+                interaction.user.id,
+                interaction.client,
+                status=status.value if status else None,
+                submitter_id=submitter.id if submitter else None,
+            )
             embed = await view.get_page_embed()
+            if not embed.fields:
+                message = "No riddles match those filters." if (status or submitter) else "No riddles have been submitted yet."
+                await interaction.followup.send(message, ephemeral=True)
+                print("[listriddles] No riddles found")
+                return
             await interaction.followup.send(embed=embed, view=view, ephemeral=True)
             print("[listriddles] Sent riddles list embed")
         except Exception as e:
@@ -455,9 +700,39 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
             await interaction.followup.send("❌ Failed to show riddles.", ephemeral=True)
 
 
+    @tree.command(name="searchriddles", description="Search submitted riddles by question or answer text")
+    @app_commands.checks.has_permissions(manage_guild=True)
+    @app_commands.describe(query="Words to search for in the riddle question or answer")
+    async def searchriddles(interaction: discord.Interaction, query: str):
+        print(f"[searchriddles] Command invoked with query={query!r}")
+        query = query.strip()
+        if not query:
+            await interaction.response.send_message("❌ Search query cannot be empty.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            view = SearchRiddlesView(query, interaction.user.id, interaction.client)
+            embed = await view.get_page_embed()
+            if view.total == 0:
+                await interaction.followup.send(embed=embed, ephemeral=True)
+                return
+            await interaction.followup.send(embed=embed, view=view, ephemeral=True)
+            print(f"[searchriddles] Sent {view.total} matches")
+        except Exception as e:
+            print(f"[searchriddles] ERROR: {e}")
+            await interaction.followup.send("❌ Failed to search riddles.", ephemeral=True)
+
+
     @tree.command(name="leaderboard", description="Show the riddle leaderboard with pagination")
-    async def leaderboard(interaction: Interaction):
-        print("[leaderboard] Command invoked")
+    @app_commands.describe(tier="Only show players in this rank tier")
+    @app_commands.choices(tier=[
+        app_commands.Choice(name=label.strip(), value=key)
+        for _, key, label in SCORE_TIERS + STREAK_TIERS
+    ])
+    async def leaderboard(interaction: Interaction, tier: app_commands.Choice[str] = None):
+        print(f"[leaderboard] Command invoked (tier={tier.value if tier else None})")
         await interaction.response.defer(ephemeral=False)
 
         try:
@@ -465,31 +740,29 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
             print(f"[leaderboard] Ensuring user {uid} exists in DB")
             await ensure_user_exists(uid)
 
-            async with db_pool.acquire() as conn:
-                rows = await conn.fetch("SELECT user_id, score, streak FROM users WHERE score >= 1 OR streak >= 1")
+            tier_key = tier.value if tier else None
+            per_page = 10
 
-            print(f"[leaderboard] Fetched {len(rows)} users")
-            if not rows:
+            # Ranked and sorted by score, streak DESCENDING in SQL, one page
+            # at a time; every row carries the leaderboard's total and top score
+            async def fetch_page(page_index: int):
+                return await get_leaderboard_with_movement(tier_key, limit=per_page, offset=page_index * per_page)
+
+            first_page = await fetch_page(0)
+            print(f"[leaderboard] Fetched {len(first_page)} users")
+            if not first_page:
+                if tier:
+                    await interaction.followup.send(f"No players in the {tier.name} tier yet.", ephemeral=False)
+                    return
                 await interaction.followup.send("No leaderboard data available.", ephemeral=False)
                 return
 
-            # Sort by score and streak DESCENDING
-            sorted_rows = sorted(rows, key=lambda r: (r["score"], r["streak"]), reverse=True)
-            max_score = sorted_rows[0]["score"] if sorted_rows else 0
-
-            # Prepare pagination
-            per_page = 10
-            pages = [
-                sorted_rows[i:i + per_page]
-                for i in range(0, len(sorted_rows), per_page)
-            ]
-            total_pages = len(pages)
-
             # --- Helper to build the leaderboard embed ---
-            async def build_embed(page_index: int):
-                page = pages[page_index]
+            async def build_embed(page_index: int, page):
+                total_pages = (page[0]["total"] - 1) // per_page + 1 if page else page_index
+                max_score = page[0]["max_score"] if page else 0
                 embed = Embed(
-                    title=f"🏆 Riddle Leaderboard (Page {page_index + 1}/{total_pages})",
+                    title=f"🏆 Riddle Leaderboard (Page {page_index + 1}/{max(total_pages, page_index + 1)})",
                     color=discord.Color.gold()
                 )
                 description_lines = []
@@ -497,7 +770,7 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
                 for idx, row in enumerate(page, start=1 + page_index * per_page):
                     user_id = row["user_id"]
                     try:
-                        user = await client.fetch_user(user_id)
+                        user = client.get_user(user_id) or await client.fetch_user(user_id)
                         score = row["score"]
                         streak = row["streak"]
 
@@ -505,15 +778,15 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
                         if score == max_score and max_score > 0:
                             score_line += " 👑⭐ Plato Master"
 
-                        rank = get_rank(score)
+                        rank = tier_label(row["score_tier"])
 
                         # Show streak rank only if streak > 3
                         streak_rank = None
                         if streak >= 3:
-                            streak_rank = get_streak_rank(streak)
+                            streak_rank = tier_label(row["streak_tier"])
 
                         embed_lines = [
-                            f"**#{idx} {user.display_name}**",
+                            f"**#{idx} {user.display_name}** ({format_rank_change(row['rank'], row['prev_rank'])})",
                             f"• Score: {score_line}",
                             f"• Rank: {rank or 'No rank'}",
                             f"• Streak: {streak}"
@@ -527,31 +800,33 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
                         description_lines.append(f"**#{idx} Unknown User (ID: {user_id})**\n")
 
 
-                embed.description = "\n".join(description_lines)
-                return embed
+                embed.description = "\n".join(description_lines) or "No players on this page any more."
+                return embed, total_pages
 
             # --- Pagination view ---
             class LeaderboardPaginator(View):
-                def __init__(self):
+                def __init__(self, total_pages):
                     super().__init__(timeout=120)
                     self.page_index = 0
+                    self.total_pages = total_pages
+
+                async def show(self, interaction: Interaction, page_index: int):
+                    self.page_index = page_index
+                    embed, self.total_pages = await build_embed(page_index, await fetch_page(page_index))
+                    await interaction.response.edit_message(embed=embed, view=self)
 
                 @discord.ui.button(label="⏮️ Prev", style=discord.ButtonStyle.secondary)
                 async def prev(self, interaction: Interaction, button: Button):
                     if self.page_index > 0:
-                        self.page_index -= 1
-                        embed = await build_embed(self.page_index)
-                        await interaction.response.edit_message(embed=embed, view=self)
+                        await self.show(interaction, self.page_index - 1)
 
                 @discord.ui.button(label="Next ⏭️", style=discord.ButtonStyle.secondary)
                 async def next(self, interaction: Interaction, button: Button):
-                    if self.page_index < total_pages - 1:
-                        self.page_index += 1
-                        embed = await build_embed(self.page_index)
-                        await interaction.response.edit_message(embed=embed, view=self)
+                    if self.page_index < self.total_pages - 1:
+                        await self.show(interaction, self.page_index + 1)
 
-            view = LeaderboardPaginator()
-            initial_embed = await build_embed(0)
+            initial_embed, total_pages = await build_embed(0, first_page)
+            view = LeaderboardPaginator(total_pages)
             await interaction.followup.send(embed=initial_embed, view=view)
 
         except Exception as e:
@@ -560,6 +835,150 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
 
 
 
+    @tree.command(name="perfstats", description="Show event loop lag and handler timing percentiles")
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def perfstats(interaction: discord.Interaction):
+        print("[perfstats] Command invoked")
+        embed = Embed(title="⏱️ Bot Performance", color=discord.Color.dark_teal())
+
+        lag = perf.loop_lag
+        embed.add_field(
+            name="Event Loop Lag",
+            value=(
+                f"p50 {lag.percentile(50) * 1000:.1f} ms • p95 {lag.percentile(95) * 1000:.1f} ms • "
+                f"p99 {lag.percentile(99) * 1000:.1f} ms • max {lag.max() * 1000:.1f} ms"
+            ),
+            inline=False
+        )
+
+        breaker = resilience.breaker
+        embed.add_field(
+            name="Database",
+            value=(
+                f"Circuit {breaker.state.replace('_', '-')} • opened {breaker.opened_count}× • "
+                f"{breaker.rejected} call(s) rejected • {len(db.deferred_outcomes)} guess(es) deferred"
+            ),
+            inline=False
+        )
+
+        if guess_queue is not None:
+            queued = guess_queue.stats
+            embed.add_field(
+                name="Guess Queue",
+                value=(
+                    f"{len(guess_queue)} waiting (peak {guess_queue.peak}, high water {guess_queue.high_water}) • "
+                    f"{queued['processed']} processed • {queued['shed']} shed • {queued['errors']} error(s)"
+                    + (" • ⚠️ shedding replies" if guess_queue.congested else "")
+                ),
+                inline=False
+            )
+
+        rows = perf.summary()
+        if rows:
+            lines = ["`handler            n     p50    p95 |    db  rest   cpu`"]
+            for name, count, errors, p50, p95, db_p95, rest_p95, cpu_p95 in rows:
+                err = f" ⚠️{errors}" if errors else ""
+                lines.append(
+                    f"`{name[:16]:<16} {count:>5} {p50:>6.0f} {p95:>6.0f} | {db_p95:>5.0f} {rest_p95:>5.0f} {cpu_p95:>5.0f}`{err}"
+                )
+            embed.add_field(name="Handlers (ms, p95 split)", value="\n".join(lines)[:1024], inline=False)
+        else:
+            embed.add_field(name="Handlers", value="No samples yet.", inline=False)
+
+        if perf.slow_callback_count:
+            recent = "\n".join(f"• {message[:90]}" for _, message in list(perf.slow_callbacks)[-3:])
+            embed.add_field(
+                name=f"Slow Callbacks ({perf.slow_callback_count} total)",
+                value=recent[:1024],
+                inline=False
+            )
+
+        embed.set_footer(text=f"Rolling window of the last {perf.WINDOW} samples per metric.")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+    @tree.command(name="profile", description="Profile the running bot for N seconds and show the hottest functions")
+    @app_commands.describe(seconds="How long to profile (1-300 seconds)")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def profile(interaction: discord.Interaction, seconds: app_commands.Range[int, 1, 300] = 30):
+        print(f"[profile] Command invoked for {seconds}s")
+        if perf.is_profiling():
+            await interaction.response.send_message("⏳ A profile is already running, try again when it finishes.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        try:
+            path, report = await perf.profile_for(seconds)
+        except Exception as e:
+            print(f"[profile] ERROR: {e}")
+            await interaction.followup.send(f"❌ Profiling failed: {e}", ephemeral=True)
+            return
+
+        # Keep the pstats table only (skip the header lines) and fit the message limit
+        lines = report.splitlines()
+        start = next((i for i, line in enumerate(lines) if line.lstrip().startswith("ncalls")), 0)
+        table = "\n".join(lines[start:])[:1800]
+        await interaction.followup.send(
+            f"📈 Profiled {seconds}s, saved to `{path}`. Top functions by cumulative time:\n```\n{table}\n```",
+            ephemeral=True
+        )
+
+
+    @tree.command(name="memstats", description="Show memory usage, top allocation sites and live views")
+    @app_commands.describe(action="summary (default), baseline to record a snapshot, diff to compare with it, stop to end tracing")
+    @app_commands.choices(action=[
+        app_commands.Choice(name="Summary", value="summary"),
+        app_commands.Choice(name="Record baseline", value="baseline"),
+        app_commands.Choice(name="Diff against baseline", value="diff"),
+        app_commands.Choice(name="Stop tracing", value="stop"),
+    ])
+    @app_commands.checks.has_permissions(administrator=True)
+    async def memstats_command(interaction: discord.Interaction, action: app_commands.Choice[str] = None):
+        action = action.value if action else "summary"
+        print(f"[memstats] Command invoked ({action})")
+        await interaction.response.defer(ephemeral=True)
+
+        fmt = memstats.format_bytes
+        embed = Embed(title="🧠 Memory Stats", color=discord.Color.dark_teal())
+        embed.add_field(name="RSS", value=fmt(memstats.rss_bytes()), inline=True)
+        embed.add_field(
+            name="Message Cache",
+            value=f"{len(client.cached_messages)} / {client._connection.max_messages or 0} messages",
+            inline=True
+        )
+
+        if action == "stop":
+            memstats.stop_tracing()
+            embed.add_field(name="tracemalloc", value="Stopped.", inline=False)
+        elif action == "baseline":
+            memstats.take_baseline()
+            embed.add_field(name="tracemalloc", value="Baseline recorded. Run again with **Diff** later.", inline=False)
+        elif action == "diff":
+            diff = memstats.diff_against_baseline()
+            if diff is None:
+                value = "No baseline yet. Run with **Record baseline** first."
+            else:
+                value = "\n".join(f"`{fmt(size):>9}` {count:+d} {site[-60:]}" for site, size, count in diff) or "No change."
+            embed.add_field(name="Growth Since Baseline", value=value[:1024], inline=False)
+        else:
+            if memstats.start_tracing():
+                embed.add_field(name="tracemalloc", value="Tracing started; allocation sites appear from the next call.", inline=False)
+            top = memstats.top_allocations() or []
+            if top:
+                value = "\n".join(f"`{fmt(size):>9}` {site[-60:]}" for site, size, _ in top)
+                embed.add_field(name="Top Allocation Sites", value=value[:1024], inline=False)
+
+        views = memstats.live_views()
+        value = "\n".join(f"• {name}: {count} live, {fmt(size)}" for name, count, size in views) or "None"
+        embed.add_field(name="Live Views", value=value[:1024], inline=False)
+
+        state = memstats.state_sizes()
+        value = "\n".join(f"• {name}: {length} item(s), {fmt(size)}" for name, length, size in state) or "None"
+        embed.add_field(name="Round State", value=value[:1024], inline=False)
+
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+
     @tree.command(name="purge", description="Delete all messages in this channel")
     @app_commands.checks.has_permissions(administrator=True)
     async def purge(interaction: discord.Interaction):
@@ -583,15 +1002,8 @@ def setup(tree: app_commands.CommandTree, client: discord.Client):
  
  
 async def ensure_user_exists(user_id: int):
-    async with db_pool.acquire() as conn:
-        # Check if user exists
-        row = await conn.fetchrow("SELECT user_id FROM users WHERE user_id = $1", user_id)
-        if not row:
-            # Insert new user with default score and streak
-            await conn.execute(
-                "INSERT INTO users (user_id, score, streak) VALUES ($1, 0, 0)",
-                user_id
-            )
+    # Insert new user with default score and streak if missing
+    await ensure_user(user_id)
 
  
 
@@ -1,29 +1,341 @@
 
+import collections
+import functools
 import os
+import time
 print(f"DEBUG: Loaded db.py from {os.path.abspath(__file__)}")
 
 import asyncpg
 import discord
 
- 
+import cache
+import perf
+import pubsub
+import resilience
+import storage
+from ranks import SCORE_TIER_SQL, STREAK_TIER_SQL, score_tier_offset_sql, tier_filter_sql
+
+
 
 db_pool = None  # Global pool variable
+replica_pool = None  # Optional read-only pool from DATABASE_REPLICA_URL
+
+# Non-Postgres storage picked from the DATABASE_URL scheme (see storage.py).
+# When set, db_pool points at it too so "is the database up" checks work.
+backend = None
+BACKEND_OPERATIONS = set()
+
+# Reads may be served by the replica while it is at most this far behind
+REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS") or 5)
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("DB_REPLICA_LAG_CHECK_SECONDS") or 2)
+
+replica_lag = None          # seconds behind the primary at the last check, None if unknown
+replica_lag_checked = 0.0   # time.monotonic() of that check
+
+# scope -> time.monotonic() of this process's last write to it. Scopes are
+# "scores", "riddles" and ("user", user_id).
+last_write = {}
 
 async def create_db_pool():
-    global db_pool
+    global db_pool, replica_pool, backend
+    if db_pool is None:
+        backend = storage.backend_for_dsn(os.getenv("DATABASE_URL"))
+    if backend is not None:
+        missing = backend.missing_operations(BACKEND_OPERATIONS)
+        if missing:
+            raise RuntimeError(f"{backend.name} backend does not implement: {', '.join(missing)}")
+        if db_pool is None:
+            await backend.open()
+            db_pool = backend
+        return db_pool
+
     if db_pool is None:
         print("⏳ Creating database connection pool...")
-        db_pool = await asyncpg.create_pool(dsn=os.getenv("DATABASE_URL"))
+        # min_size connections are opened up front, so the first guess or
+        # command doesn't pay connection setup
+        db_pool = resilience.BoundedPool(await asyncpg.create_pool(
+            dsn=os.getenv("DATABASE_URL"),
+            min_size=int(os.getenv("DB_POOL_MIN_SIZE") or 5),
+            max_size=int(os.getenv("DB_POOL_MAX_SIZE") or 10),
+            connection_class=perf.TimedConnection,
+        ))
         print("✅ Database connection pool created.")
     else:
         print("⚠️ Database pool already initialized.")
+
+    replica_url = os.getenv("DATABASE_REPLICA_URL")
+    if replica_url and replica_pool is None:
+        try:
+            replica_pool = resilience.BoundedPool(await asyncpg.create_pool(
+                dsn=replica_url,
+                min_size=int(os.getenv("DB_REPLICA_POOL_MIN_SIZE") or 2),
+                max_size=int(os.getenv("DB_REPLICA_POOL_MAX_SIZE") or 10),
+                connection_class=perf.TimedConnection,
+                ))
+            print("✅ Read replica pool created.")
+        except Exception as e:
+            # Everything still works against the primary
+            print(f"⚠️ Could not connect to the read replica, reading from the primary: {e}")
     return db_pool
 
+async def close_db_pools():
+    global db_pool, replica_pool, backend
+    for pool in (replica_pool, db_pool):
+        if pool is not None:
+            await pool.close()
+    db_pool = replica_pool = backend = None
+
 def get_db_pool():
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
     return db_pool
 
+def backend_op(func=None, *, idempotent=False, timeout=resilience.CALL_TIMEOUT):
+    """Mark a storage operation; calls go to the configured backend's method
+    of the same name instead of the asyncpg code below when there is one.
+
+    Every call goes through the resilience circuit breaker and is cancelled
+    after `timeout` seconds (None for bulk operations). Operations that are
+    safe to run twice (reads, upserts, guarded updates) are marked
+    idempotent and retried on transient errors."""
+    if func is None:
+        return functools.partial(backend_op, idempotent=idempotent, timeout=timeout)
+    BACKEND_OPERATIONS.add(func.__name__)
+    retries = resilience.RETRIES if idempotent else 0
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        async def call():
+            if backend is not None:
+                return await getattr(backend, func.__name__)(*args, **kwargs)
+            return await func(*args, **kwargs)
+        return await resilience.guarded_call(call, func.__name__, retries, timeout)
+    return wrapper
+
+def note_write(*scopes):
+    """Record that we just wrote to these scopes, so reads of them stay on the primary for a while."""
+    now = time.monotonic()
+    if len(last_write) > 10000:
+        for scope, written in list(last_write.items()):
+            if now - written >= REPLICA_MAX_LAG:
+                del last_write[scope]
+    for scope in scopes:
+        last_write[scope] = now
+
+async def check_replica_lag():
+    global replica_lag, replica_lag_checked
+    replica_lag_checked = time.monotonic()
+    try:
+        async with replica_pool.acquire() as conn:
+            # An idle primary sends no new transactions, so a fully replayed
+            # replica counts as current however old its last replay is
+            replica_lag = await conn.fetchval("""
+                SELECT CASE
+                    WHEN NOT pg_is_in_recovery() THEN 0
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+                END::float8
+            """)
+    except Exception as e:
+        print(f"[replica] Lag check failed, reading from the primary: {e}")
+        replica_lag = None
+    return replica_lag
+
+async def read_pool(*scopes):
+    """Pool for a read-only query touching `scopes`.
+
+    Uses the replica when one is configured, it is within REPLICA_MAX_LAG of
+    the primary, and none of the scopes was written by us in that window;
+    otherwise the primary, so callers always read their own writes.
+    """
+    if replica_pool is None:
+        return db_pool
+    now = time.monotonic()
+    for scope in scopes:
+        if now - last_write.get(scope, float("-inf")) < REPLICA_MAX_LAG:
+            return db_pool
+    if now - replica_lag_checked >= REPLICA_LAG_CHECK_SECONDS:
+        await check_replica_lag()
+    if replica_lag is None or replica_lag > REPLICA_MAX_LAG:
+        return db_pool
+    return replica_pool
+
+@backend_op(idempotent=True, timeout=None)
+async def ensure_schema():
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    async with db_pool.acquire() as conn:
+        # Append-only ledger of every score/streak change. The users table is
+        # a snapshot that compact_score_events() folds these into.
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS score_events (
+                event_id BIGSERIAL PRIMARY KEY,
+                user_id BIGINT NOT NULL,
+                score_delta INTEGER NOT NULL DEFAULT 0,
+                streak_delta INTEGER NOT NULL DEFAULT 0,
+                reset_streak BOOLEAN NOT NULL DEFAULT FALSE,
+                reason TEXT,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                compacted BOOLEAN NOT NULL DEFAULT FALSE
+            )
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS score_events_user_time_idx
+            ON score_events (user_id, created_at)
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS score_events_pending_idx
+            ON score_events (user_id) WHERE NOT compacted
+        """)
+        # One row per user per day, written at reveal; the primary key doubles
+        # as the lookup index for rank-movement joins.
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS leaderboard_snapshots (
+                snapshot_date DATE NOT NULL,
+                user_id BIGINT NOT NULL,
+                score INTEGER NOT NULL,
+                streak INTEGER NOT NULL,
+                rank INTEGER NOT NULL,
+                PRIMARY KEY (snapshot_date, user_id)
+            )
+        """)
+        # Serves the leaderboard ordering and score tier ranges
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS users_score_streak_idx
+            ON users (score DESC, streak DESC)
+        """)
+        # Streak tiers are filtered after ranking, so this never served them
+        await conn.execute("DROP INDEX IF EXISTS users_streak_idx")
+        # Full-text search over the riddle bank for /searchriddles
+        await conn.execute("""
+            ALTER TABLE user_submitted_questions
+            ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                to_tsvector('english', COALESCE(question, '') || ' ' || COALESCE(answer, ''))
+            ) STORED
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS user_submitted_questions_search_idx
+            ON user_submitted_questions USING GIN (search_vector)
+        """)
+        # Keyset pagination for /listriddles
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS user_submitted_questions_created_idx
+            ON user_submitted_questions (created_at DESC, riddle_id DESC)
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS user_submitted_questions_user_created_idx
+            ON user_submitted_questions (user_id, created_at DESC, riddle_id DESC)
+        """)
+        # Dedupe key for /submitriddle and /importriddles. Skipped with a warning
+        # if the existing bank already contains duplicates.
+        try:
+            await conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS user_submitted_questions_question_norm_idx
+                ON user_submitted_questions (LOWER(TRIM(question)))
+            """)
+        except asyncpg.UniqueViolationError as e:
+            print(f"[ensure_schema] ⚠️ Duplicate riddles exist, normalized-question index not created: {e}")
+        # Small key/value store for bot bookkeeping (e.g. the synced command hash)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS bot_state (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """)
+        # Per-guild job times and a record of each run, so missed runs can be
+        # caught up and no occurrence runs twice
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_schedules (
+                guild_id BIGINT NOT NULL,
+                job TEXT NOT NULL,
+                run_time TIME NOT NULL,
+                timezone TEXT NOT NULL DEFAULT 'UTC',
+                channel_id BIGINT NOT NULL,
+                PRIMARY KEY (guild_id, job)
+            )
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_runs (
+                guild_id BIGINT NOT NULL,
+                job TEXT NOT NULL,
+                run_date DATE NOT NULL,
+                started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                finished_at TIMESTAMPTZ,
+                PRIMARY KEY (guild_id, job, run_date)
+            )
+        """)
+        # Which channel a riddle was posted to and when it was settled, so an
+        # open round can be resumed after a restart. closes_at is only set for
+        # rapid-fire riddles, which close on their own timer.
+        await conn.execute("""
+            ALTER TABLE user_submitted_questions
+            ADD COLUMN IF NOT EXISTS posted_channel_id BIGINT,
+            ADD COLUMN IF NOT EXISTS revealed_at TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS closes_at TIMESTAMPTZ
+        """)
+        # One row per revealed riddle, summarizing how it played out (see
+        # riddle_stats.SolveStats); solve_histogram counts solves per
+        # riddle_stats.SOLVE_TIME_BUCKETS bucket
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS riddle_stats (
+                riddle_id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                posted_at TIMESTAMPTZ,
+                revealed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                participants INTEGER NOT NULL,
+                guesses INTEGER NOT NULL,
+                solvers INTEGER NOT NULL,
+                solver_attempts INTEGER NOT NULL,
+                first_solve_seconds DOUBLE PRECISION,
+                solve_seconds_total DOUBLE PRECISION NOT NULL,
+                solve_histogram INTEGER[] NOT NULL
+            )
+        """)
+        # One row per player per posted riddle. A solve or guess penalty is
+        # awarded only by the statement that sets its column from NULL, so
+        # duplicate messages or replicas can never award it twice.
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS round_participants (
+                riddle_id INTEGER NOT NULL,
+                user_id BIGINT NOT NULL,
+                solved_at TIMESTAMPTZ,
+                penalized_at TIMESTAMPTZ,
+                PRIMARY KEY (riddle_id, user_id)
+            )
+        """)
+        # First run: seed the ledger with today's snapshot so history queries
+        # add up to the real totals.
+        seeded = await conn.execute("""
+            INSERT INTO score_events (user_id, score_delta, streak_delta, reason, compacted)
+            SELECT user_id, COALESCE(score, 0), COALESCE(streak, 0), 'baseline', TRUE
+            FROM users
+            WHERE NOT EXISTS (SELECT 1 FROM score_events)
+        """)
+        print(f"[ensure_schema] Schema ready ({seeded})")
+
+@backend_op(idempotent=True)
+async def get_bot_state(key: str):
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    async with db_pool.acquire() as conn:
+        return await conn.fetchval("SELECT value FROM bot_state WHERE key = $1", key)
+
+@backend_op(idempotent=True)
+async def set_bot_state(key: str, value: str):
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    async with db_pool.acquire() as conn:
+        await conn.execute("""
+            INSERT INTO bot_state (key, value, updated_at)
+            VALUES ($1, $2, NOW())
+            ON CONFLICT (key) DO UPDATE
+            SET value = EXCLUDED.value,
+                updated_at = NOW()
+        """, key, value)
+
+@backend_op(idempotent=True)
 async def upsert_user(user_id: int, score: int, streak: int):
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
@@ -35,24 +347,90 @@ async def upsert_user(user_id: int, score: int, streak: int):
             SET score = EXCLUDED.score,
                 streak = EXCLUDED.streak
         """, user_id, score, streak)
+        note_write("scores", ("user", int(user_id)))
         print(f"[upsert_user] User {user_id} upserted with score={score}, streak={streak}")
 
-async def get_user(user_id: int):
+@backend_op(idempotent=True)
+async def ensure_user(user_id: int) -> bool:
+    """Create an empty users row if missing. True if one was inserted."""
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
     async with db_pool.acquire() as conn:
+        result = await conn.execute("""
+            INSERT INTO users (user_id, score, streak, created_at)
+            VALUES ($1, 0, 0, NOW())
+            ON CONFLICT (user_id) DO NOTHING
+        """, user_id)
+    inserted = result.endswith(" 1")
+    if inserted:
+        note_write("scores", ("user", int(user_id)))
+    return inserted
+
+@backend_op(idempotent=True)
+async def get_user(user_id: int):
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    pool = await read_pool("scores", ("user", int(user_id)))
+    async with pool.acquire() as conn:
         result = await conn.fetchrow("SELECT * FROM users WHERE user_id = $1", user_id)
         print(f"[get_user] Fetched user {user_id}: {result}")
         return result
 
+@backend_op(idempotent=True)
 async def get_all_submitted_questions():
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
-    async with db_pool.acquire() as conn:
+    pool = await read_pool("riddles")
+    async with pool.acquire() as conn:
         rows = await conn.fetch("SELECT * FROM user_submitted_questions")
         print(f"[get_all_submitted_questions] Retrieved {len(rows)} questions")
         return rows
 
+@backend_op(idempotent=True)
+async def get_unused_riddles():
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    async with db_pool.acquire() as conn:
+        return await conn.fetch(
+            "SELECT riddle_id, question, answer, user_id, created_at FROM user_submitted_questions WHERE posted_at IS NULL"
+        )
+
+@backend_op(idempotent=True)
+async def find_riddle_by_question(question: str):
+    """The riddle whose question matches ignoring case and surrounding space, if any."""
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    async with db_pool.acquire() as conn:
+        return await conn.fetchrow(
+            "SELECT * FROM user_submitted_questions WHERE LOWER(TRIM(question)) = LOWER(TRIM($1))",
+            question
+        )
+
+@backend_op
+async def add_riddle(user_id: int, question: str, answer: str) -> int:
+    """Insert a riddle and return its id; errors propagate to the caller."""
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    async with db_pool.acquire() as conn:
+        riddle_id = await conn.fetchval("""
+            INSERT INTO user_submitted_questions (user_id, question, answer, created_at)
+            VALUES ($1, $2, $3, NOW())
+            RETURNING riddle_id
+        """, user_id, question, answer)
+    note_write("riddles")
+    return riddle_id
+
+@backend_op
+async def delete_riddle(riddle_id: int) -> int:
+    """Delete a riddle by id. Returns the number of rows removed."""
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    async with db_pool.acquire() as conn:
+        result = await conn.execute("DELETE FROM user_submitted_questions WHERE riddle_id = $1", riddle_id)
+    note_write("riddles")
+    return int(result.split()[-1])
+
+@backend_op
 async def insert_submitted_question(user_id: int, question: str, answer: str):
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
@@ -65,151 +443,298 @@ async def insert_submitted_question(user_id: int, question: str, answer: str):
                 """,
                 user_id, question, answer
             )
+        note_write("riddles")
         print(f"[insert_submitted_question] Inserted riddle by user {user_id}")
     except Exception as e:
         print(f"[insert_submitted_question] ERROR inserting riddle: {e}")
 
-async def count_unused_questions_db():
+@backend_op(idempotent=True)
+async def fetch_riddles_page(after=None, limit: int = 5, status: str = None, submitter_id: int = None):
+    """One page of riddles, newest first, using keyset pagination.
+
+    after is the (created_at, riddle_id) of the last row on the previous page.
+    """
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
-    async with db_pool.acquire() as conn:
-        result = await conn.fetchval("SELECT COUNT(*) FROM user_submitted_questions WHERE posted_at IS NULL")
-        print(f"[count_unused_questions_db] Counted {result} unused questions")
-        return result or 0
+    clauses, args = [], []
+    if after is not None:
+        args.extend(after)
+        clauses.append(f"(created_at, riddle_id) < (${len(args) - 1}, ${len(args)})")
+    if status == "posted":
+        clauses.append("posted_at IS NOT NULL")
+    elif status == "unposted":
+        clauses.append("posted_at IS NULL")
+    if submitter_id is not None:
+        args.append(submitter_id)
+        clauses.append(f"user_id = ${len(args)}")
+    args.append(limit)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    pool = await read_pool("riddles")
+    async with pool.acquire() as conn:
+        return await conn.fetch(f"""
+            SELECT riddle_id, user_id, question, answer, created_at, posted_at
+            FROM user_submitted_questions
+            {where}
+            ORDER BY created_at DESC, riddle_id DESC
+            LIMIT ${len(args)}
+        """, *args)
 
-async def get_all_streak_users():
+@backend_op(idempotent=True)
+async def search_riddles(query: str, limit: int = 5, offset: int = 0):
+    """Ranked full-text matches. Returns (rows, total_matches)."""
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
-    async with db_pool.acquire() as conn:
-        rows = await conn.fetch("SELECT user_id FROM users WHERE streak > 0 OR score > 0")
-        users = [str(row["user_id"]) for row in rows]
-        print(f"[get_all_streak_users] Users with streak or score: {users}")
-        return users
+    pool = await read_pool("riddles")
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT riddle_id, user_id, question, answer, created_at, posted_at,
+                   ts_rank(search_vector, q) AS relevance,
+                   COUNT(*) OVER () AS total
+            FROM user_submitted_questions, websearch_to_tsquery('english', $1) AS q
+            WHERE search_vector @@ q
+            ORDER BY relevance DESC, riddle_id DESC
+            LIMIT $2 OFFSET $3
+        """, query, limit, offset)
+    total = rows[0]["total"] if rows else 0
+    print(f"[search_riddles] '{query}' matched {total} riddles (offset {offset})")
+    return rows, total
 
-async def adjust_score_and_reset_streak(user_id: str, score_delta: int):
+@backend_op(timeout=None)
+async def import_riddles(records):
+    """Bulk-load (question, answer, user_id) records, skipping duplicates.
+
+    Records are COPYed into a temp staging table, then inserted in one
+    set-based statement. Returns (inserted, skipped).
+    """
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    if not records:
+        return 0, 0
     async with db_pool.acquire() as conn:
-        await conn.execute("""
-            UPDATE users
-            SET score = GREATEST(score + $1, 0),
-                streak = 0
-            WHERE user_id = $2
-        """, score_delta, int(user_id))
-        print(f"[adjust_score_and_reset_streak] Adjusted score by {score_delta} and reset streak for user {user_id}")
+        async with conn.transaction():
+            await conn.execute("""
+                CREATE TEMP TABLE riddle_import (
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    user_id BIGINT NOT NULL
+                ) ON COMMIT DROP
+            """)
+            await conn.copy_records_to_table(
+                "riddle_import", records=records, columns=("question", "answer", "user_id")
+            )
+            result = await conn.execute("""
+                INSERT INTO user_submitted_questions (user_id, question, answer, created_at)
+                SELECT DISTINCT ON (LOWER(TRIM(i.question))) i.user_id, i.question, i.answer, NOW()
+                FROM riddle_import i
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM user_submitted_questions q
+                    WHERE LOWER(TRIM(q.question)) = LOWER(TRIM(i.question))
+                )
+                ORDER BY LOWER(TRIM(i.question))
+                ON CONFLICT DO NOTHING
+            """)
+    inserted = int(result.split()[-1])
+    note_write("riddles")
+    print(f"[import_riddles] Inserted {inserted} of {len(records)} riddles")
+    return inserted, len(records) - inserted
 
-async def get_score(user_id: str) -> int:
+@backend_op(idempotent=True)
+async def get_active_riddles():
+    """Riddles posted in the last day and not yet revealed, so a restart can resume them."""
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
-    print(f"[get_score] Called for user_id={user_id}")
     async with db_pool.acquire() as conn:
-        score = await conn.fetchval("SELECT score FROM users WHERE user_id = $1", int(user_id))
-        print(f"[get_score] Score for user {user_id}: {score}")
-        return score if score is not None else 0
+        rows = await conn.fetch("""
+            SELECT riddle_id, question, answer, user_id, posted_channel_id, posted_at, closes_at
+            FROM user_submitted_questions
+            WHERE posted_at >= NOW() - INTERVAL '1 day'
+              AND revealed_at IS NULL
+            ORDER BY posted_at
+        """)
+        return [dict(row) for row in rows]
 
-async def increment_score(user_id: str):
+@backend_op(idempotent=True)
+async def mark_riddle_posted(riddle_id: int, channel_id: int, closes_at=None):
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
-    print(f"[increment_score] Called for user_id={user_id}")
     async with db_pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO users (user_id, score, streak, created_at)
-            VALUES ($1, 1, 0, NOW())
-            ON CONFLICT (user_id) DO UPDATE
-            SET score = users.score + 1
-        """, int(user_id))
-    print(f"[increment_score] Incremented score for user {user_id}")
+        await conn.execute(
+            "UPDATE user_submitted_questions SET posted_at = NOW(), posted_channel_id = $2, closes_at = $3 WHERE riddle_id = $1",
+            riddle_id, channel_id, closes_at
+        )
+    note_write("riddles")
 
-async def increment_streak(user_id: str):
+@backend_op
+async def mark_riddle_revealed(riddle_id: int) -> bool:
+    """Claim a riddle's reveal. False if it was already revealed (e.g. by another replica)."""
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
-    print(f"[increment_streak] Called for user_id={user_id}")
     async with db_pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO users (user_id, score, streak, created_at)
-            VALUES ($1, 0, 0, NOW())
-            ON CONFLICT (user_id) DO NOTHING
-        """, int(user_id))
+        result = await conn.execute(
+            "UPDATE user_submitted_questions SET revealed_at = NOW() WHERE riddle_id = $1 AND revealed_at IS NULL",
+            riddle_id
+        )
+    note_write("riddles")
+    return result.endswith(" 1")
+
+# Not idempotent: a retry after a lost reply would count the guesses twice
+@backend_op
+async def add_riddle_stats(riddle_id: int, kind: str, summary: dict):
+    """Add one replica's SolveStats.summary() to the riddle's stats row.
 
+    Each replica only counts the guesses it handled, so every replica that
+    had the round open adds its counters when the riddle is revealed."""
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    async with db_pool.acquire() as conn:
         await conn.execute("""
-            UPDATE users
-            SET streak = streak + 1
-            WHERE user_id = $1
-        """, int(user_id))
-    print(f"[increment_streak] Incremented streak for user {user_id}")
-import asyncpg
-import os
+            INSERT INTO riddle_stats (
+                riddle_id, kind, posted_at, participants, guesses, solvers,
+                solver_attempts, first_solve_seconds, solve_seconds_total, solve_histogram
+            )
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+            ON CONFLICT (riddle_id) DO UPDATE
+            SET kind = EXCLUDED.kind,
+                posted_at = LEAST(riddle_stats.posted_at, EXCLUDED.posted_at),
+                participants = riddle_stats.participants + EXCLUDED.participants,
+                guesses = riddle_stats.guesses + EXCLUDED.guesses,
+                solvers = riddle_stats.solvers + EXCLUDED.solvers,
+                solver_attempts = riddle_stats.solver_attempts + EXCLUDED.solver_attempts,
+                first_solve_seconds = LEAST(riddle_stats.first_solve_seconds, EXCLUDED.first_solve_seconds),
+                solve_seconds_total = riddle_stats.solve_seconds_total + EXCLUDED.solve_seconds_total,
+                solve_histogram = ARRAY(
+                    SELECT COALESCE(stored, 0) + COALESCE(added, 0)
+                    FROM unnest(riddle_stats.solve_histogram, EXCLUDED.solve_histogram)
+                        WITH ORDINALITY AS h(stored, added, bucket)
+                    ORDER BY bucket
+                )
+        """, riddle_id, kind, summary["posted_at"], summary["participants"], summary["guesses"],
+            summary["solvers"], summary["solver_attempts"], summary["first_solve_seconds"],
+            summary["solve_seconds_total"], summary["solve_histogram"])
+    note_write("riddles")
 
-db_pool = None  # Global pool variable
+@backend_op(idempotent=True)
+async def get_riddle_stats(riddle_id: int):
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    pool = await read_pool("riddles")
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow("""
+            SELECT s.*, q.question, q.answer
+            FROM riddle_stats s
+            LEFT JOIN user_submitted_questions q USING (riddle_id)
+            WHERE s.riddle_id = $1
+        """, riddle_id)
+        return dict(row) if row else None
 
-async def create_db_pool():
-    global db_pool
+@backend_op(idempotent=True)
+async def get_solve_history():
+    """(user_id, question, answer, participants, solvers) for every riddle
+    with stats, for riddle_picker's difficulty estimates."""
     if db_pool is None:
-        print("⏳ Creating database connection pool...")
-        db_pool = await asyncpg.create_pool(dsn=os.getenv("DATABASE_URL"))
-        print("✅ Database connection pool created.")
-    else:
-        print("⚠️ Database pool already initialized.")
-    return db_pool
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    pool = await read_pool("riddles")
+    async with pool.acquire() as conn:
+        return await conn.fetch("""
+            SELECT q.user_id, q.question, q.answer, s.participants, s.solvers
+            FROM riddle_stats s
+            JOIN user_submitted_questions q USING (riddle_id)
+            WHERE s.participants > 0
+        """)
 
-def get_db_pool():
+
+# -------------------
+# Job schedules
+# -------------------
+
+@backend_op(idempotent=True)
+async def get_job_schedules():
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
-    return db_pool
+    async with db_pool.acquire() as conn:
+        return await conn.fetch("SELECT guild_id, job, run_time, timezone, channel_id FROM job_schedules")
 
-async def upsert_user(user_id: int, score: int, streak: int):
+@backend_op(idempotent=True)
+async def upsert_job_schedule(guild_id: int, job: str, run_time, tz: str, channel_id: int):
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
     async with db_pool.acquire() as conn:
         await conn.execute("""
-            INSERT INTO users (user_id, score, streak, created_at)
-            VALUES ($1, $2, $3, NOW())
-            ON CONFLICT (user_id) DO UPDATE
-            SET score = EXCLUDED.score,
-                streak = EXCLUDED.streak
-        """, user_id, score, streak)
-        print(f"[upsert_user] User {user_id} upserted with score={score}, streak={streak}")
+            INSERT INTO job_schedules (guild_id, job, run_time, timezone, channel_id)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (guild_id, job) DO UPDATE
+            SET run_time = EXCLUDED.run_time,
+                timezone = EXCLUDED.timezone,
+                channel_id = EXCLUDED.channel_id
+        """, guild_id, job, run_time, tz, channel_id)
+    print(f"[upsert_job_schedule] {job} for guild {guild_id} at {run_time} {tz} in channel {channel_id}")
 
-async def get_user(user_id: int):
+@backend_op(idempotent=True)
+async def seed_job_schedules(guild_id: int, channel_id: int, defaults):
+    """Insert default schedules for a guild that has none. defaults: {job: time}."""
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
     async with db_pool.acquire() as conn:
-        result = await conn.fetchrow("SELECT * FROM users WHERE user_id = $1", user_id)
-        print(f"[get_user] Fetched user {user_id}: {result}")
-        return result
+        await conn.executemany("""
+            INSERT INTO job_schedules (guild_id, job, run_time, timezone, channel_id)
+            VALUES ($1, $2, $3, 'UTC', $4)
+            ON CONFLICT (guild_id, job) DO NOTHING
+        """, [(guild_id, job, run_time, channel_id) for job, run_time in defaults.items()])
 
-async def get_all_submitted_questions():
+# A claimed run that never finished is considered abandoned after this long
+JOB_RUN_STALE = "10 minutes"
+
+@backend_op
+async def claim_job_run(guild_id: int, job: str, run_date) -> bool:
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
     async with db_pool.acquire() as conn:
-        rows = await conn.fetch("SELECT * FROM user_submitted_questions")
-        print(f"[get_all_submitted_questions] Retrieved {len(rows)} questions")
-        return rows
+        claimed = await conn.fetchval(f"""
+            INSERT INTO job_runs (guild_id, job, run_date)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (guild_id, job, run_date) DO UPDATE
+            SET started_at = NOW()
+            WHERE job_runs.finished_at IS NULL
+              AND job_runs.started_at < NOW() - INTERVAL '{JOB_RUN_STALE}'
+            RETURNING TRUE
+        """, guild_id, job, run_date)
+        return bool(claimed)
 
-async def insert_submitted_question(user_id: int, question: str, answer: str):
+@backend_op(idempotent=True)
+async def finish_job_run(guild_id: int, job: str, run_date):
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
-    try:
-        async with db_pool.acquire() as conn:
-            await conn.execute(
-                """
-                INSERT INTO user_submitted_questions (user_id, question, answer, created_at)
-                VALUES ($1, $2, $3, NOW())
-                """,
-                user_id, question, answer
+    async with db_pool.acquire() as conn:
+        await conn.execute(
+            "UPDATE job_runs SET finished_at = NOW() WHERE guild_id = $1 AND job = $2 AND run_date = $3",
+            guild_id, job, run_date
+        )
+
+@backend_op(idempotent=True)
+async def job_run_exists(guild_id: int, job: str, run_date) -> bool:
+    """True if the run finished, or is in progress and not yet stale."""
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    async with db_pool.acquire() as conn:
+        return await conn.fetchval(f"""
+            SELECT EXISTS (
+                SELECT 1 FROM job_runs
+                WHERE guild_id = $1 AND job = $2 AND run_date = $3
+                  AND (finished_at IS NOT NULL OR started_at >= NOW() - INTERVAL '{JOB_RUN_STALE}')
             )
-        print(f"[insert_submitted_question] Inserted riddle by user {user_id}")
-    except Exception as e:
-        print(f"[insert_submitted_question] ERROR inserting riddle: {e}")
+        """, guild_id, job, run_date)
 
+@backend_op(idempotent=True)
 async def count_unused_questions_db():
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
-    async with db_pool.acquire() as conn:
+    pool = await read_pool("riddles")
+    async with pool.acquire() as conn:
         result = await conn.fetchval("SELECT COUNT(*) FROM user_submitted_questions WHERE posted_at IS NULL")
         print(f"[count_unused_questions_db] Counted {result} unused questions")
         return result or 0
 
+@backend_op(idempotent=True)
 async def get_all_streak_users():
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
@@ -219,61 +744,437 @@ async def get_all_streak_users():
         print(f"[get_all_streak_users] Users with streak or score: {users}")
         return users
 
-async def adjust_score_and_reset_streak(user_id: str, score_delta: int):
+
+# -------------------
+# Score event ledger
+# -------------------
+
+SCORE_EVENT_COLUMNS = ("user_id", "score_delta", "streak_delta", "reset_streak", "reason")
+
+INSERT_SCORE_EVENT_SQL = """
+    INSERT INTO score_events (user_id, score_delta, streak_delta, reset_streak, reason)
+    VALUES ($1, $2, $3, $4, $5)
+"""
+
+@backend_op
+async def insert_score_events(records):
+    """Write ledger rows as-is; record_score_event(s) add the cache bookkeeping."""
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
     async with db_pool.acquire() as conn:
-        await conn.execute("""
-            UPDATE users
-            SET score = GREATEST(score + $1, 0),
-                streak = 0
-            WHERE user_id = $2
-        """, score_delta, int(user_id))
-        print(f"[adjust_score_and_reset_streak] Adjusted score by {score_delta} and reset streak for user {user_id}")
+        if len(records) == 1:
+            await conn.execute(INSERT_SCORE_EVENT_SQL, *records[0])
+        else:
+            await conn.copy_records_to_table("score_events", records=records, columns=SCORE_EVENT_COLUMNS)
 
-async def get_score(user_id: str) -> int:
+# Ledger rows per scores_changed notification, well under the NOTIFY size limit
+SCORE_EVENTS_PER_NOTIFY = 200
+
+def publish_score_events(records):
+    """Let the other replicas mirror these rows onto their score caches."""
+    for i in range(0, len(records), SCORE_EVENTS_PER_NOTIFY):
+        pubsub.publish("scores_changed", {
+            "events": [list(record[:4]) for record in records[i:i + SCORE_EVENTS_PER_NOTIFY]],
+        })
+
+async def record_score_event(user_id, score_delta: int = 0, streak_delta: int = 0, reset_streak: bool = False, reason: str = None, conn=None):
+    if db_pool is None and conn is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    args = (int(user_id), score_delta, streak_delta, reset_streak, reason)
+    if conn is not None:
+        await conn.execute(INSERT_SCORE_EVENT_SQL, *args)
+    else:
+        await insert_score_events([args])
+    note_write(("user", int(user_id)))
+    cache.apply_score_event(user_id, score_delta, streak_delta, reset_streak)
+    publish_score_events([args])
+    print(f"[record_score_event] user={user_id} score{score_delta:+d} streak{streak_delta:+d} reset={reset_streak} ({reason})")
+
+async def record_score_events(events):
+    """Batch-insert ledger rows. events: iterable of
+    (user_id, score_delta, streak_delta, reset_streak, reason) tuples."""
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
-    print(f"[get_score] Called for user_id={user_id}")
-    async with db_pool.acquire() as conn:
-        score = await conn.fetchval("SELECT score FROM users WHERE user_id = $1", int(user_id))
-        print(f"[get_score] Score for user {user_id}: {score}")
-        return score if score is not None else 0
+    records = [(int(uid), sd, st, bool(reset), reason) for uid, sd, st, reset, reason in events]
+    if not records:
+        return 0
+    await insert_score_events(records)
+    note_write(*{("user", uid) for uid, *_ in records})
+    for uid, sd, st, reset, _ in records:
+        cache.apply_score_event(uid, sd, st, reset)
+    publish_score_events(records)
+    print(f"[record_score_events] Recorded {len(records)} events")
+    return len(records)
 
-import discord
+# round_participants column each kind of one-off award claims
+ROUND_OUTCOMES = {"solved": "solved_at", "penalized": "penalized_at"}
 
-async def increment_score(user_id: str, interaction: discord.Interaction):
+@backend_op
+async def claim_round_outcomes(user_id: int, outcome: str, awards):
+    """Set `outcome` for user_id on each riddle where it isn't set yet, and
+    write the score events of exactly those claims, in one statement.
+    awards: (riddle_id, score_delta, streak_delta, reset_streak, reason).
+    Returns the riddle ids that were claimed."""
     if db_pool is None:
-        raise RuntimeError("DB pool is not initialized.")
-    
-    print(f"[increment_score] Called for user_id={user_id}")
-    
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    column = ROUND_OUTCOMES[outcome]
+    riddle_ids, score_deltas, streak_deltas, resets, reasons = zip(*awards)
+    async with db_pool.acquire() as conn:
+        rows = await conn.fetch(f"""
+            WITH awards AS (
+                SELECT * FROM unnest($2::int[], $3::int[], $4::int[], $5::bool[], $6::text[])
+                    AS a(riddle_id, score_delta, streak_delta, reset_streak, reason)
+            ),
+            claimed AS (
+                INSERT INTO round_participants (riddle_id, user_id, {column})
+                SELECT riddle_id, $1, NOW() FROM awards
+                ON CONFLICT (riddle_id, user_id) DO UPDATE SET {column} = EXCLUDED.{column}
+                WHERE round_participants.{column} IS NULL
+                RETURNING riddle_id
+            ),
+            recorded AS (
+                INSERT INTO score_events (user_id, score_delta, streak_delta, reset_streak, reason)
+                SELECT $1, a.score_delta, a.streak_delta, a.reset_streak, a.reason
+                FROM awards a JOIN claimed USING (riddle_id)
+            )
+            SELECT riddle_id FROM claimed
+        """, int(user_id), list(riddle_ids), list(score_deltas), list(streak_deltas), list(resets), list(reasons))
+        return {row["riddle_id"] for row in rows}
+
+@backend_op(idempotent=True)
+async def get_round_participants(riddle_id: int):
+    """(user_id, solved_at, penalized_at) for a riddle, earliest solvers first."""
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    async with db_pool.acquire() as conn:
+        return await conn.fetch("""
+            SELECT user_id, solved_at, penalized_at
+            FROM round_participants
+            WHERE riddle_id = $1
+            ORDER BY solved_at NULLS LAST, user_id
+        """, riddle_id)
+
+# Solves and penalties that couldn't be written while the database was
+# unreachable, oldest first; replay_deferred_outcomes() writes them later
+DEFERRED_OUTCOMES_MAX = int(os.getenv("DB_DEFERRED_OUTCOMES_MAX") or 10000)
+deferred_outcomes = collections.deque()
+
+async def record_round_outcomes(user_id, outcome, awards, defer=False):
+    """Award each (riddle_id, score_delta, streak_delta, reset_streak, reason)
+    at most once per user and riddle. Returns the riddle ids awarded now.
+
+    With defer=True a database outage doesn't lose the guess: it is queued
+    for replay and every riddle id is returned, on the strength of the
+    caller's own in-memory claim."""
+    awards = [(riddle_id, sd, st, bool(reset), reason) for riddle_id, sd, st, reset, reason in awards]
+    if not awards:
+        return set()
     try:
-        async with db_pool.acquire() as conn:
+        claimed = await claim_round_outcomes(int(user_id), outcome, awards)
+    except (resilience.CircuitOpenError, *resilience.TRANSIENT_ERRORS) as e:
+        if not defer:
+            raise
+        if len(deferred_outcomes) >= DEFERRED_OUTCOMES_MAX:
+            print(f"[record_round_outcomes] ⚠️ Deferred queue full, dropping {outcome} for user {user_id}")
+            raise
+        deferred_outcomes.append((int(user_id), outcome, awards))
+        print(f"[record_round_outcomes] Deferred {outcome} for user {user_id} ({type(e).__name__}), {len(deferred_outcomes)} queued")
+        return {riddle_id for riddle_id, *_ in awards}
+    apply_round_outcomes(user_id, outcome, awards, claimed)
+    return claimed
+
+def has_deferred_outcomes(user_id):
+    """True while some of this user's outcomes wait in the deferred queue,
+    i.e. their cached score doesn't include them yet."""
+    user_id = int(user_id)
+    return any(queued_user == user_id for queued_user, _, _ in deferred_outcomes)
+
+async def replay_deferred_outcomes():
+    """Write queued outcomes in order until the queue is empty or the
+    database fails again. Returns how many were written."""
+    replayed = 0
+    while deferred_outcomes:
+        user_id, outcome, awards = deferred_outcomes[0]
+        try:
+            claimed = await claim_round_outcomes(user_id, outcome, awards)
+        except (resilience.CircuitOpenError, *resilience.TRANSIENT_ERRORS):
+            break
+        except Exception as e:
+            print(f"[replay_deferred_outcomes] Dropping {outcome} for user {user_id}: {e}")
+            claimed = set()
+        deferred_outcomes.popleft()
+        apply_round_outcomes(user_id, outcome, awards, claimed)
+        replayed += 1
+    if replayed:
+        print(f"[replay_deferred_outcomes] Replayed {replayed}, {len(deferred_outcomes)} still queued")
+    return replayed
+
+def apply_round_outcomes(user_id, outcome, awards, claimed):
+    """Cache, read-your-writes and pubsub bookkeeping for the claimed awards."""
+    records = [(int(user_id), sd, st, reset, reason) for riddle_id, sd, st, reset, reason in awards if riddle_id in claimed]
+    if records:
+        note_write(("user", int(user_id)))
+        for uid, sd, st, reset, _ in records:
+            cache.apply_score_event(uid, sd, st, reset)
+        publish_score_events(records)
+    print(f"[record_round_outcomes] user={user_id} {outcome}: claimed {sorted(claimed)} of {len(awards)}")
+    return claimed
+
+# job_runs key for the once-a-day missed riddle settlement, which isn't
+# tied to one guild's schedule
+SETTLE_GUILD_ID = 0
+SETTLE_JOB = "settle_missed_riddles"
+
+@backend_op
+async def claim_missed_riddles(riddle_id: int):
+    """Penalize everyone who missed the day's daily riddles, once per day.
+
+    The day is the UTC date riddle_id was posted. Nothing happens while a
+    daily riddle posted that day is still unrevealed, so with several
+    guilds the last reveal settles. That reveal claims the day in job_runs
+    and, in the same transaction, records a missed_riddle event for every
+    player with a score or streak who has no round_participants row for any
+    of the day's daily riddles (neither solved nor already penalized) and
+    didn't write one of them. Returns the penalized user ids, or None if
+    the day isn't ready or was already settled."""
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    async with db_pool.acquire() as conn:
+        async with conn.transaction():
+            day = await conn.fetchval("""
+                SELECT (posted_at AT TIME ZONE 'UTC')::date
+                FROM user_submitted_questions
+                WHERE riddle_id = $1 AND closes_at IS NULL
+            """, riddle_id)
+            if day is None:
+                return None
+            still_open = await conn.fetchval("""
+                SELECT EXISTS (
+                    SELECT 1 FROM user_submitted_questions
+                    WHERE (posted_at AT TIME ZONE 'UTC')::date = $1
+                      AND closes_at IS NULL AND revealed_at IS NULL
+                )
+            """, day)
+            if still_open:
+                return None
+            claimed = await conn.fetchval("""
+                INSERT INTO job_runs (guild_id, job, run_date, finished_at)
+                VALUES ($1, $2, $3, NOW())
+                ON CONFLICT (guild_id, job, run_date) DO NOTHING
+                RETURNING TRUE
+            """, SETTLE_GUILD_ID, SETTLE_JOB, day)
+            if not claimed:
+                return None
+            rows = await conn.fetch("""
+                WITH day_riddles AS (
+                    SELECT riddle_id, user_id
+                    FROM user_submitted_questions
+                    WHERE (posted_at AT TIME ZONE 'UTC')::date = $1 AND closes_at IS NULL
+                )
+                INSERT INTO score_events (user_id, score_delta, streak_delta, reset_streak, reason)
+                SELECT u.user_id, -1, 0, TRUE, 'missed_riddle'
+                FROM users u
+                WHERE (u.streak > 0 OR u.score > 0)
+                  AND NOT EXISTS (SELECT 1 FROM day_riddles d WHERE d.user_id = u.user_id)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM round_participants p JOIN day_riddles d USING (riddle_id)
+                      WHERE p.user_id = u.user_id
+                  )
+                RETURNING user_id
+            """, day)
+    print(f"[claim_missed_riddles] Settled {day}: {len(rows)} missed")
+    return [row["user_id"] for row in rows]
+
+async def settle_missed_riddles(riddle_id):
+    """claim_missed_riddles plus the cache and pubsub bookkeeping."""
+    penalized = await claim_missed_riddles(riddle_id)
+    if penalized is None:
+        return None
+    records = [(int(user_id), -1, 0, True, "missed_riddle") for user_id in penalized]
+    if records:
+        note_write(*{("user", uid) for uid, *_ in records})
+        for uid, sd, st, reset, _ in records:
+            cache.apply_score_event(uid, sd, st, reset)
+        publish_score_events(records)
+    return penalized
+
+# Per-user fold of an `events` CTE, clamping at zero after every event just
+# like cache.apply_score_event. Starting from s, a user ends on
+# GREATEST(s + total, total - low), low being the lowest running sum, so
+# the events never need replaying one by one. A streak reset restarts the
+# streak from zero at the last reset event.
+FOLD_EVENTS = """
+    streak_runs AS (
+        SELECT user_id, event_id, score_delta, streak_delta,
+               event_id >= COALESCE(MAX(event_id) FILTER (WHERE reset_streak) OVER (PARTITION BY user_id), 0) AS counts,
+               BOOL_OR(reset_streak) OVER (PARTITION BY user_id) AS reset
+        FROM events
+    ),
+    running AS (
+        SELECT user_id, score_delta, streak_delta, counts, reset,
+               SUM(score_delta) OVER w AS score_run,
+               SUM(CASE WHEN counts THEN streak_delta ELSE 0 END) OVER w AS streak_run
+        FROM streak_runs
+        WINDOW w AS (PARTITION BY user_id ORDER BY event_id)
+    ),
+    folded AS (
+        SELECT user_id,
+               SUM(score_delta) AS score_total,
+               MIN(score_run) AS score_low,
+               SUM(CASE WHEN counts THEN streak_delta ELSE 0 END) AS streak_total,
+               MIN(CASE WHEN counts THEN streak_run END) AS streak_low,
+               BOOL_OR(reset) AS reset
+        FROM running
+        GROUP BY user_id
+    )
+"""
+
+async def compact_score_events():
+    """Fold pending ledger rows into the users snapshot. Returns rows folded."""
+    folded = await fold_score_events()
+    if folded:
+        note_write("scores")
+        print(f"[compact_score_events] Folded {folded} events into users")
+    return folded
+
+@backend_op(idempotent=True, timeout=None)
+async def fold_score_events():
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    async with db_pool.acquire() as conn:
+        # One snapshot for the whole fold: under READ COMMITTED an event
+        # with a lower id committing between the fold and the mark would be
+        # marked compacted without ever reaching users
+        async with conn.transaction(isolation="repeatable_read"):
+            # Only one compactor at a time; others just skip this round
+            locked = await conn.fetchval("SELECT pg_try_advisory_xact_lock(hashtext('score_events_compact'))")
+            if not locked:
+                return 0
+
+            high = await conn.fetchval("SELECT MAX(event_id) FROM score_events WHERE NOT compacted")
+            if high is None:
+                return 0
+
             await conn.execute("""
                 INSERT INTO users (user_id, score, streak, created_at)
-                VALUES ($1, 1, 0, NOW())
-                ON CONFLICT (user_id) DO UPDATE
-                SET score = users.score + 1
-            """, int(user_id))
-        print(f"[increment_score] Incremented score for user {user_id}")
+                SELECT DISTINCT user_id, 0, 0, NOW()
+                FROM score_events
+                WHERE NOT compacted AND event_id <= $1
+                ON CONFLICT (user_id) DO NOTHING
+            """, high)
 
-    except Exception as e:
-        print(f"[increment_score] ERROR: {e}")
+            await conn.execute(f"""
+                WITH events AS (
+                    SELECT user_id, event_id, score_delta, streak_delta, reset_streak
+                    FROM score_events
+                    WHERE NOT compacted AND event_id <= $1
+                ),
+                {FOLD_EVENTS}
+                UPDATE users u
+                SET score = GREATEST(u.score + f.score_total, f.score_total - f.score_low),
+                    streak = GREATEST(CASE WHEN f.reset THEN 0 ELSE u.streak END + f.streak_total,
+                                      f.streak_total - f.streak_low)
+                FROM folded f
+                WHERE u.user_id = f.user_id
+            """, high)
+
+            result = await conn.execute(
+                "UPDATE score_events SET compacted = TRUE WHERE NOT compacted AND event_id <= $1",
+                high
+            )
+    return int(result.split()[-1])
 
-        embed = discord.Embed(
-            title="⛔ User Not Found",
-            description=(
-                "That user does not yet exist in the database.\n\n"
-                "Have them **submit** or **answer** a riddle first — their account will be created automatically.\n"
-                "After that, this command will work."
+@backend_op(idempotent=True)
+async def get_score_as_of(user_id: int, as_of):
+    """Score and streak for a user as they stood at as_of, answered from the ledger."""
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    pool = await read_pool(("user", int(user_id)))
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(f"""
+            WITH events AS (
+                SELECT user_id, event_id, score_delta, streak_delta, reset_streak
+                FROM score_events
+                WHERE user_id = $1 AND created_at <= $2
             ),
-            color=discord.Color.red()
-        )
-        await interaction.followup.send(embed=embed, ephemeral=True)
+            {FOLD_EVENTS}
+            SELECT COALESCE(MAX(score_total - LEAST(score_low, 0)), 0) AS score,
+                   COALESCE(MAX(streak_total - LEAST(streak_low, 0)), 0) AS streak
+            FROM folded
+        """, user_id, as_of)
+        return {"score": row["score"], "streak": row["streak"]}
+
+@backend_op(idempotent=True)
+async def user_exists(user_id: int, conn=None) -> bool:
+    if conn is None:
+        async with db_pool.acquire() as conn:
+            # The unwrapped function: one guarded call, not two nested ones
+            return await user_exists.__wrapped__(user_id, conn)
+    return await conn.fetchval("SELECT 1 FROM users WHERE user_id = $1", int(user_id)) is not None
+
+async def adjust_score_and_reset_streak(user_id: str, score_delta: int):
+    await record_score_event(user_id, score_delta=score_delta, reset_streak=True, reason="adjust")
+    print(f"[adjust_score_and_reset_streak] Adjusted score by {score_delta} and reset streak for user {user_id}")
 
+async def get_score(user_id: str) -> int:
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    print(f"[get_score] Called for user_id={user_id}")
+    cached = cache.get_score(user_id)
+    if cached is not None:
+        return cached
+    return await get_score_uncached(user_id)
+
+@backend_op(idempotent=True)
+async def get_score_uncached(user_id: str) -> int:
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    pool = await read_pool("scores", ("user", int(user_id)))
+    async with pool.acquire() as conn:
+        # Snapshot plus anything not yet compacted, so a reply right after a
+        # guess shows the new total
+        score = await conn.fetchval(f"""
+            WITH events AS (
+                SELECT user_id, event_id, score_delta, streak_delta, reset_streak
+                FROM score_events WHERE user_id = $1 AND NOT compacted
+            ),
+            {FOLD_EVENTS}
+            SELECT CASE WHEN f.user_id IS NULL THEN base.score
+                        ELSE GREATEST(base.score + f.score_total, f.score_total - f.score_low) END
+            FROM (SELECT COALESCE((SELECT score FROM users WHERE user_id = $1), 0) AS score) base
+            LEFT JOIN folded f ON TRUE
+        """, int(user_id))
+        print(f"[get_score] Score for user {user_id}: {score}")
+        return score if score is not None else 0
+
+async def get_streak(user_id: str) -> int:
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    cached = cache.get_streak(user_id)
+    if cached is not None:
+        return cached
+    return await get_streak_uncached(user_id)
+
+@backend_op(idempotent=True)
+async def get_streak_uncached(user_id: str) -> int:
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    pool = await read_pool("scores", ("user", int(user_id)))
+    async with pool.acquire() as conn:
+        streak = await conn.fetchval(f"""
+            WITH events AS (
+                SELECT user_id, event_id, score_delta, streak_delta, reset_streak
+                FROM score_events WHERE user_id = $1 AND NOT compacted
+            ),
+            {FOLD_EVENTS}
+            SELECT CASE WHEN f.user_id IS NULL THEN base.streak
+                        ELSE GREATEST(CASE WHEN f.reset THEN 0 ELSE base.streak END + f.streak_total,
+                                      f.streak_total - f.streak_low) END
+            FROM (SELECT COALESCE((SELECT streak FROM users WHERE user_id = $1), 0) AS streak) base
+            LEFT JOIN folded f ON TRUE
+        """, int(user_id))
+        return streak or 0
 
- 
 
 async def increment_streak(user_id: int, add_streak: int = 1, interaction: discord.Interaction = None):
     if db_pool is None:
@@ -282,28 +1183,22 @@ async def increment_streak(user_id: int, add_streak: int = 1, interaction: disco
     print(f"[increment_streak] Called for user_id={user_id}, add_streak={add_streak}")
 
     try:
-        async with db_pool.acquire() as conn:
-            user = await conn.fetchrow("SELECT streak FROM users WHERE user_id = $1", user_id)
-            if not user:
-                if interaction:
-                    embed = discord.Embed(
-                        title="⛔ User Not Found",
-                        description=(
-                            "That user does not yet exist in the database.\n\n"
-                            "Have them **submit** or **answer** a riddle first — their account will be created automatically.\n"
-                            "After that, this command will work."
-                        ),
-                        color=discord.Color.red()
-                    )
-                    await interaction.followup.send(embed=embed, ephemeral=True)
-                return False, None
-
-            new_streak = user["streak"] + add_streak
-            await conn.execute(
-                "UPDATE users SET streak = streak + $1 WHERE user_id = $2",
-                add_streak,
-                user_id
-            )
+        if not await user_exists(user_id):
+            if interaction:
+                embed = discord.Embed(
+                    title="⛔ User Not Found",
+                    description=(
+                        "That user does not yet exist in the database.\n\n"
+                        "Have them **submit** or **answer** a riddle first — their account will be created automatically.\n"
+                        "After that, this command will work."
+                    ),
+                    color=discord.Color.red()
+                )
+                await interaction.followup.send(embed=embed, ephemeral=True)
+            return False, None
+
+        await record_score_event(user_id, streak_delta=add_streak, reason="streak_adjust")
+        new_streak = await get_streak(user_id)
 
         print(f"[increment_streak] Incremented streak for user {user_id}, new streak {new_streak}")
         return True, new_streak
@@ -324,28 +1219,22 @@ async def increment_score(user_id: int, add_score: int = 1, interaction: discord
     print(f"[increment_score] Called for user_id={user_id}, add_score={add_score}")
 
     try:
-        async with db_pool.acquire() as conn:
-            user = await conn.fetchrow("SELECT score FROM users WHERE user_id = $1", user_id)
-            if not user:
-                if interaction:
-                    embed = discord.Embed(
-                        title="⛔ User Not Found",
-                        description=(
-                            "That user does not yet exist in the database.\n\n"
-                            "Have them **submit** or **answer** a riddle first — their account will be created automatically.\n"
-                            "After that, this command will work."
-                        ),
-                        color=discord.Color.red()
-                    )
-                    await interaction.followup.send(embed=embed, ephemeral=True)
-                return False, None
-
-            new_score = user["score"] + add_score
-            await conn.execute(
-                "UPDATE users SET score = score + $1 WHERE user_id = $2",
-                add_score,
-                user_id
-            )
+        if not await user_exists(user_id):
+            if interaction:
+                embed = discord.Embed(
+                    title="⛔ User Not Found",
+                    description=(
+                        "That user does not yet exist in the database.\n\n"
+                        "Have them **submit** or **answer** a riddle first — their account will be created automatically.\n"
+                        "After that, this command will work."
+                    ),
+                    color=discord.Color.red()
+                )
+                await interaction.followup.send(embed=embed, ephemeral=True)
+            return False, None
+
+        await record_score_event(user_id, score_delta=add_score, reason="score_adjust")
+        new_score = await get_score(user_id)
 
         print(f"[increment_score] Updated score for user {user_id}, new score {new_score}")
         return True, new_score
@@ -357,10 +1246,116 @@ async def increment_score(user_id: int, add_score: int = 1, interaction: discord
         return False, None
 
 
+@backend_op(idempotent=True)
 async def get_all_scores_and_streaks():
     if db_pool is None:
         raise RuntimeError("DB pool is not initialized.")
-    
-    async with db_pool.acquire() as conn:
+
+    pool = await read_pool("scores")
+    async with pool.acquire() as conn:
         rows = await conn.fetch("SELECT user_id, score, streak FROM users")
-        return {str(row["user_id"]): {"score": row["score"], "streak": row["streak"]} for row in rows}
\ No newline at end of file
+        return {str(row["user_id"]): {"score": row["score"], "streak": row["streak"]} for row in rows}
+
+@backend_op(idempotent=True)
+async def get_max_total():
+    """Highest score + streak of any user."""
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    pool = await read_pool("scores")
+    async with pool.acquire() as conn:
+        return await conn.fetchval(
+            "SELECT COALESCE(MAX(COALESCE(score, 0) + COALESCE(streak, 0)), 0) FROM users"
+        )
+
+
+# -------------------
+# Leaderboard snapshots
+# -------------------
+
+@backend_op(idempotent=True, timeout=None)
+async def snapshot_leaderboard(snapshot_date=None):
+    """Write today's score/streak/rank for every active user in one statement."""
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    async with db_pool.acquire() as conn:
+        result = await conn.execute("""
+            INSERT INTO leaderboard_snapshots (snapshot_date, user_id, score, streak, rank)
+            SELECT COALESCE($1::date, CURRENT_DATE), user_id, score, streak,
+                   RANK() OVER (ORDER BY score DESC, streak DESC)
+            FROM users
+            WHERE score >= 1 OR streak >= 1
+            ON CONFLICT (snapshot_date, user_id) DO UPDATE
+            SET score = EXCLUDED.score,
+                streak = EXCLUDED.streak,
+                rank = EXCLUDED.rank
+        """, snapshot_date)
+    note_write("scores")
+    print(f"[snapshot_leaderboard] {result}")
+    return result
+
+def leaderboard_with_movement_sql(where="TRUE", rank_offset="0"):
+    """Live ranking joined against the most recent snapshot from before
+    today, optionally over a slice of users whose ranks start after
+    rank_offset players."""
+    return f"""
+    WITH ranked AS (
+        SELECT user_id, score, streak,
+               RANK() OVER (ORDER BY score DESC, streak DESC) + {rank_offset} AS rank,
+               {SCORE_TIER_SQL} AS score_tier,
+               {STREAK_TIER_SQL} AS streak_tier
+        FROM users
+        WHERE (score >= 1 OR streak >= 1) AND {where}
+    ),
+    previous AS (
+        SELECT MAX(snapshot_date) AS snapshot_date
+        FROM leaderboard_snapshots
+        WHERE snapshot_date < CURRENT_DATE
+    )
+    SELECT r.user_id, r.score, r.streak, r.rank, r.score_tier, r.streak_tier, s.rank AS prev_rank
+    FROM ranked r
+    LEFT JOIN leaderboard_snapshots s
+        ON s.snapshot_date = (SELECT snapshot_date FROM previous)
+       AND s.user_id = r.user_id
+    """
+
+LEADERBOARD_WITH_MOVEMENT_SQL = leaderboard_with_movement_sql()
+
+@backend_op(idempotent=True)
+async def get_leaderboard_with_movement(tier: str = None, limit: int = None, offset: int = 0):
+    """One page of the ranking, optionally for a single tier. Every row also
+    carries the total row count and top score of the whole (filtered)
+    leaderboard, so callers never need more than the page on screen."""
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    tier_sql, args = tier_filter_sql(tier) if tier else (None, [])
+    offset_sql, offset_args = score_tier_offset_sql(tier, 1 + len(args)) if tier else (None, [])
+    if offset_sql is not None:
+        # Rank only the tier's rows, a range on users_score_streak_idx
+        source = leaderboard_with_movement_sql(tier_sql, offset_sql)
+        where = "TRUE"
+        args += offset_args
+    else:
+        # Streak tiers cut across the score ordering: rank everyone, then filter
+        source = LEADERBOARD_WITH_MOVEMENT_SQL
+        where = tier_sql or "TRUE"
+    query = f"""
+        SELECT lb.*, COUNT(*) OVER () AS total, MAX(lb.score) OVER () AS max_score
+        FROM ({source}) lb
+        WHERE {where}
+        ORDER BY rank, user_id
+        LIMIT ${len(args) + 1} OFFSET ${len(args) + 2}
+    """
+    pool = await read_pool("scores")
+    async with pool.acquire() as conn:
+        return await conn.fetch(query, *args, limit, offset)
+
+@backend_op(idempotent=True)
+async def get_user_rank_movement(user_id: int):
+    if db_pool is None:
+        raise RuntimeError("DB pool is not initialized. Call create_db_pool() first.")
+    pool = await read_pool("scores", ("user", int(user_id)))
+    async with pool.acquire() as conn:
+        return await conn.fetchrow(
+            f"SELECT * FROM ({LEADERBOARD_WITH_MOVEMENT_SQL}) lb WHERE lb.user_id = $1",
+            user_id
+        )
@@ -0,0 +1,85 @@
+"""Bounded, prioritized queue between on_message and the guess handler.
+
+on_message only does the cheap checks (open round, rate limit, answer
+index lookup) and hands the guess over; a fixed number of worker tasks do
+the database and REST work, so a burst of messages can't fan out into
+thousands of handlers competing for the pool and Discord's rate limits.
+
+Correct guesses jump ahead of wrong ones. Once the backlog passes the high
+water mark, `congested` tells the handler to skip cosmetic replies (guesses
+left, countdowns, reminders); once it is full, new wrong guesses are shed
+outright: deleted by the caller but not counted as attempts. Correct
+guesses are always queued. on_message only counts a guess as correct for
+riddles the user can still solve, so with the rate limiter they are bounded
+by the number of players who haven't solved yet.
+"""
+import asyncio
+import itertools
+import os
+import traceback
+
+
+CORRECT = 0
+WRONG = 1
+
+WORKERS = int(os.getenv("GUESS_WORKERS") or 8)
+MAX_QUEUED = int(os.getenv("GUESS_QUEUE_MAX") or 2000)
+HIGH_WATER = int(os.getenv("GUESS_QUEUE_HIGH_WATER") or MAX_QUEUED // 4)
+
+
+class GuessQueue:
+    def __init__(self, handler, workers=WORKERS, max_queued=MAX_QUEUED, high_water=HIGH_WATER):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.high_water = min(high_water, max_queued)
+        self.queue = asyncio.PriorityQueue()
+        # Tie-breaker so equal priorities stay first-in, first-out
+        self.counter = itertools.count()
+        self.tasks = []
+        self.peak = 0
+        self.stats = {"queued": 0, "processed": 0, "shed": 0, "errors": 0}
+
+    def __len__(self):
+        return self.queue.qsize()
+
+    @property
+    def congested(self):
+        return self.queue.qsize() >= self.high_water
+
+    def put(self, priority, *args):
+        """Queue handler(*args); False if the guess was shed instead."""
+        if priority != CORRECT and self.queue.qsize() >= self.max_queued:
+            self.stats["shed"] += 1
+            return False
+        self.queue.put_nowait((priority, next(self.counter), args))
+        self.stats["queued"] += 1
+        self.peak = max(self.peak, self.queue.qsize())
+        return True
+
+    def start(self):
+        self.tasks = [task for task in self.tasks if not task.done()]
+        loop = asyncio.get_running_loop()
+        while len(self.tasks) < self.workers:
+            self.tasks.append(loop.create_task(self._work()))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def _work(self):
+        while True:
+            _, _, args = await self.queue.get()
+            try:
+                await self.handler(*args)
+                self.stats["processed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[guess_queue] ERROR handling guess: {e}")
+                traceback.print_exc()
+            finally:
+                self.queue.task_done()
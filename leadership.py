@@ -0,0 +1,99 @@
+import asyncio
+import os
+
+import asyncpg
+
+
+class LeaderElector:
+    """Elects one leader among bot replicas sharing a Postgres database.
+
+    The leader holds a session-level advisory lock on its own dedicated
+    connection (not a pool connection, which could be recycled and silently
+    drop the lock). If the leader process dies or loses its connection,
+    Postgres releases the lock and a standby polling pg_try_advisory_lock
+    takes over within LEADER_RETRY_SECONDS. The leader pings its connection
+    every LEADER_HEARTBEAT_SECONDS and steps down as soon as a ping fails,
+    since by then another replica may already hold the lock.
+
+    With no dsn (e.g. the embedded SQLite backend) there is only ever one
+    process, so it is leader straight away.
+    """
+
+    def __init__(self, dsn, on_elected, on_demoted, key=None, retry=None, heartbeat=None):
+        self.dsn = dsn
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.key = key or os.getenv("LEADER_LOCK_KEY") or "riddle_bot_leader"
+        self.retry = retry or float(os.getenv("LEADER_RETRY_SECONDS") or 2)
+        self.heartbeat = heartbeat or float(os.getenv("LEADER_HEARTBEAT_SECONDS") or 2)
+        self.is_leader = False
+        self.conn = None
+        self.task = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+        return self.task
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self._demote()
+        await self._close()
+
+    async def _elect(self):
+        self.is_leader = True
+        print(f"[leadership] 👑 This replica is now the leader ({self.key})")
+        try:
+            await self.on_elected()
+        except Exception as e:
+            print(f"[leadership] ERROR starting leader duties: {e}")
+
+    async def _demote(self):
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        print("[leadership] Stepping down as leader")
+        try:
+            await self.on_demoted()
+        except Exception as e:
+            print(f"[leadership] ERROR stopping leader duties: {e}")
+
+    async def _close(self):
+        if self.conn is not None:
+            try:
+                await self.conn.close(timeout=self.heartbeat)
+            except Exception:
+                self.conn.terminate()
+            self.conn = None
+
+    async def _run(self):
+        if not self.dsn:
+            await self._elect()
+            return
+
+        while True:
+            try:
+                self.conn = await asyncpg.connect(
+                    dsn=self.dsn,
+                    timeout=self.retry * 5,
+                    server_settings={"application_name": "riddle-bot-leader-election"},
+                )
+                while not await self.conn.fetchval("SELECT pg_try_advisory_lock(hashtext($1))", self.key):
+                    await asyncio.sleep(self.retry)
+                await self._elect()
+                while True:
+                    await asyncio.sleep(self.heartbeat)
+                    await asyncio.wait_for(self.conn.fetchval("SELECT 1"), timeout=self.heartbeat)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[leadership] Election connection failed: {e}")
+                await self._demote()
+                await self._close()
+                await asyncio.sleep(self.retry)
@@ -1,6 +1,5 @@
 import os
 import re
-import random
 import traceback
 import asyncio
 from datetime import datetime, timezone, time, timedelta
@@ -13,7 +12,21 @@ from discord.ui import View, Button
 import asyncpg
 
 import db
+import cache
+import perf
+import memstats
+import pubsub
 import commands
+from ratelimit import limiter_from_env
+from guess_queue import GuessQueue, CORRECT, WRONG
+from ranks import get_rank
+from command_sync import sync_commands_if_changed
+from scheduler import Scheduler
+from answer_index import AnswerIndex
+from round_state import RoundState
+from riddle_stats import SolveStats
+from riddle_picker import RiddlePicker
+from leadership import LeaderElector
 from views import LeaderboardView, create_leaderboard_embed
 from db import create_db_pool, upsert_user, get_user, insert_submitted_question, get_all_submitted_questions, increment_score, increment_streak, get_score, get_all_scores_and_streaks
 
@@ -31,11 +44,173 @@ tree = app_commands.CommandTree(client)
 
 # REMOVED local db_pool = None — use db.db_pool everywhere
 
-current_riddle = None
-current_answer_revealed = False
-correct_users = set()
-guess_attempts = {}
-deducted_for_user = set()
+# Open riddles per game channel: channel id -> {riddle_id: round}. Usually
+# just the daily riddle; a rapid-fire hour opens several at once.
+rounds = {}
+# channel id -> AnswerIndex over that channel's open riddles
+answer_indexes = {}
+
+RAPID_FIRE_MAX_RIDDLES = int(os.getenv("RAPID_FIRE_MAX_RIDDLES") or 10)
+
+def open_round(channel_id, riddle, kind="daily", closes_at=None, posted_at=None):
+    round_ = RoundState(riddle, kind, closes_at, posted_at)
+    rounds.setdefault(channel_id, {})[riddle["riddle_id"]] = round_
+    index = answer_indexes.setdefault(channel_id, AnswerIndex())
+    index.add(riddle["riddle_id"], clean_and_filter(riddle["answer"]))
+    return round_
+
+
+def close_round(channel_id, riddle_id):
+    channel_rounds = rounds.get(channel_id, {})
+    round_ = channel_rounds.pop(riddle_id, None)
+    index = answer_indexes.get(channel_id)
+    if index is not None:
+        index.remove(riddle_id)
+    if not channel_rounds:
+        rounds.pop(channel_id, None)
+        answer_indexes.pop(channel_id, None)
+    return round_
+
+
+def has_daily_round(channel_id):
+    return any(r.daily for r in rounds.get(channel_id, {}).values())
+
+
+# Other replicas sharing the database hold their own copy of the round state;
+# every change to it is published (see pubsub.py) and applied below.
+
+def publish_round_opened(channel_id, round_):
+    riddle = round_.riddle
+    pubsub.publish("riddle_posted", {
+        "channel_id": channel_id,
+        "riddle": {key: riddle.get(key) for key in ("riddle_id", "question", "answer", "user_id")},
+        "kind": round_.kind,
+        "closes_at": round_.closes_at,
+        "posted_at": round_.stats.opened_at,
+    })
+
+
+def on_riddle_posted(event):
+    channel_id = event["channel_id"]
+    riddle = event["riddle"]
+    if riddle["riddle_id"] in rounds.get(channel_id, {}):
+        return
+    if event["kind"] == "daily":
+        # Only one daily riddle is ever open per channel; ours is stale
+        for round_ in list(rounds.get(channel_id, {}).values()):
+            if round_.daily:
+                close_round(channel_id, round_.riddle_id)
+    closes_at = datetime.fromisoformat(event["closes_at"]) if event.get("closes_at") else None
+    posted_at = datetime.fromisoformat(event["posted_at"]) if event.get("posted_at") else None
+    open_round(channel_id, riddle, kind=event["kind"], closes_at=closes_at, posted_at=posted_at)
+    if closes_at is not None:
+        # Whichever replica's timer fires first claims the reveal
+        schedule_rapid_fire_close(channel_id, [riddle["riddle_id"]], closes_at)
+    picker.remove(riddle["riddle_id"])
+    if cache.unused_riddle_count:
+        cache.unused_riddle_count -= 1
+
+
+def on_user_solved(event):
+    round_ = rounds.get(event["channel_id"], {}).get(event["riddle_id"])
+    if round_ is not None:
+        round_.mark_solved(event["user_id"])
+
+
+def on_user_penalized(event):
+    round_ = rounds.get(event["channel_id"], {}).get(event["riddle_id"])
+    if round_ is not None:
+        round_.mark_deducted(event["user_id"])
+
+
+def on_riddle_closed(event):
+    # Revealed elsewhere, or deleted with /removeriddle
+    picker.remove(event["riddle_id"])
+    closed = []
+    for channel_id in list(rounds):
+        round_ = close_round(channel_id, event["riddle_id"])
+        if round_ is not None:
+            round_.revealed = True
+            closed.append(round_)
+    return closed
+
+
+async def on_riddle_revealed(event):
+    # The revealing replica only counted the guesses it handled itself
+    for round_ in on_riddle_closed(event):
+        if round_.stats.guesses:
+            await add_round_stats(round_)
+
+
+def on_riddle_added(event):
+    riddle = dict(event)
+    if isinstance(riddle.get("created_at"), str):
+        riddle["created_at"] = datetime.fromisoformat(riddle["created_at"])
+    picker.add(riddle)
+    if cache.unused_riddle_count is not None:
+        cache.unused_riddle_count += 1
+
+
+def on_scores_changed(event):
+    for user_id, score_delta, streak_delta, reset_streak in event["events"]:
+        cache.apply_score_event(user_id, score_delta, streak_delta, reset_streak)
+
+
+def on_schedule_changed(event):
+    # Every replica keeps the schedules: the leader to fire them, the rest
+    # for next_run() and reveal times in replies
+    scheduler.set_schedule(
+        event["guild_id"], event["job"],
+        datetime.strptime(event["run_time"], "%H:%M").time(),
+        event["timezone"], event["channel_id"],
+    )
+
+
+async def resync_replica_state():
+    # Events were missed while the listen connection was down
+    active = {riddle["riddle_id"] for riddle in await db.get_active_riddles()}
+    for channel_id, channel_rounds in list(rounds.items()):
+        for riddle_id in list(channel_rounds):
+            if riddle_id not in active:
+                close_round(channel_id, riddle_id)
+    await restore_active_rounds()
+    await warm_scores()
+    await scheduler.load()
+
+
+pubsub.subscribe("riddle_posted", on_riddle_posted)
+pubsub.subscribe("user_solved", on_user_solved)
+pubsub.subscribe("user_penalized", on_user_penalized)
+pubsub.subscribe("riddle_revealed", on_riddle_revealed)
+pubsub.subscribe("riddle_removed", on_riddle_closed)
+pubsub.subscribe("riddle_added", on_riddle_added)
+# Too many rows to send; rebuild from the database before the next pick
+pubsub.subscribe("riddles_imported", lambda event: picker.invalidate())
+pubsub.subscribe("scores_changed", on_scores_changed)
+pubsub.subscribe("scores_settled", lambda event: warm_scores())
+pubsub.subscribe("schedule_changed", on_schedule_changed)
+pubsub.subscribe("schedules_seeded", lambda event: scheduler.load())
+
+
+guess_limiter = limiter_from_env()
+
+# Guesses accepted by on_message, scored by a fixed pool of workers
+guess_queue = GuessQueue(lambda message, matched: process_guess(message, matched))
+
+# Weighted choice of the next riddle(s) to post from the unused bank
+picker = RiddlePicker()
+
+scheduler = Scheduler()
+
+# Timers closing rapid-fire riddles; kept so they aren't garbage collected
+rapid_fire_tasks = set()
+
+memstats.track("rounds", lambda: rounds)
+memstats.track("answer_indexes", lambda: answer_indexes)
+memstats.track("guess_limiter.buckets", lambda: guess_limiter.buckets)
+memstats.track("guess_queue", lambda: guess_queue.queue)
+memstats.track("cache.scores", lambda: cache.scores)
+memstats.track("riddle_picker", lambda: picker)
 
 STOP_WORDS = {"a", "an", "the", "is", "was", "were", "of", "to", "and", "in", "on", "at", "by"}
 
@@ -45,20 +220,32 @@ def clean_and_filter(text):
     
 
 async def count_unused_questions():
-    async with db.db_pool.acquire() as conn:
-        result = await conn.fetchval("SELECT COUNT(*) FROM user_submitted_questions WHERE posted_at IS NULL")
+    result = await db.count_unused_questions_db()
+    cache.unused_riddle_count = result or 0
     return result or 0
 
 
 async def get_unused_questions():
-    async with db.db_pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT riddle_id, question, answer, user_id FROM user_submitted_questions WHERE posted_at IS NULL"
-        )
-        return [dict(row) for row in rows]
+    return [dict(row) for row in await db.get_unused_riddles()]
+
 
+async def rebuild_picker():
+    riddles, history = await asyncio.gather(get_unused_questions(), db.get_solve_history())
+    picker.rebuild(riddles, [
+        (row["user_id"], row["question"], row["answer"], row["participants"], row["solvers"])
+        for row in history
+    ])
+    print(f"[riddle_picker] Weighted {len(picker)} unused riddles using {len(history)} past results")
 
-async def format_question_embed(qdict, submitter=None):
+
+async def pick_unused_riddles(count=1):
+    """Take `count` riddles to post, favouring ones likely to be neither trivial nor impossible."""
+    if picker.needs_rebuild():
+        await rebuild_picker()
+    return picker.take(count)
+
+
+async def format_question_embed(qdict, submitter=None, reveal_text="23:00 UTC"):
     # Determine submitter name
     if submitter is None:
         submitter_name = "Riddle of the Day Bot"
@@ -72,7 +259,7 @@ async def format_question_embed(qdict, submitter=None):
         description=qdict['question'],
         color=discord.Color.blurple()
     )
-    embed.set_footer(text="Answer will be revealed at 23:00 UTC. Use /submitriddle to contribute your own!")
+    embed.set_footer(text=f"Answer will be revealed at {reveal_text}. Use /submitriddle to contribute your own!")
     
     embed.add_field(
         name="Submitted By",
@@ -84,81 +271,97 @@ async def format_question_embed(qdict, submitter=None):
 
 
 
-def get_rank(score=0, streak=0):
-    # Prioritize streak if provided
-    if streak > 0:
-        if streak >= 30:
-            return "👑⛳ Hole in One Legend (30+ day streak)"
-        elif streak >= 20:
-            return "🦅 Eagle Master (20+ day streak)"
-        elif streak >= 10:
-            return "🐦 Birdie Streaker (10+ day streak)"
-        elif streak >= 5:
-            return "🐤 Par Player (5+ day streak)"
-        elif streak >= 3:
-            return "🏌️ Duffer (3+ day streak)"
-        else:
-            return "Greenhorn 🌱"
-
-    # Fallback to score if no streak
-    if score <= 0:
-        return "Dice Roller 🎲"
-    elif score <= 5:
-        return "Safe Square User ⭐ "
-    elif score <= 15:
-        return "Triple Six Samauri 🎲🥷"
-    elif score <= 25:
-        return "Piece Eater 🏠🔙 "
-    elif score <= 50:
-        return "Safe Zone Master 🔒"
-    else:
-        return "Goal Collector 👑🥅"
-
-
-
 @client.event
+@perf.timed("on_message")
 async def on_message(message):
     if message.author.bot:
         return
 
-    ch_id = int(os.getenv("DISCORD_CHANNEL_ID") or 0)
-    if message.channel.id != ch_id:
+    channel_rounds = rounds.get(message.channel.id)
+    if not channel_rounds:
         return
 
-    global correct_users, guess_attempts, deducted_for_user, current_riddle, current_answer_revealed
-
-    user_id = str(message.author.id)
-    content = message.content.strip()
+    user_id = message.author.id
 
-    if not current_riddle or current_answer_revealed:
+    # Throttle before any tokenizing, DB or REST work
+    allowed, notify = guess_limiter.check(user_id)
+    if not allowed:
+        # Still hide it: a throttled message can hold the answer too
+        try:
+            await message.delete()
+        except Exception as e:
+            print(f"[on_message] Failed to delete throttled message: {e}")
+        if notify and not guess_queue.congested:
+            wait = guess_limiter.retry_after(user_id)
+            try:
+                await message.channel.send(
+                    f"🐢 Slow down, {message.author.mention}! Try again in {max(1, round(wait))} second(s).",
+                    delete_after=5
+                )
+            except Exception as e:
+                print(f"[on_message] Failed to send cooldown notice: {e}")
         return
 
-    if str(current_riddle.get("user_id")) == str(message.author.id):
+    # One index lookup per guess token covers every open riddle in the
+    # channel; a match on a riddle the user can still score on puts the
+    # guess ahead of the wrong ones
+    index = answer_indexes.get(message.channel.id)
+    matched = index.match(clean_and_filter(message.content.strip())) if index else set()
+    matched = {
+        riddle_id for riddle_id in matched
+        if riddle_id in channel_rounds
+        and not channel_rounds[riddle_id].revealed
+        and channel_rounds[riddle_id].can_play(user_id)
+    }
+    if not guess_queue.put(CORRECT if matched else WRONG, message, matched):
+        print(f"[on_message] Guess queue full, shed wrong guess from user {user_id}")
         try:
             await message.delete()
         except Exception as e:
-            print(f"[ERROR] Failed to delete submitter message: {e}")
-        
-        embed = discord.Embed(
-            description=(
-                "**⛔ You submitted this riddle and cannot answer it**.\n\n"
-                "You were already awarded 1 point when you submitted the riddle. Don't worry, you will not lose your streak."
-            ),
-            color=discord.Color.red()
-        )
-        await message.channel.send(embed=embed, delete_after=10)
+            print(f"[on_message] Failed to delete shed guess: {e}")
+
+
+@perf.timed("process_guess")
+async def process_guess(message, matched):
+    """Score one queued guess. Runs on a guess_queue worker."""
+    channel_rounds = rounds.get(message.channel.id)
+    if not channel_rounds:
+        return
+
+    user_id = message.author.id
+    # Past the high-water mark, skip replies that only inform the guesser
+    cosmetic = not guess_queue.congested
+
+    # The round may have been revealed while the guess waited in the queue
+    live = [r for r in channel_rounds.values() if not r.revealed]
+    if not live:
         return
 
-#
-    # Already answered correctly
-    from discord import Embed
+    # Riddles this user can still score on
+    playable = {r.riddle_id: r for r in live if r.can_play(user_id)}
 
-    if user_id in correct_users:
+    if not playable:
         try:
             await message.delete()
-        except:
-            pass
+        except Exception as e:
+            print(f"[ERROR] Failed to delete message: {e}")
+
+        if not cosmetic:
+            return
 
+        solved_any = any(r.has_solved(user_id) for r in live)
+        if not solved_any:
+            embed = discord.Embed(
+                description=(
+                    "**⛔ You submitted this riddle and cannot answer it**.\n\n"
+                    "You were already awarded 1 point when you submitted the riddle. Don't worry, you will not lose your streak."
+                ),
+                color=discord.Color.red()
+            )
+            await message.channel.send(embed=embed, delete_after=10)
+            return
+
+        # Already answered correctly
         embed = Embed(
             description=f"✅ You already answered correctly, {message.author.mention}. No more guesses counted.",
             color=discord.Color.green()
@@ -166,63 +369,107 @@ async def on_message(message):
         await message.channel.send(embed=embed, delete_after=5)
         return
 
+    solved = [playable[riddle_id] for riddle_id in sorted(matched) if riddle_id in playable]
+
+    if solved:
+        print(f"[on_message] ✅ Correct guess from user {user_id} ({message.author.display_name}) for {len(solved)} riddle(s)")
+        # Fast path: claim in memory before any await, so a second message
+        # from this user on this replica can't even reach the database
+        for round_ in solved:
+            round_.stats.record_guess(first_guess=user_id not in round_.participants)
+            round_.stats.record_solve(round_.attempts(user_id) + 1)
+            round_.mark_solved(user_id)
+            pubsub.publish("user_solved", {
+                "channel_id": message.channel.id,
+                "riddle_id": round_.riddle_id,
+                "user_id": user_id,
+            })
 
-    # Track guess attempts
-    guess_attempts[user_id] = guess_attempts.get(user_id, 0) + 1
-    attempts = guess_attempts[user_id]
-
-    user_words = clean_and_filter(content)
-    answer_words = clean_and_filter(current_riddle["answer"])
-
-    if any(word in user_words for word in answer_words):
-        print(f"[on_message] ✅ Correct guess from user {user_id} ({message.author.display_name})")
         try:
             await message.delete()
         except:
             pass
 
-        correct_users.add(user_id)  # Add user FIRST
-        print(f"[DEBUG] Added user {user_id} to correct_users")
-
+        # Only the daily riddle counts toward the day streak. The database
+        # awards each (riddle, user) once, whichever replica or message
+        # gets there first.
+        awards = [
+            (round_.riddle_id, 1, 1, False, "correct_guess") if round_.daily
+            else (round_.riddle_id, 1, 0, False, "rapid_fire_guess")
+            for round_ in solved
+        ]
         try:
-            await db.increment_score(int(user_id))
-            print(f"[on_message] 🧠 Score incremented for {user_id}")
-            await db.increment_streak(int(user_id))
-            print(f"[on_message] 🔥 Streak incremented for {user_id}")
-            score = await db.get_score(int(user_id))
+            awarded = await db.record_round_outcomes(user_id, "solved", awards, defer=True)
+            solved = [round_ for round_ in solved if round_.riddle_id in awarded]
+            if not solved:
+                return
+            print(f"[on_message] 🧠🔥 Score and streak incremented for {user_id}")
+            # A deferred award isn't in the cached score until it is replayed
+            score = None if db.has_deferred_outcomes(user_id) else await db.get_score(user_id)
             print(f"[DEBUG] User {user_id} score incremented to {score}")
         except Exception as e:
             print(f"[on_message ERROR] Failed to update score/streak for {user_id}: {e}")
-            print(f"[ERROR] DB error incrementing score/streak or getting score: {e}")
             score = "unknown"
 
-        embed = discord.Embed(
-            title="🎉 You guessed it!",
-            description=f"🥳 Congrats {message.author.mention}, you guessed right! Your total score is now **{score}**!",
-            color=discord.Color.green()
-        )
-        try:
-            await message.channel.send(embed=embed)
-            print("[DEBUG] Sent congrats embed")
-        except Exception as e:
-            print(f"[ERROR] Failed to send congrats embed: {e}")
+        if score is None:
+            score_text = "Your point will be added to your score in a moment."
+        else:
+            score_text = f"Your total score is now **{score}**!"
+
+        for round_ in solved:
+            if len(live) > 1:
+                title = f"🎉 You solved Riddle #{round_.riddle_id}!"
+            else:
+                title = "🎉 You guessed it!"
+            embed = discord.Embed(
+                title=title,
+                description=f"🥳 Congrats {message.author.mention}, you guessed right! {score_text}",
+                color=discord.Color.green()
+            )
+            try:
+                await message.channel.send(embed=embed)
+            except Exception as e:
+                print(f"[ERROR] Failed to send congrats embed: {e}")
 
         return
 
-    # Incorrect guess logic
-    remaining = 5 - attempts
-    if remaining <= 0 and user_id not in deducted_for_user:
+    # Incorrect guess logic: a miss counts against every riddle still open to this user
+    penalties = []
+    remaining = 5
+    for riddle_id, round_ in playable.items():
+        round_.stats.record_guess(first_guess=user_id not in round_.participants)
+        left = 5 - round_.add_attempt(user_id)
+        if left <= 0 and not round_.was_deducted(user_id):
+            # Claimed before any await, like a solve
+            round_.mark_deducted(user_id)
+            penalties.append(round_)
+        elif left > 0:
+            remaining = min(remaining, left)
+
+    if penalties:
         try:
-            await db.decrement_score(user_id)
-            await db.reset_streak(user_id)
-            deducted_for_user.add(user_id)
-            await message.channel.send(
-                f"❌ Incorrect, {message.author.mention}. You've used all 5 guesses and lost 1 point.",
-                delete_after=7
-            )
+            awarded = await db.record_round_outcomes(user_id, "penalized", [
+                (round_.riddle_id, -1, 0, round_.daily, "guess_penalty")
+                for round_ in penalties
+            ], defer=True)
+            penalties = [round_ for round_ in penalties if round_.riddle_id in awarded]
+            for round_ in penalties:
+                pubsub.publish("user_penalized", {
+                    "channel_id": message.channel.id,
+                    "riddle_id": round_.riddle_id,
+                    "user_id": user_id,
+                })
+            if len(live) > 1:
+                ids = ", ".join(f"#{r.riddle_id}" for r in penalties)
+                text = f"❌ Incorrect, {message.author.mention}. You've used all 5 guesses on Riddle {ids} and lost {len(penalties)} point(s)."
+            else:
+                text = f"❌ Incorrect, {message.author.mention}. You've used all 5 guesses and lost 1 point."
+            # Empty if another replica already applied them
+            if penalties:
+                await message.channel.send(text, delete_after=7)
         except Exception as e:
             print(f"[ERROR] DB error during penalty for user {user_id}: {e}")
-    elif remaining > 0:
+    elif remaining > 0 and cosmetic:
         await message.channel.send(
             f"❌ Incorrect, {message.author.mention}. {remaining} guess(es) left.",
             delete_after=6
@@ -233,12 +480,21 @@ async def on_message(message):
     except:
         pass
 
-    # Countdown to answer reveal
+    if not cosmetic:
+        return
+
+    # Countdown to the next answer reveal
     now = datetime.now(timezone.utc)
-    reveal_dt = datetime.combine(now.date(), time(23, 0), tzinfo=timezone.utc)
-    if now >= reveal_dt:
-        reveal_dt += timedelta(days=1)
-    delta = reveal_dt - now
+    closing = [r.closes_at for r in playable.values() if r.closes_at is not None]
+    if len(closing) == len(playable):
+        reveal_dt = min(closing)
+    else:
+        reveal_dt = scheduler.next_run(message.guild.id if message.guild else None, "reveal_riddle_answer")
+    if reveal_dt is None:
+        reveal_dt = datetime.combine(now.date(), time(23, 0), tzinfo=timezone.utc)
+        if now >= reveal_dt:
+            reveal_dt += timedelta(days=1)
+    delta = max(reveal_dt - now, timedelta(0))
     h, m = divmod(delta.seconds // 60, 60)
     await message.channel.send(
         f"⏳ Answer will be revealed in {h} hour(s), {m} minute(s).",
@@ -257,27 +513,34 @@ async def on_command_error(interaction: discord.Interaction, error):
         traceback.print_exc()
 
 
-@tasks.loop(time=time(hour=11, minute=45, second=0, tzinfo=timezone.utc))
-async def daily_purge():
-    try:
-        channel_id = int(os.getenv("DISCORD_CHANNEL_ID") or 0)
-        channel = client.get_channel(channel_id)
+def default_channel_id():
+    return int(os.getenv("DISCORD_CHANNEL_ID") or 0)
 
-        if not channel:
-            print("❌ Channel not found for purge.")
-            return
 
-        print(f"🧹 Purging messages in {channel.name} at 10:00 UTC")
+def reveal_time_text(guild_id):
+    schedule = scheduler.schedules.get((guild_id, "reveal_riddle_answer"))
+    if schedule is None:
+        return "23:00 UTC"
+    return f"{schedule.run_time:%H:%M} {schedule.tz.key}"
 
-        await channel.purge(limit=None)
-    except Exception as e:
-        print(f"❌ Error during daily purge: {e}")
 
+@perf.timed("daily_purge")
+async def daily_purge(guild_id=None, channel_id=None):
+    # Failures propagate so the scheduler leaves the run unfinished
+    channel_id = channel_id or default_channel_id()
+    channel = client.get_channel(channel_id)
+
+    if not channel:
+        raise RuntimeError(f"Channel {channel_id} not found for purge")
+
+    print(f"🧹 Purging messages in {channel.name}")
+
+    await channel.purge(limit=None)
 
-@tasks.loop(time=time(hour=11, minute=55, second=0, tzinfo=timezone.utc))
 
-async def riddle_announcement():
-    channel_id = int(os.getenv("DISCORD_CHANNEL_ID") or 0)
+@perf.timed("riddle_announcement")
+async def riddle_announcement(guild_id=None, channel_id=None):
+    channel_id = channel_id or default_channel_id()
     channel = client.get_channel(channel_id)
     if not channel:
         print("Riddle announcement skipped: Channel not found.")
@@ -304,63 +567,51 @@ async def riddle_announcement():
 
 
 
-@tasks.loop(time=time(hour=12, minute=0, second=0, tzinfo=timezone.utc))
-
-async def daily_riddle_post():
-    global current_riddle, current_answer_revealed, correct_users, guess_attempts, deducted_for_user
-
+@perf.timed("daily_riddle_post")
+async def daily_riddle_post(guild_id=None, channel_id=None):
     print(f"[LOOP ENTRY] id(db): {id(db)} at {db.__file__ if hasattr(db, '__file__') else 'unknown'}")
     print(f"[LOOP ENTRY] db.db_pool: {db.db_pool} (type={type(db.db_pool)})")
 
-    try:
-        print("DEBUG: daily_riddle_post started")
-        print(f"[LOOP DEBUG] db module id: {id(db)} at {getattr(db, '__file__', 'unknown file')}")
-        print(f"[LOOP DEBUG] db.db_pool id: {id(db.db_pool)} (None={db.db_pool is None})")
+    print("DEBUG: daily_riddle_post started")
+    print(f"[LOOP DEBUG] db module id: {id(db)} at {getattr(db, '__file__', 'unknown file')}")
+    print(f"[LOOP DEBUG] db.db_pool id: {id(db.db_pool)} (None={db.db_pool is None})")
 
-        if current_riddle is not None:
-            print("DEBUG: Skipping because current_riddle already active")
-            return
+    channel_id = channel_id or default_channel_id()
+    if not channel_id:
+        print("ERROR: No channel scheduled and DISCORD_CHANNEL_ID env var not set or empty.")
+        return
 
-        channel_id_str = os.getenv("DISCORD_CHANNEL_ID")
-        if not channel_id_str:
-            print("ERROR: DISCORD_CHANNEL_ID env var not set or empty.")
-            return
-        try:
-            channel_id = int(channel_id_str)
-        except Exception as e:
-            print(f"ERROR: Failed to convert DISCORD_CHANNEL_ID to int: {e}")
-            return
+    if has_daily_round(channel_id):
+        print("DEBUG: Skipping because a riddle is already active in this channel")
+        return
 
-        channel = client.get_channel(channel_id)
-        print(f"DEBUG: Fetched channel object: {channel} (ID: {channel_id})")
-        if not channel:
-            print("ERROR: Daily riddle post skipped: Channel not found or not cached.")
-            return
+    channel = client.get_channel(channel_id)
+    print(f"DEBUG: Fetched channel object: {channel} (ID: {channel_id})")
+    if not channel:
+        # Raised, not logged, so the run stays unfinished and is retried
+        raise RuntimeError(f"Daily riddle post skipped: channel {channel_id} not found or not cached")
 
-        riddles = await get_unused_questions()
-        print(f"DEBUG: Retrieved {len(riddles)} unused riddles from DB")
-        if not riddles:
-            notify_user_id = int(os.getenv("NOTIFY_USER_ID") or 0)
-            warn_embed = discord.Embed(
-                title="⚠️ No More Riddles Available",
-                description=(
-                    "There are currently no new riddles left to post. "
-                    "Please submit new riddles with `/submitriddle`! or yell "
-                    f"<@{notify_user_id}> to add more"
-                ),
-                color=discord.Color.red()
-            )
-            await channel.send(embed=warn_embed)
-            print("WARN: No riddles available to post.")
-            return
-        riddle = random.choice(riddles)
-        print(f"DEBUG: Selected riddle ID {riddle['riddle_id']} for posting")
-        current_riddle = riddle
-        current_answer_revealed = False
-        correct_users = set()
-        guess_attempts = {}
-        deducted_for_user = set()
+    riddles = await pick_unused_riddles()
+    print(f"DEBUG: {len(picker)} unused riddles left after picking")
+    if not riddles:
+        notify_user_id = int(os.getenv("NOTIFY_USER_ID") or 0)
+        warn_embed = discord.Embed(
+            title="⚠️ No More Riddles Available",
+            description=(
+                "There are currently no new riddles left to post. "
+                "Please submit new riddles with `/submitriddle`! or yell "
+                f"<@{notify_user_id}> to add more"
+            ),
+            color=discord.Color.red()
+        )
+        await channel.send(embed=warn_embed)
+        print("WARN: No riddles available to post.")
+        return
+    riddle = riddles[0]
+    print(f"DEBUG: Selected riddle ID {riddle['riddle_id']} for posting")
+    round_ = open_round(channel_id, riddle)
 
+    try:
         submitter = None
         if riddle.get("user_id"):
             submitter = client.get_user(int(riddle["user_id"]))
@@ -371,139 +622,213 @@ async def daily_riddle_post():
         else:
             print("DEBUG: Riddle has no user_id")
 
-        embed = await format_question_embed(riddle, submitter)
+        embed = await format_question_embed(riddle, submitter, reveal_time_text(channel.guild.id))
 
         await channel.send(embed=embed)
-        print(f"INFO: Posted daily riddle #{riddle['riddle_id']} to channel {channel.name} ({channel_id})")
+    except Exception:
+        # Never posted: put it back so the retry can post a riddle
+        close_round(channel_id, riddle["riddle_id"])
+        picker.add(riddle)
+        raise
+    print(f"INFO: Posted daily riddle #{riddle['riddle_id']} to channel {channel.name} ({channel_id})")
+
+    if db.db_pool is None:
+        raise RuntimeError("db.db_pool is None right before marking the riddle posted")
+    await db.mark_riddle_posted(riddle["riddle_id"], channel_id)
+    publish_round_opened(channel_id, round_)
+    print(f"DEBUG: Marked riddle #{riddle['riddle_id']} as posted in DB")
+
 
-        if db.db_pool is None:
-            print("[ACQUIRE ERROR] db.db_pool is None right before acquire!")
-            return
-        async with db.db_pool.acquire() as conn:
-            await conn.execute(
-                "UPDATE user_submitted_questions SET posted_at = NOW() WHERE riddle_id = $1",
-                riddle["riddle_id"]
-            )
-        print(f"DEBUG: Marked riddle #{riddle['riddle_id']} as posted in DB")
 
+@perf.timed("reveal_riddle_answer")
+async def reveal_riddle_answer(guild_id=None, channel_id=None):
+    channel_id = channel_id or default_channel_id()
+    # Rapid-fire riddles close on their own timers
+    for round_ in list(rounds.get(channel_id, {}).values()):
+        if round_.daily:
+            await reveal_round(channel_id, round_)
+
+
+async def add_round_stats(round_):
+    """Add this replica's solve counters to the riddle's stats, once."""
+    stats, round_.stats = round_.stats, SolveStats(round_.stats.opened_at)
+    try:
+        await db.add_riddle_stats(round_.riddle_id, round_.kind, stats.summary())
     except Exception as e:
-        print(f"ERROR in daily_riddle_post loop: {e}")
+        print(f"[reveal] Failed to save stats for riddle #{round_.riddle_id}: {e}")
 
 
-@tasks.loop(time=time(hour=23, minute=0, second=0, tzinfo=timezone.utc))
+async def reveal_round(channel_id, round_):
+    # Errors propagate: the scheduler then leaves the reveal unfinished
+    if round_.revealed:
+        return
+
+    channel = client.get_channel(channel_id)
+    if not channel:
+        raise RuntimeError(f"Channel {channel_id} not found for reveal")
+
+    current_riddle = round_.riddle
+    winners = round_.winners
+    daily = round_.daily
+
+    riddle_id = round_.riddle_id
+    answer = current_riddle.get("answer", "Unknown")
+
+    # Claim the reveal first so two replicas never settle the same riddle
+    if not await db.mark_riddle_revealed(riddle_id):
+        print(f"[reveal] Riddle #{riddle_id} was already revealed elsewhere")
+        if round_.stats.guesses:
+            await add_round_stats(round_)
+        # A retry after a failed settlement lands here; settling is a no-op
+        # once the day is done
+        if daily:
+            await settle_missed_riddles(riddle_id)
+        round_.revealed = True
+        close_round(channel_id, riddle_id)
+        return
+    # Other replicas stop taking guesses for it
+    pubsub.publish("riddle_revealed", {"channel_id": channel_id, "riddle_id": riddle_id})
 
-async def reveal_riddle_answer():
-    global current_riddle, current_answer_revealed, correct_users, guess_attempts, deducted_for_user
+    picker.record_result(current_riddle, round_.stats.participants, round_.stats.solvers)
+    await add_round_stats(round_)
 
+    # Fold in solves and penalties other replicas recorded
     try:
-        if not current_riddle or current_answer_revealed:
-            return
+        for row in await db.get_round_participants(riddle_id):
+            if row["solved_at"] is not None:
+                round_.mark_solved(row["user_id"])
+            if row["penalized_at"] is not None:
+                round_.mark_deducted(row["user_id"])
+    except Exception as e:
+        print(f"[reveal] Failed to load participants for riddle #{riddle_id}: {e}")
 
-        channel_id = int(os.getenv("DISCORD_CHANNEL_ID") or 0)
-        channel = client.get_channel(channel_id)
-        if not channel:
-            return
+    await channel.send(embed=discord.Embed(
+        title=f"🔔 Answer to Riddle #{riddle_id}",
+        description=f"**Answer:** {answer}\n\n💡 Submit your own with `/submitriddle`!",
+        color=discord.Color.green()
+    ))
 
-        riddle_id = current_riddle.get("riddle_id", "???")
-        answer = current_riddle.get("answer", "Unknown")
+    # Make sure today's guesses are in the snapshot before reading it
+    try:
+        await db.compact_score_events()
+    except Exception as e:
+        print(f"[reveal] Failed to compact score events: {e}")
 
+    if winners:
+        all_data = await db.get_all_scores_and_streaks()
+        cache.load_scores(all_data)
+        max_score = max((d["score"] for d in all_data.values()), default=0)
+
+        embed = discord.Embed(
+            title="🎊 Congrats to today's winners!" if daily else f"🎊 Riddle #{riddle_id} winners!",
+            color=discord.Color.gold()
+        )
+
+        lines = []
+        for i, user_id in enumerate(winners, 1):
+            try:
+                user = client.get_user(user_id) or await client.fetch_user(user_id)
+                data = all_data.get(str(user_id), {"score": 0, "streak": 0})
+                score = data["score"]
+                streak = data["streak"]
+
+                # Calculate ranks
+                score_rank = get_rank(score, 0)
+                streak_rank = get_rank(0, streak)
+                master_chef = " 🎲⛳ Plato Master" if score == max_score and score > 0 else ""
+
+                lines.append(f"#{i} {user.mention}")
+                lines.append(f"• 🧠 Score: **{score}**{master_chef}")
+                lines.append(f"• 🏅 Score Rank: {score_rank}")
+                lines.append(f"• 🔥 Streak: **{streak}**")
+                lines.append(f"• 📈 Streak Rank: {streak_rank}")
+                lines.append("")
+            except Exception as e:
+                lines.append(f"#{i} <@{user_id}>")
+                lines.append(f"• Error fetching data: {e}")
+                lines.append("")
+
+        embed.description = "\n".join(lines)
+        await channel.send(embed=embed)
+    else:
+        # Nobody got it right
         await channel.send(embed=discord.Embed(
-            title=f"🔔 Answer to Riddle #{riddle_id}",
-            description=f"**Answer:** {answer}\n\n💡 Submit your own with `/submitriddle`!",
-            color=discord.Color.green()
+            title="😢 Nobody Got It Right Today",
+            description="Better luck tomorrow!\n\n💡 Submit your own with `/submitriddle`!",
+            color=discord.Color.blurple()
         ))
 
-        if correct_users:
-            all_data = await db.get_all_scores_and_streaks()
-            max_score = max((d["score"] for d in all_data.values()), default=0)
 
-            embed = discord.Embed(
-                title="🎊 Congrats to today's winners!",
-                color=discord.Color.gold()
-            )
+    # Missing a rapid-fire riddle costs nothing; only the daily one settles streaks
+    if daily:
+        await settle_missed_riddles(riddle_id)
+        try:
+            await db.snapshot_leaderboard()
+        except Exception as e:
+            print(f"Error writing leaderboard snapshot: {e}")
+        pubsub.publish("scores_settled", {"riddle_id": riddle_id})
+
+    round_.revealed = True
+    close_round(channel_id, riddle_id)
+
+
+
 
-            lines = []
-            for i, user_id_str in enumerate(correct_users, 1):
-                try:
-                    user = await client.fetch_user(int(user_id_str))
-                    data = all_data.get(user_id_str, {"score": 0, "streak": 0})
-                    score = data["score"]
-                    streak = data["streak"]
-
-                    # Calculate ranks
-                    score_rank = get_rank(score, 0)
-                    streak_rank = get_rank(0, streak)
-                    master_chef = " 🎲⛳ Plato Master" if score == max_score and score > 0 else ""
-
-                    lines.append(f"#{i} {user.mention}")
-                    lines.append(f"• 🧠 Score: **{score}**{master_chef}")
-                    lines.append(f"• 🏅 Score Rank: {score_rank}")
-                    lines.append(f"• 🔥 Streak: **{streak}**")
-                    lines.append(f"• 📈 Streak Rank: {streak_rank}")
-                    lines.append("")
-                except Exception as e:
-                    lines.append(f"#{i} <@{user_id_str}>")
-                    lines.append(f"• Error fetching data: {e}")
-                    lines.append("")
-
-            embed.description = "\n".join(lines)
-            await channel.send(embed=embed)
-        else:
-            # Nobody got it right
-            await channel.send(embed=discord.Embed(
-                title="😢 Nobody Got It Right Today",
-                description="Better luck tomorrow!\n\n💡 Submit your own with `/submitriddle`!",
-                color=discord.Color.blurple()
-            ))
-
-            
-        riddle_author_id = current_riddle.get("user_id")
-        all_users = await db.get_all_streak_users()
-        for uid in all_users:
-            if uid in correct_users or uid == str(riddle_author_id) or uid in deducted_for_user:
-                continue
-            try:
-                await db.adjust_score_and_reset_streak(uid, -1)
-            except Exception as e:
-                print(f"Error deducting for {uid}: {e}")
 
-        current_answer_revealed = True
-        current_riddle = None
-        correct_users.clear()
-        guess_attempts.clear()
-        deducted_for_user.clear()
 
+async def settle_missed_riddles(riddle_id):
+    """Deduct for the day's missed daily riddles once every guild's is revealed.
+
+    Players and streaks are global, so this runs once per day rather than
+    once per channel; errors propagate so the reveal job is retried.
+    """
+    penalized = await db.settle_missed_riddles(riddle_id)
+    if penalized is None:
+        return
+    print(f"[reveal] Deducted a point from {len(penalized)} players who missed the daily riddle")
+    try:
+        await db.compact_score_events()
     except Exception as e:
-        print(f"Reveal loop error: {e}")
+        print(f"[reveal] Failed to compact score events: {e}")
 
 
+@tasks.loop(seconds=int(os.getenv("SCORE_COMPACT_SECONDS") or 60))
+@perf.timed("compact_scores")
+async def compact_scores():
+    try:
+        await db.compact_score_events()
+    except Exception as e:
+        print(f"[compact_scores] ERROR: {e}")
 
 
+@tasks.loop(seconds=int(os.getenv("DB_DEFERRED_REPLAY_SECONDS") or 5))
+async def replay_deferred_writes():
+    # Guesses scored while the database was unreachable
+    if db.deferred_outcomes:
+        try:
+            await db.replay_deferred_outcomes()
+        except Exception as e:
+            print(f"[replay_deferred_writes] ERROR: {e}")
 
-async def daily_riddle_post_callback():
-    global current_riddle, current_answer_revealed, correct_users, guess_attempts, deducted_for_user
 
-    if current_riddle is not None:
+async def daily_riddle_post_callback(channel_id=None):
+    channel_id = channel_id or default_channel_id()
+    if has_daily_round(channel_id):
         print("⛔ Skipping manual riddle post: one already exists.")
         return
 
-    channel_id = int(os.getenv("DISCORD_CHANNEL_ID") or 0)
     channel = client.get_channel(channel_id)
     if not channel:
         print("⚠️ Could not find channel for riddle post.")
         return
 
-    riddles = await get_unused_questions()
+    riddles = await pick_unused_riddles()
     if not riddles:
         print("⛔ No riddles available to post.")
         return
 
-    riddle = random.choice(riddles)
-    current_riddle = riddle
-    current_answer_revealed = False
-    correct_users = set()
-    guess_attempts = {}
-    deducted_for_user = set()
+    riddle = riddles[0]
+    round_ = open_round(channel_id, riddle)
 
     submitter_name = "Riddle of the day bot"
     if riddle.get("user_id"):
@@ -517,28 +842,183 @@ async def daily_riddle_post_callback():
         color=discord.Color.blurple()
     )
     await channel.send(embed=embed)
+    await db.mark_riddle_posted(riddle["riddle_id"], channel_id)
+    publish_round_opened(channel_id, round_)
     print(f"✅ Sent manual riddle post #{riddle['riddle_id']}.")
 
 
+async def start_rapid_fire(channel, count, minutes):
+    """Open up to `count` riddles at once in `channel`, all revealed after `minutes`."""
+    picked = await pick_unused_riddles(count)
+    if not picked:
+        return []
+    closes_at = datetime.now(timezone.utc) + timedelta(minutes=minutes)
+
+    opened = [open_round(channel.id, riddle, kind="rapid", closes_at=closes_at) for riddle in picked]
+    schedule_rapid_fire_close(channel.id, [r["riddle_id"] for r in picked], closes_at)
+
+    for riddle, round_ in zip(picked, opened):
+        submitter = client.get_user(int(riddle["user_id"])) if riddle.get("user_id") else None
+        embed = await format_question_embed(riddle, submitter, f"{closes_at:%H:%M} UTC")
+        await channel.send(embed=embed)
+        await db.mark_riddle_posted(riddle["riddle_id"], channel.id, closes_at)
+        publish_round_opened(channel.id, round_)
+    print(f"[rapid_fire] Opened {len(picked)} riddle(s) in channel {channel.id} until {closes_at:%H:%M} UTC")
+    return picked
+
+
+def schedule_rapid_fire_close(channel_id, riddle_ids, closes_at):
+    task = asyncio.get_running_loop().create_task(close_rapid_fire(channel_id, riddle_ids, closes_at))
+    rapid_fire_tasks.add(task)
+    task.add_done_callback(rapid_fire_tasks.discard)
+
+
+@perf.timed("close_rapid_fire")
+async def close_rapid_fire(channel_id, riddle_ids, closes_at):
+    delay = (closes_at - datetime.now(timezone.utc)).total_seconds()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    for riddle_id in riddle_ids:
+        round_ = rounds.get(channel_id, {}).get(riddle_id)
+        if round_ is not None:
+            try:
+                await reveal_round(channel_id, round_)
+            except Exception as e:
+                print(f"[rapid_fire] ERROR revealing riddle #{riddle_id}: {e}")
+
+
+async def restore_active_rounds():
+    rapid = {}
+    for riddle in await db.get_active_riddles():
+        channel_id = riddle.pop("posted_channel_id", None) or default_channel_id()
+        closes_at = riddle.pop("closes_at", None)
+        posted_at = riddle.pop("posted_at", None)
+        if riddle["riddle_id"] in rounds.get(channel_id, {}):
+            continue
+        # Guesses made before the restart aren't in the restored stats
+        if closes_at is not None:
+            open_round(channel_id, riddle, kind="rapid", closes_at=closes_at, posted_at=posted_at)
+            rapid.setdefault((channel_id, closes_at), []).append(riddle["riddle_id"])
+        elif not has_daily_round(channel_id):
+            open_round(channel_id, riddle, posted_at=posted_at)
+        else:
+            continue
+        print(f"[warm_caches] Resumed active riddle #{riddle['riddle_id']} in channel {channel_id}")
+    for (channel_id, closes_at), riddle_ids in rapid.items():
+        schedule_rapid_fire_close(channel_id, riddle_ids, closes_at)
+
+
+async def warm_member_cache():
+    channel_ids = {default_channel_id(), *rounds}
+    guilds = {channel.guild for channel in map(client.get_channel, channel_ids) if channel and channel.guild}
+    for guild in guilds:
+        if not guild.chunked:
+            await guild.chunk()
+            print(f"[warm_caches] Cached {guild.member_count} members of {guild.name}")
+
+
+async def warm_scores():
+    cache.load_scores(await db.get_all_scores_and_streaks())
+    print(f"[warm_caches] Cached scores for {len(cache.scores)} users")
+
+
+caches_warmed = False
+
+async def warm_caches():
+    # Preload what the first guesses and commands need, all at once
+    global caches_warmed
+    if caches_warmed:
+        return
+    caches_warmed = True
+    started = asyncio.get_running_loop().time()
+    results = await asyncio.gather(
+        warm_scores(),
+        count_unused_questions(),
+        restore_active_rounds(),
+        rebuild_picker(),
+        scheduler.load(),
+        return_exceptions=True,
+    )
+    # Needs the restored rounds to know which guilds to chunk
+    results += await asyncio.gather(warm_member_cache(), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"[warm_caches] ERROR: {result}")
+    print(f"[warm_caches] Done in {asyncio.get_running_loop().time() - started:.2f}s")
+
+
+scheduler.register("daily_purge", daily_purge, time(11, 45))
+scheduler.register("riddle_announcement", riddle_announcement, time(11, 55))
+scheduler.register("daily_riddle_post", daily_riddle_post, time(12, 0), catchup=True, catchup_before="reveal_riddle_answer")
+scheduler.register("reveal_riddle_answer", reveal_riddle_answer, time(23, 0), catchup=True)
+
+
+async def seed_default_schedules():
+    # Give the DISCORD_CHANNEL_ID guild the classic UTC times if it has none
+    channel = client.get_channel(default_channel_id())
+    if not channel or not channel.guild:
+        return
+    try:
+        await db.seed_job_schedules(
+            channel.guild.id,
+            channel.id,
+            {name: spec.default_time for name, spec in scheduler.jobs.items()},
+        )
+        pubsub.publish("schedules_seeded", {"guild_id": channel.guild.id})
+    except Exception as e:
+        print(f"[scheduler] Failed to seed default schedules: {e}")
+
+
+async def start_leader_duties():
+    # Pick up riddles posted by the previous leader after this replica started;
+    # rounds must be in place before the scheduler catches up a missed reveal
+    await restore_active_rounds()
+    if not compact_scores.is_running():
+        compact_scores.start()
+    if not scheduler.is_running():
+        await seed_default_schedules()
+        await scheduler.start()
+
+
+async def stop_leader_duties():
+    scheduler.stop()
+    compact_scores.cancel()
+
+
+# Only the leader runs scheduled jobs; every replica serves messages and commands
+leader = None
+
+
 @client.event
 async def on_ready():
+    # Fires again on every gateway reconnect; commands are registered and
+    # synced once in run_bot, so only (re)start the loops here.
+    global leader
     print(f"Logged in as {client.user} (ID: {client.user.id})")
 
-    commands.setup(tree, client)
-    try:
-        synced = await tree.sync()
-        print(f"Synced {len(synced)} commands.")
-    except Exception as e:
-        print(f"Failed to sync commands: {e}")
+    perf.start_lag_monitor()
+    await warm_caches()
+    guess_queue.start()
+    if not replay_deferred_writes.is_running():
+        replay_deferred_writes.start()
+    if db.backend is None:
+        pubsub.start(os.getenv("DATABASE_URL"), db.db_pool, on_resync=resync_replica_state)
+    if leader is None:
+        # An embedded backend means a single process, which leads by default
+        leader = LeaderElector(
+            None if db.backend is not None else os.getenv("DATABASE_URL"),
+            on_elected=start_leader_duties,
+            on_demoted=stop_leader_duties,
+        )
+    leader.start()
+
 
-    if not riddle_announcement.is_running():
-        riddle_announcement.start()
-    if not daily_riddle_post.is_running():
-        daily_riddle_post.start()
-    if not reveal_riddle_answer.is_running():
-        reveal_riddle_answer.start()
-    if not daily_purge.is_running():
-        daily_purge.start()
+async def start_database():
+    print("⏳ Connecting to the database...")
+    pool = await db.create_db_pool()  # sets db.db_pool internally
+    commands.set_db_pool(pool)         # sets commands.db_pool for commands.py usage
+    await db.ensure_schema()
+    print("✅ Database connection pool created successfully.")
 
 
 async def run_bot():
@@ -549,18 +1029,35 @@ async def run_bot():
         print("ERROR: Required environment variables are not set.")
         exit(1)
 
-    try:
-        print("⏳ Connecting to the database...")
-        pool = await db.create_db_pool()  # sets db.db_pool internally
-        commands.set_db_pool(pool)         # sets commands.db_pool for commands.py usage
-        print("✅ Database connection pool created successfully.")
-    except Exception as e:
-        print(f"❌ Failed to connect to the database: {e}")
-        exit(1)
     """
     await alter_riddle_id_pk_and_autoincrement()
     """
-    await client.start(TOKEN)
+    commands.set_scheduler(scheduler)
+    commands.set_guess_queue(guess_queue)
+    commands.set_rapid_fire(start_rapid_fire, RAPID_FIRE_MAX_RIDDLES)
+    commands.setup(tree, client)
+    perf.instrument_commands(tree)
+    perf.instrument_http(client)
+    perf.enable_slow_callback_reporting()
+
+    async with client:
+        # Pool warm-up + schema checks overlap with the gateway login
+        db_result, login_result = await asyncio.gather(
+            start_database(), client.login(TOKEN), return_exceptions=True
+        )
+        if isinstance(db_result, Exception):
+            print(f"❌ Failed to connect to the database: {db_result}")
+            exit(1)
+        if isinstance(login_result, Exception):
+            raise login_result
+
+        # Command sync is a REST call; let it run while the gateway connects
+        sync_task = asyncio.create_task(sync_commands_if_changed(tree, client))
+        try:
+            await client.connect()
+        finally:
+            if not sync_task.done():
+                sync_task.cancel()
 
 
 asyncio.run(run_bot())
@@ -0,0 +1,174 @@
+import gc
+import os
+import sys
+import tracemalloc
+import types
+
+import discord
+
+
+# name -> zero-arg callable returning the live object to measure. main.py
+# registers the round-state structures here since other modules can't
+# import main without starting the bot.
+tracked_state = {}
+
+baseline_snapshot = None
+
+# Shared objects a view merely points at; counting them would charge every
+# view for the whole client cache.
+_SKIP_TYPES = (
+    type,
+    types.ModuleType,
+    discord.Client,
+    discord.User,
+    discord.Member,
+    discord.ClientUser,
+    discord.abc.GuildChannel,
+    discord.Guild,
+    discord.Interaction,
+)
+
+
+def track(name, getter):
+    tracked_state[name] = getter
+
+
+def rss_bytes():
+    """Current resident set size, falling back to peak RSS off Linux."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KB on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+def deep_sizeof(obj, limit=200000):
+    """Approximate retained size of obj, following containers, __dict__,
+    __slots__ and closure cells. Stops after `limit` objects."""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack and len(seen) < limit:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _SKIP_TYPES):
+            continue
+        seen.add(id(item))
+        try:
+            total += sys.getsizeof(item)
+        except TypeError:
+            continue
+
+        if isinstance(item, (str, bytes, bytearray, int, float, bool)) or item is None:
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif isinstance(item, types.FunctionType):
+            if item.__closure__:
+                for cell in item.__closure__:
+                    try:
+                        stack.append(cell.cell_contents)
+                    except ValueError:
+                        pass
+        elif isinstance(item, types.MethodType):
+            stack.append(item.__func__)
+        else:
+            if hasattr(item, "__dict__"):
+                stack.append(item.__dict__)
+            for slot in getattr(type(item), "__slots__", ()):
+                value = getattr(item, slot, None)
+                if value is not None:
+                    stack.append(value)
+    return total
+
+
+def live_views():
+    """(class name, count, retained bytes) for every live discord.ui.View subclass."""
+    summary = {}
+    for obj in gc.get_objects():
+        if not isinstance(obj, discord.ui.View):
+            continue
+        cls = type(obj)
+        size = deep_sizeof(obj)
+        # Views defined inside a command (e.g. LeaderboardPaginator) keep
+        # their payload in closures on the class's methods
+        if "<locals>" in cls.__qualname__:
+            size += sum(deep_sizeof(fn) for fn in vars(cls).values() if isinstance(fn, types.FunctionType))
+        count, total = summary.get(cls.__name__, (0, 0))
+        summary[cls.__name__] = (count + 1, total + size)
+    return sorted(
+        ((name, count, total) for name, (count, total) in summary.items()),
+        key=lambda r: r[2],
+        reverse=True,
+    )
+
+
+def state_sizes():
+    """(name, len, retained bytes) for each registered structure."""
+    rows = []
+    for name, getter in tracked_state.items():
+        try:
+            obj = getter()
+        except Exception:
+            continue
+        length = len(obj) if hasattr(obj, "__len__") else None
+        rows.append((name, length, deep_sizeof(obj)))
+    return rows
+
+
+def start_tracing(frames=None):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames or int(os.getenv("TRACEMALLOC_FRAMES") or 1))
+        return True
+    return False
+
+
+def stop_tracing():
+    global baseline_snapshot
+    baseline_snapshot = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def top_allocations(limit=10):
+    if not tracemalloc.is_tracing():
+        return None
+    stats = tracemalloc.take_snapshot().statistics("lineno")
+    return [(str(stat.traceback[0]), stat.size, stat.count) for stat in stats[:limit]]
+
+
+def take_baseline():
+    """Remember a snapshot to diff later calls against."""
+    global baseline_snapshot
+    start_tracing()
+    baseline_snapshot = tracemalloc.take_snapshot()
+    return baseline_snapshot
+
+
+def diff_against_baseline(limit=10):
+    """Top allocation sites that grew since take_baseline(), or None without one."""
+    if baseline_snapshot is None or not tracemalloc.is_tracing():
+        return None
+    current = tracemalloc.take_snapshot()
+    stats = current.compare_to(baseline_snapshot, "lineno")
+    return [(str(stat.traceback[0]), stat.size_diff, stat.count_diff) for stat in stats[:limit]]
+
+
+def format_bytes(size):
+    if size is None:
+        return "n/a"
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
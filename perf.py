@@ -0,0 +1,277 @@
+import asyncio
+import contextvars
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import time
+from collections import deque
+
+import asyncpg
+
+
+# Rolling samples per metric; percentiles are computed on demand
+WINDOW = int(os.getenv("PERF_WINDOW") or 1024)
+
+
+class RollingStats:
+    def __init__(self, maxlen=WINDOW):
+        self.samples = deque(maxlen=maxlen)
+        self.count = 0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def max(self):
+        return max(self.samples, default=0.0)
+
+
+class HandlerStats:
+    def __init__(self):
+        self.wall = RollingStats()
+        self.db = RollingStats()
+        self.rest = RollingStats()
+        self.cpu = RollingStats()
+        self.errors = 0
+
+
+class Timing:
+    """Accumulates DB and Discord REST time for one handler invocation."""
+    __slots__ = ("db", "rest")
+
+    def __init__(self):
+        self.db = 0.0
+        self.rest = 0.0
+
+
+current_timing = contextvars.ContextVar("current_timing", default=None)
+
+handler_stats = {}  # handler name -> HandlerStats
+loop_lag = RollingStats()
+slow_callbacks = deque(maxlen=20)  # (timestamp, message)
+slow_callback_count = 0
+
+
+def _add_db(elapsed):
+    timing = current_timing.get()
+    if timing is not None:
+        timing.db += elapsed
+
+
+def _add_rest(elapsed):
+    timing = current_timing.get()
+    if timing is not None:
+        timing.rest += elapsed
+
+
+def timed(name):
+    """Decorator recording wall, DB, REST and remaining (CPU/other) time for a coroutine."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            timing = Timing()
+            token = current_timing.set(timing)
+            started = time.perf_counter()
+            failed = False
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                wall = time.perf_counter() - started
+                current_timing.reset(token)
+                stats = handler_stats.get(name)
+                if stats is None:
+                    stats = handler_stats[name] = HandlerStats()
+                stats.wall.add(wall)
+                stats.db.add(timing.db)
+                stats.rest.add(timing.rest)
+                stats.cpu.add(max(wall - timing.db - timing.rest, 0.0))
+                if failed:
+                    stats.errors += 1
+        return wrapper
+    return decorator
+
+
+class TimedConnection(asyncpg.Connection):
+    """asyncpg connection that charges query time to the running handler."""
+
+    async def execute(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().execute(*args, **kwargs)
+        finally:
+            _add_db(time.perf_counter() - started)
+
+    async def executemany(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().executemany(*args, **kwargs)
+        finally:
+            _add_db(time.perf_counter() - started)
+
+    async def fetch(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().fetch(*args, **kwargs)
+        finally:
+            _add_db(time.perf_counter() - started)
+
+    async def fetchrow(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().fetchrow(*args, **kwargs)
+        finally:
+            _add_db(time.perf_counter() - started)
+
+    async def fetchval(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().fetchval(*args, **kwargs)
+        finally:
+            _add_db(time.perf_counter() - started)
+
+    async def copy_records_to_table(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().copy_records_to_table(*args, **kwargs)
+        finally:
+            _add_db(time.perf_counter() - started)
+
+
+def instrument_http(client):
+    """Charge every Discord REST request to the running handler."""
+    http = client.http
+    if getattr(http, "_perf_wrapped", False):
+        return
+    original = http.request
+
+    async def timed_request(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await original(*args, **kwargs)
+        finally:
+            _add_rest(time.perf_counter() - started)
+
+    http.request = timed_request
+    http._perf_wrapped = True
+
+
+def instrument_commands(tree):
+    """Wrap every registered slash command callback with timed()."""
+    for command in tree.get_commands():
+        callback = getattr(command, "_callback", None)
+        if callback is None or getattr(callback, "_perf_wrapped", False):
+            continue
+        wrapped = timed(f"/{command.name}")(callback)
+        wrapped._perf_wrapped = True
+        command._callback = wrapped
+
+
+class _SlowCallbackHandler(logging.Handler):
+    def emit(self, record):
+        global slow_callback_count
+        message = record.getMessage()
+        if message.startswith("Executing") and " took " in message:
+            slow_callback_count += 1
+            slow_callbacks.append((time.time(), message[:200]))
+
+
+def enable_slow_callback_reporting(loop=None):
+    """Turn on asyncio debug slow-callback warnings if PERF_SLOW_CALLBACK_MS is set."""
+    threshold_ms = os.getenv("PERF_SLOW_CALLBACK_MS")
+    if not threshold_ms:
+        return False
+    loop = loop or asyncio.get_running_loop()
+    loop.slow_callback_duration = float(threshold_ms) / 1000
+    loop.set_debug(True)
+    logging.getLogger("asyncio").addHandler(_SlowCallbackHandler())
+    print(f"[perf] Reporting callbacks slower than {threshold_ms} ms")
+    return True
+
+
+_lag_task = None
+
+async def _measure_lag(interval):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag.add(max(loop.time() - started - interval, 0.0))
+
+
+def start_lag_monitor(interval=None):
+    global _lag_task
+    if _lag_task is not None and not _lag_task.done():
+        return _lag_task
+    interval = interval or float(os.getenv("PERF_LAG_INTERVAL") or 0.5)
+    _lag_task = asyncio.get_running_loop().create_task(_measure_lag(interval))
+    return _lag_task
+
+
+def summary(limit=10):
+    """Rows of (name, count, errors, wall p50, wall p95, db p95, rest p95, cpu p95) in ms, slowest first."""
+    rows = []
+    for name, stats in handler_stats.items():
+        rows.append((
+            name,
+            stats.wall.count,
+            stats.errors,
+            stats.wall.percentile(50) * 1000,
+            stats.wall.percentile(95) * 1000,
+            stats.db.percentile(95) * 1000,
+            stats.rest.percentile(95) * 1000,
+            stats.cpu.percentile(95) * 1000,
+        ))
+    rows.sort(key=lambda r: r[4], reverse=True)
+    return rows[:limit]
+
+
+_profiling = False
+
+def is_profiling():
+    return _profiling
+
+
+async def profile_for(seconds, directory=None, top=15):
+    """Profile everything the event loop thread runs for `seconds`.
+
+    The profiler is only installed for the duration of the call, so there is
+    no overhead otherwise. Returns (stats_path, text of the top functions by
+    cumulative time).
+    """
+    global _profiling
+    if _profiling:
+        raise RuntimeError("A profile is already running.")
+    directory = directory or os.getenv("PROFILE_DIR") or "profiles"
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+
+    _profiling = True
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+    finally:
+        _profiling = False
+
+    profiler.dump_stats(path)
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(top)
+    print(f"[perf] Wrote profile to {path}")
+    return path, out.getvalue()
@@ -0,0 +1,206 @@
+"""Cross-replica events over Postgres LISTEN/NOTIFY.
+
+Each replica keeps round state and the score cache in memory. When one of
+them changes that state it publishes an event; every other replica applies
+it to its own copy, so they agree within a round trip without polling.
+
+publish() only queues the event. A single sender task drains the queue and
+sends each batch as one statement, so one transaction, which
+keeps events in publish order and off the hot path. Receiving happens on a
+dedicated connection (a pool connection could be recycled and silently stop
+listening). After that connection drops, events may have been missed, so
+on_resync is awaited to reload state from the database.
+
+Until start() is called with a dsn, e.g. with the embedded SQLite backend
+where there is only one process, publish() does nothing.
+"""
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime
+
+import asyncpg
+
+
+CHANNEL = os.getenv("PUBSUB_CHANNEL") or "riddle_bot_events"
+RETRY_SECONDS = float(os.getenv("PUBSUB_RETRY_SECONDS") or 2)
+HEARTBEAT_SECONDS = float(os.getenv("PUBSUB_HEARTBEAT_SECONDS") or 10)
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7900
+# Events waiting to be sent; past this they are dropped and the receivers
+# catch up on their next resync
+MAX_QUEUED = 10000
+
+# Tags our own notifications so the listener can skip them
+origin = uuid.uuid4().hex[:12]
+sequence = 0
+
+handlers = {}  # event name -> [callable(payload)]
+
+pool = None
+queue = None
+sender_task = None
+listener = None
+stats = {"published": 0, "received": 0, "dropped": 0}
+
+
+def subscribe(event, handler):
+    """Call handler(payload) for every `event` published by another replica.
+    Coroutine handlers are scheduled as tasks."""
+    handlers.setdefault(event, []).append(handler)
+
+
+def dispatch(event, payload):
+    for handler in handlers.get(event, ()):
+        try:
+            result = handler(payload)
+            if asyncio.iscoroutine(result):
+                asyncio.get_running_loop().create_task(result)
+        except Exception as e:
+            print(f"[pubsub] ERROR handling {event}: {e}")
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def publish(event, payload, local=False):
+    """Queue `event` for the other replicas. With local=True this replica's
+    handlers run too, for changes made outside the round-state code."""
+    global sequence
+    if local:
+        dispatch(event, payload)
+    if queue is None:
+        return
+    sequence += 1
+    # The sequence number also stops Postgres folding identical payloads
+    # sent in one transaction into a single notification
+    message = json.dumps({"o": origin, "s": sequence, "e": event, "d": payload}, default=_default, separators=(",", ":"))
+    if len(message.encode()) > MAX_PAYLOAD_BYTES:
+        print(f"[pubsub] Dropped {event}: payload too large ({len(message)} chars)")
+        stats["dropped"] += 1
+        return
+    if queue.qsize() >= MAX_QUEUED:
+        stats["dropped"] += 1
+        return
+    queue.put_nowait(message)
+
+
+async def _send_loop():
+    while True:
+        batch = [await queue.get()]
+        while not queue.empty() and len(batch) < 500:
+            batch.append(queue.get_nowait())
+        try:
+            async with pool.acquire() as conn:
+                # One transaction: delivered together and in order
+                await conn.execute(
+                    "SELECT pg_notify($1, message) FROM unnest($2::text[]) AS message",
+                    CHANNEL, batch,
+                )
+            stats["published"] += len(batch)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            stats["dropped"] += len(batch)
+            print(f"[pubsub] Failed to publish {len(batch)} event(s): {e}")
+            await asyncio.sleep(RETRY_SECONDS)
+
+
+class Listener:
+    """Keeps a LISTEN session open and feeds notifications to dispatch()."""
+
+    def __init__(self, dsn, on_resync=None, retry=RETRY_SECONDS, heartbeat=HEARTBEAT_SECONDS):
+        self.dsn = dsn
+        self.on_resync = on_resync
+        self.retry = retry
+        self.heartbeat = heartbeat
+        self.conn = None
+        self.task = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+        return self.task
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self._close()
+
+    def _on_notify(self, conn, pid, channel, message):
+        try:
+            message = json.loads(message)
+        except ValueError:
+            print("[pubsub] Ignoring malformed notification")
+            return
+        if message.get("o") == origin:
+            return
+        stats["received"] += 1
+        dispatch(message.get("e"), message.get("d") or {})
+
+    async def _close(self):
+        if self.conn is not None:
+            try:
+                await self.conn.close(timeout=self.retry)
+            except Exception:
+                self.conn.terminate()
+            self.conn = None
+
+    async def _run(self):
+        connected_before = False
+        while True:
+            try:
+                self.conn = await asyncpg.connect(
+                    dsn=self.dsn,
+                    timeout=self.retry * 5,
+                    server_settings={"application_name": "riddle-bot-pubsub"},
+                )
+                await self.conn.add_listener(CHANNEL, self._on_notify)
+                print(f"[pubsub] Listening on '{CHANNEL}' as {origin}")
+                if connected_before and self.on_resync is not None:
+                    try:
+                        await self.on_resync()
+                    except Exception as e:
+                        print(f"[pubsub] ERROR resyncing after reconnect: {e}")
+                connected_before = True
+                while True:
+                    await asyncio.sleep(self.heartbeat)
+                    await asyncio.wait_for(self.conn.fetchval("SELECT 1"), timeout=self.heartbeat)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[pubsub] Listen connection failed: {e}")
+                await self._close()
+                await asyncio.sleep(self.retry)
+
+
+def start(dsn, publish_pool, on_resync=None):
+    """Begin sending and receiving events. Safe to call again on reconnect."""
+    global pool, queue, sender_task, listener
+    pool = publish_pool
+    if queue is None:
+        queue = asyncio.Queue()
+    if sender_task is None or sender_task.done():
+        sender_task = asyncio.get_running_loop().create_task(_send_loop())
+    if listener is None:
+        listener = Listener(dsn, on_resync)
+    listener.start()
+
+
+async def stop():
+    global pool, queue, sender_task, listener
+    if sender_task is not None:
+        sender_task.cancel()
+    if listener is not None:
+        await listener.stop()
+    pool = queue = sender_task = listener = None
@@ -0,0 +1,103 @@
+from bisect import bisect_right
+
+
+# Rank tiers shared by main.py, commands.py and views.py.
+# Each table is (min_value, key, label), sorted by min_value; a value belongs
+# to the last tier whose min_value it reaches.
+SCORE_TIERS = [
+    (None, "dice_roller", "Dice Roller 🎲"),
+    (1, "safe_square_user", "Safe Square User ⭐ "),
+    (6, "triple_six_samurai", "Triple Six Samauri 🎲🥷"),
+    (16, "piece_eater", "Piece Eater 🏠🔙 "),
+    (26, "safe_zone_master", "Safe Zone Master 🔒"),
+    (51, "goal_collector", "Goal Collector 👑🥅"),
+]
+
+STREAK_TIERS = [
+    (None, "greenhorn", "Greenhorn 🌱"),
+    (3, "duffer", "🏌️ Duffer (3+ day streak)"),
+    (5, "par_player", "🐤 Par Player (5+ day streak)"),
+    (10, "birdie_streaker", "🐦 Birdie Streaker (10+ day streak)"),
+    (20, "eagle_master", "🦅 Eagle Master (20+ day streak)"),
+    (30, "hole_in_one_legend", "👑⛳ Hole in One Legend (30+ day streak)"),
+]
+
+_SCORE_BOUNDS = [t[0] for t in SCORE_TIERS[1:]]
+_STREAK_BOUNDS = [t[0] for t in STREAK_TIERS[1:]]
+
+def _tiers_by_key():
+    """key -> (column, lo, hi, label), hi being None for the top tier."""
+    tiers_by_key = {}
+    for column, tiers in (("score", SCORE_TIERS), ("streak", STREAK_TIERS)):
+        for i, (lo, key, label) in enumerate(tiers):
+            hi = tiers[i + 1][0] - 1 if i + 1 < len(tiers) else None
+            tiers_by_key[key] = (column, lo, hi, label)
+    return tiers_by_key
+
+
+TIERS_BY_KEY = _tiers_by_key()
+
+
+def get_score_rank(score):
+    return SCORE_TIERS[bisect_right(_SCORE_BOUNDS, score or 0)][2]
+
+
+def get_streak_rank(streak):
+    return STREAK_TIERS[bisect_right(_STREAK_BOUNDS, streak or 0)][2]
+
+
+def get_rank(score=0, streak=0):
+    # Prioritize streak if provided, fall back to score
+    if streak and streak > 0:
+        return get_streak_rank(streak)
+    return get_score_rank(score)
+
+
+def tier_label(key):
+    tier = TIERS_BY_KEY.get(key)
+    return tier[3] if tier else None
+
+
+def tier_case_sql(column, tiers):
+    """SQL CASE expression mapping a column to tier keys, highest tier first."""
+    whens = [
+        f"WHEN {column} >= {lo} THEN '{key}'"
+        for lo, key, _ in reversed(tiers) if lo is not None
+    ]
+    return f"CASE {' '.join(whens)} ELSE '{tiers[0][1]}' END"
+
+
+SCORE_TIER_SQL = tier_case_sql("score", SCORE_TIERS)
+STREAK_TIER_SQL = tier_case_sql("streak", STREAK_TIERS)
+
+
+def tier_filter_sql(key, first_param=1):
+    """Return (sql, args) for a range predicate selecting one tier, or (None, [])."""
+    tier = TIERS_BY_KEY.get(key)
+    if tier is None:
+        return None, []
+    column, lo, hi, _ = tier
+    clauses, args = [], []
+    if lo is not None:
+        clauses.append(f"{column} >= ${first_param + len(args)}")
+        args.append(lo)
+    if hi is not None:
+        clauses.append(f"{column} <= ${first_param + len(args)}")
+        args.append(hi)
+    return " AND ".join(clauses) or "TRUE", args
+
+
+def score_tier_offset_sql(key, first_param=1):
+    """For a score tier, return (sql, args) counting the players ranked
+    above it, or (None, []) for anything else.
+
+    Score tiers are contiguous slices of the score-ordered ranking, so a
+    tier's ranks are its own RANK() plus this count.
+    """
+    tier = TIERS_BY_KEY.get(key)
+    if tier is None or tier[0] != "score":
+        return None, []
+    hi = tier[2]
+    if hi is None:
+        return "0", []
+    return f"(SELECT COUNT(*) FROM users WHERE score > ${first_param})", [hi]
@@ -0,0 +1,89 @@
+import os
+import time
+from collections import OrderedDict
+
+
+class GuessRateLimiter:
+    """Token bucket per user, checked in on_message before any real work.
+
+    Buckets live in an OrderedDict ordered by last use so the table can be
+    capped (oldest evicted first) and swept of idle buckets cheaply.
+    """
+
+    def __init__(self, burst=3, refill_per_sec=0.5, max_buckets=10000, sweep_interval=60):
+        self.burst = float(burst)
+        self.refill_per_sec = float(refill_per_sec)
+        self.max_buckets = max_buckets
+        self.sweep_interval = sweep_interval
+        # How long an idle bucket takes to refill completely; after that it is
+        # indistinguishable from a fresh one and can be dropped.
+        self.idle_ttl = self.burst / self.refill_per_sec if self.refill_per_sec > 0 else 3600
+        # user_id -> [tokens, last_seen, notified_until]
+        self.buckets = OrderedDict()
+        self._last_sweep = time.monotonic()
+
+    def check(self, user_id: int, now: float = None):
+        """Return (allowed, notify).
+
+        notify is True only for the first rejected message in a cooldown
+        window, so the caller sends at most one notice per window.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            if len(self.buckets) >= self.max_buckets:
+                self.buckets.popitem(last=False)
+            self.buckets[user_id] = [self.burst - 1, now, 0.0]
+            return True, False
+
+        self.buckets.move_to_end(user_id)
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.refill_per_sec)
+        bucket[1] = now
+
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return True, False
+
+        bucket[0] = tokens
+        if now >= bucket[2]:
+            # Window lasts until one token is available again
+            bucket[2] = now + (1 - tokens) / self.refill_per_sec if self.refill_per_sec > 0 else now + 60
+            return False, True
+        return False, False
+
+    def retry_after(self, user_id: int, now: float = None) -> float:
+        if now is None:
+            now = time.monotonic()
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            return 0.0
+        return max(0.0, bucket[2] - now)
+
+    def sweep(self, now: float = None):
+        """Drop buckets that have been idle long enough to be full again."""
+        if now is None:
+            now = time.monotonic()
+        self._last_sweep = now
+        cutoff = now - self.idle_ttl
+        # Ordered by last use, so stop at the first bucket that is still live
+        while self.buckets:
+            user_id, bucket = next(iter(self.buckets.items()))
+            if bucket[1] > cutoff or bucket[2] > now:
+                break
+            self.buckets.popitem(last=False)
+
+    def reset(self):
+        self.buckets.clear()
+
+
+def limiter_from_env():
+    return GuessRateLimiter(
+        burst=int(os.getenv("GUESS_RATE_BURST") or 3),
+        refill_per_sec=float(os.getenv("GUESS_RATE_PER_SEC") or 0.5),
+        max_buckets=int(os.getenv("GUESS_RATE_MAX_USERS") or 10000),
+    )
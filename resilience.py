@@ -0,0 +1,139 @@
+"""Timeouts, retries and a circuit breaker for database calls.
+
+db.backend_op runs every storage operation through guarded_call(). Transient
+failures (timeouts, dropped or refused connections, serialization
+conflicts) count against a shared CircuitBreaker; once it opens, calls fail
+immediately with CircuitOpenError until a single probe call succeeds, so
+handlers stop queueing behind a database that isn't answering. Operations
+marked idempotent are retried a few times with jittered backoff first.
+"""
+import asyncio
+import os
+import random
+import time
+
+import asyncpg
+
+
+# Cap on one storage call, including its wait for a pool connection (bulk
+# operations opt out), and on that wait alone for any pool user
+CALL_TIMEOUT = float(os.getenv("DB_CALL_TIMEOUT_SECONDS") or 5)
+ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT_SECONDS") or 3)
+
+RETRIES = int(os.getenv("DB_RETRIES") or 2)
+RETRY_BASE_SECONDS = float(os.getenv("DB_RETRY_BASE_SECONDS") or 0.1)
+RETRY_MAX_SECONDS = float(os.getenv("DB_RETRY_MAX_SECONDS") or 1)
+
+BREAKER_FAILURES = int(os.getenv("DB_BREAKER_FAILURES") or 5)
+BREAKER_RESET_SECONDS = float(os.getenv("DB_BREAKER_RESET_SECONDS") or 10)
+
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    OSError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.TooManyConnectionsError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.SerializationError,
+    asyncpg.DeadlockDetectedError,
+    asyncpg.QueryCanceledError,
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """The database is considered down; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Closed -> open after `failures` transient errors in a row; after
+    `reset` seconds one probe call is let through (half-open), and its
+    outcome closes or re-opens the circuit."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset = reset
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.opened_count = 0
+        self.rejected = 0
+
+    def before_call(self):
+        if self.state == "closed":
+            return
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset:
+            self.state = "half_open"
+            self.probing = False
+        if self.state == "half_open" and not self.probing:
+            self.probing = True
+            return
+        self.rejected += 1
+        raise CircuitOpenError("Database circuit is open")
+
+    def record_success(self):
+        if self.state != "closed":
+            print("[resilience] ✅ Database circuit closed")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failures:
+            if self.state != "open":
+                self.opened_count += 1
+                print(f"[resilience] ⚠️ Database circuit opened after {self.consecutive_failures} failure(s)")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+    @property
+    def is_open(self):
+        return self.state != "closed"
+
+
+breaker = CircuitBreaker()
+
+
+def backoff(attempt):
+    """Full-jitter exponential backoff for the given retry number (1-based)."""
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+async def guarded_call(fn, name, retries=0, timeout=CALL_TIMEOUT):
+    """Await fn() behind the breaker, retrying transient errors `retries` times."""
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = await asyncio.wait_for(fn(), timeout)
+        except TRANSIENT_ERRORS as e:
+            breaker.record_failure()
+            if attempt >= retries or breaker.state == "open":
+                raise
+            attempt += 1
+            print(f"[resilience] {name} failed ({type(e).__name__}), retry {attempt}/{retries}")
+            await asyncio.sleep(backoff(attempt))
+            continue
+        except Exception:
+            # The database answered, just not with what the caller wanted
+            breaker.record_success()
+            raise
+        breaker.record_success()
+        return result
+
+
+class BoundedPool:
+    """Wraps an asyncpg pool so acquire() gives up after ACQUIRE_TIMEOUT
+    instead of waiting forever for a free connection."""
+
+    def __init__(self, pool, timeout=ACQUIRE_TIMEOUT):
+        self.pool = pool
+        self.timeout = timeout
+
+    def acquire(self, *, timeout=None):
+        return self.pool.acquire(timeout=timeout or self.timeout)
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
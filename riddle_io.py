@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+
+
+# Riddles without a submitter are attributed to the bot (see format_question_embed)
+BOT_SUBMITTER_ID = 1
+
+MAX_IMPORT_BYTES = 8 * 1024 * 1024
+
+
+def _normalize(question, answer, user_id):
+    # JSON values can be numbers (kept as text) or lists/objects (bad rows)
+    if not all(value is None or isinstance(value, (str, int, float)) for value in (question, answer)):
+        return None
+    question = str(question if question is not None else "").strip()
+    answer = str(answer if answer is not None else "").strip().lower()
+    if not question or not answer:
+        return None
+    try:
+        user_id = int(user_id) if user_id not in (None, "") else BOT_SUBMITTER_ID
+    except (TypeError, ValueError):
+        user_id = BOT_SUBMITTER_ID
+    return question, answer, user_id
+
+
+def parse_riddle_file(filename: str, data: bytes):
+    """Parse (question, answer, user_id) records from a CSV or JSON/JSONL upload.
+
+    CSV needs a header with question and answer columns (user_id optional).
+    JSON is a list of objects with the same keys; JSONL is one object per line.
+    Rows missing a question or answer are skipped. Returns (records, bad_rows).
+    """
+    text = data.decode("utf-8-sig")
+    name = (filename or "").lower()
+    records, bad_rows = [], 0
+
+    if name.endswith(".csv"):
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or not {"question", "answer"} <= {f.strip().lower() for f in reader.fieldnames}:
+            raise ValueError("CSV must have a header row with 'question' and 'answer' columns.")
+        for row in reader:
+            row = {(k or "").strip().lower(): v for k, v in row.items()}
+            record = _normalize(row.get("question"), row.get("answer"), row.get("user_id"))
+            if record:
+                records.append(record)
+            else:
+                bad_rows += 1
+    elif name.endswith(".jsonl"):
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                bad_rows += 1
+                continue
+            record = _normalize(item.get("question"), item.get("answer"), item.get("user_id")) if isinstance(item, dict) else None
+            if record:
+                records.append(record)
+            else:
+                bad_rows += 1
+    elif name.endswith(".json"):
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("JSON must be a list of {\"question\": ..., \"answer\": ...} objects.")
+        for item in items:
+            record = _normalize(item.get("question"), item.get("answer"), item.get("user_id")) if isinstance(item, dict) else None
+            if record:
+                records.append(record)
+            else:
+                bad_rows += 1
+    else:
+        raise ValueError("Unsupported file type. Upload a .csv, .json or .jsonl file.")
+
+    return records, bad_rows
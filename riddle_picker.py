@@ -0,0 +1,195 @@
+import math
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+
+# Solve rate the picker steers toward, and how quickly a riddle's weight
+# falls off as its predicted solve rate moves away from it
+TARGET_SOLVE_RATE = float(os.getenv("RIDDLE_TARGET_SOLVE_RATE") or 0.5)
+SOLVE_RATE_WIDTH = float(os.getenv("RIDDLE_SOLVE_RATE_WIDTH") or 0.25)
+# Age changes every weight a little each day; a full rebuild picks that up
+REBUILD_SECONDS = float(os.getenv("RIDDLE_PICKER_REBUILD_HOURS") or 24) * 3600
+
+# How many plays a history is worth before it outweighs its fallback
+PRIOR_PLAYS = 10
+
+MIN_WEIGHT = 0.05
+
+
+class FenwickTree:
+    """Binary indexed tree of float weights: O(log n) update and weighted pick."""
+
+    def __init__(self, weights=()):
+        self.weights = list(weights)
+        self.tree = [0.0] * (len(self.weights) + 1)
+        # O(n) build: push each node's sum to its parent
+        for i, weight in enumerate(self.weights, 1):
+            self.tree[i] += weight
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+
+    def __len__(self):
+        return len(self.weights)
+
+    def total(self):
+        i, total = len(self.weights), 0.0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def set(self, index, weight):
+        delta = weight - self.weights[index]
+        self.weights[index] = weight
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def find(self, target):
+        """Index of the slot whose cumulative weight range contains target."""
+        index = 0
+        step = 1 << (len(self.weights).bit_length())
+        while step:
+            nxt = index + step
+            if nxt < len(self.tree) and self.tree[nxt] <= target:
+                index = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return min(index, len(self.weights) - 1)
+
+
+def _smoothed(solvers, participants, prior):
+    return (solvers + PRIOR_PLAYS * prior) / (participants + PRIOR_PLAYS)
+
+
+def similarity_key(question, answer):
+    """Riddles with similar answer length and question length play alike."""
+    answer_words = min(len((answer or "").split()), 3)
+    length = len(question or "")
+    size = 0 if length < 60 else 1 if length < 120 else 2 if length < 200 else 3
+    return answer_words, size
+
+
+class RiddlePicker:
+    """Weighted random choice over the unused riddles.
+
+    Each riddle's weight combines how close its predicted solve rate is to
+    TARGET_SOLVE_RATE (from its submitter's past riddles, falling back to
+    riddles of similar shape), how long it has waited in the queue, and
+    whether its question is unusually short or long. Weights sit in a
+    Fenwick tree, so picking, adding and consuming a riddle are all
+    O(log n); the tree is rebuilt from the database once a day.
+    """
+
+    def __init__(self):
+        self.riddles = []     # slot -> riddle dict, None once consumed
+        self.slots = {}       # riddle_id -> slot
+        self.free = []        # consumed slots to reuse
+        self.tree = FenwickTree()
+        self.by_submitter = {}  # user_id -> [solvers, participants]
+        self.by_shape = {}      # similarity_key -> [solvers, participants]
+        self.overall = [0, 0]
+        self.built_at = None
+
+    def __len__(self):
+        return len(self.slots)
+
+    def needs_rebuild(self):
+        return self.built_at is None or time.monotonic() - self.built_at >= REBUILD_SECONDS
+
+    def invalidate(self):
+        self.built_at = None
+
+    def rebuild(self, riddles, history):
+        """riddles: unused riddle rows. history: (user_id, question, answer,
+        participants, solvers) for each riddle with stats."""
+        self.by_submitter.clear()
+        self.by_shape.clear()
+        self.overall = [0, 0]
+        for user_id, question, answer, participants, solvers in history:
+            self._record(user_id, question, answer, participants, solvers)
+        self.riddles = [dict(riddle) for riddle in riddles]
+        self.slots = {riddle["riddle_id"]: slot for slot, riddle in enumerate(self.riddles)}
+        self.free = []
+        now = datetime.now(timezone.utc)
+        self.tree = FenwickTree(self.weight(riddle, now) for riddle in self.riddles)
+        self.built_at = time.monotonic()
+
+    def _record(self, user_id, question, answer, participants, solvers):
+        for counts in (
+            self.by_submitter.setdefault(user_id, [0, 0]),
+            self.by_shape.setdefault(similarity_key(question, answer), [0, 0]),
+            self.overall,
+        ):
+            counts[0] += solvers
+            counts[1] += participants
+
+    def record_result(self, riddle, participants, solvers):
+        """Fold a revealed riddle into the history used for new weights."""
+        if participants:
+            self._record(riddle.get("user_id"), riddle.get("question"), riddle.get("answer"), participants, solvers)
+
+    def predicted_solve_rate(self, riddle):
+        overall = _smoothed(self.overall[0], self.overall[1], TARGET_SOLVE_RATE)
+        shape = self.by_shape.get(similarity_key(riddle.get("question"), riddle.get("answer")), (0, 0))
+        shape_rate = _smoothed(shape[0], shape[1], overall)
+        submitter = self.by_submitter.get(riddle.get("user_id"), (0, 0))
+        return _smoothed(submitter[0], submitter[1], shape_rate)
+
+    def weight(self, riddle, now=None):
+        rate = self.predicted_solve_rate(riddle)
+        difficulty = math.exp(-((rate - TARGET_SOLVE_RATE) / SOLVE_RATE_WIDTH) ** 2)
+        created_at = riddle.get("created_at")
+        if created_at is not None and created_at.tzinfo is None:
+            # created_at may be a plain TIMESTAMP column, which asyncpg returns naive; it holds UTC
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        age_days = ((now or datetime.now(timezone.utc)) - created_at).total_seconds() / 86400 if created_at else 0
+        age = 1 + math.log1p(max(age_days, 0) / 7)
+        length = len(riddle.get("question") or "")
+        shape = 0.5 if length < 20 or length > 400 else 1.0
+        return max(difficulty, MIN_WEIGHT) * age * shape
+
+    def add(self, riddle):
+        riddle = dict(riddle)
+        riddle_id = riddle["riddle_id"]
+        if self.built_at is None or riddle_id in self.slots:
+            return
+        if not self.free:
+            # Out of slots: rebuild with room to spare, O(n) once per doubling
+            weights = self.tree.weights + [0.0] * max(len(self.riddles), 16)
+            self.free = list(range(len(weights) - 1, len(self.riddles) - 1, -1))
+            self.riddles += [None] * (len(weights) - len(self.riddles))
+            self.tree = FenwickTree(weights)
+        slot = self.free.pop()
+        self.riddles[slot] = riddle
+        self.slots[riddle_id] = slot
+        self.tree.set(slot, self.weight(riddle))
+
+    def remove(self, riddle_id):
+        slot = self.slots.pop(riddle_id, None)
+        if slot is None:
+            return None
+        riddle = self.riddles[slot]
+        self.riddles[slot] = None
+        self.tree.set(slot, 0.0)
+        self.free.append(slot)
+        return riddle
+
+    def take(self, count=1):
+        """Pick and consume up to `count` distinct riddles."""
+        picked = []
+        while len(picked) < count and self.slots:
+            total = self.tree.total()
+            slot = self.tree.find(random.random() * total) if total > 0 else None
+            if slot is None or self.riddles[slot] is None:
+                # Float drift left weight on an empty slot; start fresh
+                live = [slot for slot, riddle in enumerate(self.riddles) if riddle is not None]
+                slot = random.choice(live)
+                self.tree = FenwickTree(w if self.riddles[i] is not None else 0.0
+                                        for i, w in enumerate(self.tree.weights))
+            picked.append(self.remove(self.riddles[slot]["riddle_id"]))
+        return picked
@@ -0,0 +1,103 @@
+from bisect import bisect_right
+from datetime import datetime, timezone
+from itertools import zip_longest
+
+
+# Upper edges (seconds after posting) of the time-to-solve histogram
+# buckets; one more bucket catches everything slower.
+SOLVE_TIME_BUCKETS = (60, 300, 900, 1800, 3600, 7200, 14400, 28800)
+SOLVE_TIME_LABELS = ("<1m", "1-5m", "5-15m", "15-30m", "30m-1h", "1-2h", "2-4h", "4-8h", "8h+")
+
+
+class SolveStats:
+    """Running solve counters for one open riddle.
+
+    Updated from on_message as guesses come in, so memory stays the same
+    however many people play. Each replica only counts the guesses it
+    handles; at reveal every replica adds its counters to the riddle's
+    riddle_stats row.
+    """
+
+    __slots__ = (
+        "opened_at", "participants", "guesses", "solvers", "solver_attempts",
+        "first_solve_seconds", "solve_seconds_total", "histogram",
+    )
+
+    def __init__(self, opened_at=None):
+        self.opened_at = opened_at or datetime.now(timezone.utc)
+        self.participants = 0
+        self.guesses = 0
+        self.solvers = 0
+        self.solver_attempts = 0
+        self.first_solve_seconds = None
+        self.solve_seconds_total = 0.0
+        self.histogram = [0] * (len(SOLVE_TIME_BUCKETS) + 1)
+
+    def record_guess(self, first_guess):
+        self.guesses += 1
+        if first_guess:
+            self.participants += 1
+
+    def record_solve(self, attempts, at=None):
+        """A correct guess that was the user's `attempts`-th on this riddle."""
+        seconds = max(((at or datetime.now(timezone.utc)) - self.opened_at).total_seconds(), 0.0)
+        self.solvers += 1
+        self.solver_attempts += attempts
+        self.solve_seconds_total += seconds
+        if self.first_solve_seconds is None or seconds < self.first_solve_seconds:
+            self.first_solve_seconds = seconds
+        self.histogram[bisect_right(SOLVE_TIME_BUCKETS, seconds)] += 1
+
+    def summary(self):
+        return {
+            "posted_at": self.opened_at,
+            "participants": self.participants,
+            "guesses": self.guesses,
+            "solvers": self.solvers,
+            "solver_attempts": self.solver_attempts,
+            "first_solve_seconds": self.first_solve_seconds,
+            "solve_seconds_total": self.solve_seconds_total,
+            "solve_histogram": list(self.histogram),
+        }
+
+
+def merge_summaries(stored, added):
+    """Two replicas' summary() dicts for the same riddle, combined."""
+    def earliest(key):
+        return min((s[key] for s in (stored, added) if s[key] is not None), default=None)
+
+    return {
+        "posted_at": earliest("posted_at"),
+        "participants": stored["participants"] + added["participants"],
+        "guesses": stored["guesses"] + added["guesses"],
+        "solvers": stored["solvers"] + added["solvers"],
+        "solver_attempts": stored["solver_attempts"] + added["solver_attempts"],
+        "first_solve_seconds": earliest("first_solve_seconds"),
+        "solve_seconds_total": stored["solve_seconds_total"] + added["solve_seconds_total"],
+        "solve_histogram": [a + b for a, b in zip_longest(stored["solve_histogram"], added["solve_histogram"], fillvalue=0)],
+    }
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "—"
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes}m"
+
+
+def median_bucket(histogram):
+    """Label of the bucket holding the median solve time."""
+    total = sum(histogram)
+    if not total:
+        return None
+    seen = 0
+    for label, count in zip(SOLVE_TIME_LABELS, histogram):
+        seen += count
+        if seen * 2 >= total:
+            return label
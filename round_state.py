@@ -0,0 +1,72 @@
+from riddle_stats import SolveStats
+
+
+# Each participant is one small int in RoundState.participants:
+# attempts << ATTEMPT_SHIFT | DEDUCTED | SOLVED
+SOLVED = 1
+DEDUCTED = 2
+ATTEMPT_SHIFT = 2
+# Attempts stop counting here, which keeps every record below 256 and so
+# one of CPython's shared small ints rather than a new object per player
+MAX_ATTEMPTS = 63
+
+
+class RoundState:
+    """One open riddle in a channel, keyed by native int snowflakes.
+
+    Per-player state is a single dict of packed ints rather than parallel
+    str-keyed sets and dicts, so a round with 100k players holds 100k dict
+    entries and no per-player objects beyond the key.
+    """
+
+    __slots__ = (
+        "riddle", "riddle_id", "author_id", "kind", "closes_at",
+        "revealed", "participants", "winners", "stats",
+    )
+
+    def __init__(self, riddle, kind="daily", closes_at=None, posted_at=None):
+        self.riddle = riddle
+        self.riddle_id = riddle["riddle_id"]
+        self.author_id = int(riddle["user_id"]) if riddle.get("user_id") else None
+        self.kind = kind            # "daily" or "rapid"
+        self.closes_at = closes_at  # rapid-fire riddles reveal themselves at this time
+        self.revealed = False
+        self.participants = {}      # user_id -> packed record
+        self.winners = []           # user_ids in the order they solved it
+        self.stats = SolveStats(posted_at)
+
+    @property
+    def daily(self):
+        return self.kind == "daily"
+
+    def attempts(self, user_id):
+        return self.participants.get(user_id, 0) >> ATTEMPT_SHIFT
+
+    def has_solved(self, user_id):
+        return bool(self.participants.get(user_id, 0) & SOLVED)
+
+    def was_deducted(self, user_id):
+        return bool(self.participants.get(user_id, 0) & DEDUCTED)
+
+    def can_play(self, user_id):
+        return user_id != self.author_id and not self.has_solved(user_id)
+
+    def add_attempt(self, user_id):
+        """Count a wrong guess; returns the user's attempts so far."""
+        record = self.participants.get(user_id, 0)
+        if record >> ATTEMPT_SHIFT < MAX_ATTEMPTS:
+            record += 1 << ATTEMPT_SHIFT
+        self.participants[user_id] = record
+        return record >> ATTEMPT_SHIFT
+
+    def mark_solved(self, user_id):
+        """False if the user had already solved it."""
+        record = self.participants.get(user_id, 0)
+        if record & SOLVED:
+            return False
+        self.participants[user_id] = record | SOLVED
+        self.winners.append(user_id)
+        return True
+
+    def mark_deducted(self, user_id):
+        self.participants[user_id] = self.participants.get(user_id, 0) | DEDUCTED
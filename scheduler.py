@@ -0,0 +1,226 @@
+import asyncio
+import heapq
+import itertools
+import os
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import db
+
+
+# A failed run keeps its job_runs claim until the claim goes stale (ten
+# minutes), so catch-up jobs are retried a little after that
+RETRY_SECONDS = float(os.getenv("JOB_RETRY_SECONDS") or 660)
+
+
+class JobSpec:
+    __slots__ = ("name", "handler", "default_time", "catchup", "catchup_before")
+
+    def __init__(self, name, handler, default_time, catchup=False, catchup_before=None):
+        self.name = name
+        self.handler = handler              # async def handler(guild_id, channel_id)
+        self.default_time = default_time    # datetime.time, in the schedule's timezone
+        self.catchup = catchup              # run a missed occurrence on startup?
+        self.catchup_before = catchup_before  # ...but only while this job's same-day run is still ahead
+
+
+class Schedule:
+    __slots__ = ("guild_id", "job", "run_time", "tz", "channel_id", "version")
+
+    def __init__(self, guild_id, job, run_time, tz, channel_id, version=0):
+        self.guild_id = guild_id
+        self.job = job
+        self.run_time = run_time
+        self.tz = tz
+        self.channel_id = channel_id
+        self.version = version
+
+    def occurrence(self, local_date):
+        """UTC datetime of this schedule's run on a given local date."""
+        local = datetime.combine(local_date, self.run_time, tzinfo=self.tz)
+        return local.astimezone(timezone.utc)
+
+    def next_after(self, when):
+        local_date = when.astimezone(self.tz).date()
+        for offset in range(0, 3):
+            candidate = self.occurrence(local_date + timedelta(days=offset))
+            if candidate > when:
+                return candidate
+        return self.occurrence(local_date + timedelta(days=3))
+
+    def last_at_or_before(self, when):
+        local_date = when.astimezone(self.tz).date()
+        for offset in range(0, 3):
+            candidate = self.occurrence(local_date - timedelta(days=offset))
+            if candidate <= when:
+                return candidate
+        return self.occurrence(local_date - timedelta(days=3))
+
+
+class Scheduler:
+    """One timer for every (guild, job) schedule, kept in a heap.
+
+    Each schedule has exactly one live heap entry; editing a schedule bumps
+    its version and stale entries are skipped when popped, so adding or
+    changing a guild costs O(log n). Runs are claimed in job_runs by
+    (guild, job, local date) so a restart or a second process never runs
+    the same occurrence twice.
+    """
+
+    def __init__(self):
+        self.jobs = {}       # job name -> JobSpec
+        self.schedules = {}  # (guild_id, job) -> Schedule
+        self.heap = []       # (when_utc, seq, guild_id, job, version)
+        self.counter = itertools.count()
+        self.wakeup = None
+        self.task = None
+        self.running = set()
+        self.retries = set()
+
+    def register(self, name, handler, default_time, catchup=False, catchup_before=None):
+        self.jobs[name] = JobSpec(name, handler, default_time, catchup, catchup_before)
+
+    def _push(self, schedule, after):
+        when = schedule.next_after(after)
+        heapq.heappush(self.heap, (when, next(self.counter), schedule.guild_id, schedule.job, schedule.version))
+
+    def set_schedule(self, guild_id, job, run_time, tz_name, channel_id):
+        key = (guild_id, job)
+        previous = self.schedules.get(key)
+        schedule = Schedule(
+            guild_id, job, run_time, ZoneInfo(tz_name or "UTC"), channel_id,
+            version=(previous.version + 1) if previous else 0,
+        )
+        self.schedules[key] = schedule
+        self._push(schedule, datetime.now(timezone.utc))
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return schedule
+
+    def next_run(self, guild_id, job):
+        schedule = self.schedules.get((guild_id, job))
+        if schedule is None:
+            return None
+        return schedule.next_after(datetime.now(timezone.utc))
+
+    def guild_for_channel(self, channel_id):
+        for schedule in self.schedules.values():
+            if schedule.channel_id == channel_id:
+                return schedule.guild_id
+        return None
+
+    async def load(self):
+        rows = await db.get_job_schedules()
+        self.schedules.clear()
+        self.heap.clear()
+        for row in rows:
+            if row["job"] not in self.jobs:
+                print(f"[scheduler] Ignoring schedule for unknown job {row['job']}")
+                continue
+            self.set_schedule(row["guild_id"], row["job"], row["run_time"], row["timezone"], row["channel_id"])
+        print(f"[scheduler] Loaded {len(self.schedules)} schedule(s)")
+
+    async def _still_due(self, schedule, occurrence, now):
+        """Whether a catch-up job's occurrence should (still) be run."""
+        spec = self.jobs[schedule.job]
+        if not spec.catchup or now - occurrence > timedelta(hours=24):
+            return False
+        if spec.catchup_before:
+            # e.g. don't post a riddle after that day's reveal time has passed
+            gate = self.schedules.get((schedule.guild_id, spec.catchup_before))
+            if gate is not None:
+                local_date = occurrence.astimezone(schedule.tz).date()
+                if gate.occurrence(local_date) <= now:
+                    return False
+        return not await db.job_run_exists(schedule.guild_id, schedule.job, occurrence.astimezone(schedule.tz).date())
+
+    async def catch_up(self):
+        """Run occurrences missed while the process was down, oldest first."""
+        now = datetime.now(timezone.utc)
+        missed = []
+        for schedule in self.schedules.values():
+            occurrence = schedule.last_at_or_before(now)
+            if await self._still_due(schedule, occurrence, now):
+                missed.append((occurrence, schedule))
+
+        for occurrence, schedule in sorted(missed, key=lambda m: m[0]):
+            print(f"[scheduler] Catching up {schedule.job} for guild {schedule.guild_id} (missed {occurrence:%Y-%m-%d %H:%M} UTC)")
+            await self._fire(schedule, occurrence)
+
+    async def start(self):
+        if self.task is not None and not self.task.done():
+            return
+        self.wakeup = asyncio.Event()
+        await self.load()
+        await self.catch_up()
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        for task in self.retries:
+            task.cancel()
+
+    def is_running(self):
+        return self.task is not None and not self.task.done()
+
+    async def _run(self):
+        while True:
+            if not self.heap:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+
+            delay = (self.heap[0][0] - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=min(delay, 3600))
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+                continue
+
+            when, _, guild_id, job, version = heapq.heappop(self.heap)
+            schedule = self.schedules.get((guild_id, job))
+            if schedule is None or schedule.version != version:
+                continue  # edited or removed since this entry was pushed
+            self._push(schedule, when)
+            task = asyncio.get_running_loop().create_task(self._fire(schedule, when))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _fire(self, schedule, occurrence):
+        run_date = occurrence.astimezone(schedule.tz).date()
+        try:
+            if not await db.claim_job_run(schedule.guild_id, schedule.job, run_date):
+                print(f"[scheduler] {schedule.job} for guild {schedule.guild_id} on {run_date} already ran")
+                return
+            await self.jobs[schedule.job].handler(schedule.guild_id, schedule.channel_id)
+        except Exception as e:
+            # Left unfinished, so catch-up (here or on the next leader) runs it again
+            print(f"[scheduler] ERROR running {schedule.job} for guild {schedule.guild_id}: {e}")
+            if self.jobs[schedule.job].catchup:
+                task = asyncio.get_running_loop().create_task(self._retry(schedule, occurrence))
+                self.retries.add(task)
+                task.add_done_callback(self.retries.discard)
+            return
+        try:
+            await db.finish_job_run(schedule.guild_id, schedule.job, run_date)
+        except Exception as e:
+            print(f"[scheduler] ERROR finishing {schedule.job} for guild {schedule.guild_id}: {e}")
+
+    async def _retry(self, schedule, occurrence):
+        await asyncio.sleep(RETRY_SECONDS)
+        # Reloads replace Schedule objects; pick up the current one
+        schedule = self.schedules.get((schedule.guild_id, schedule.job))
+        if schedule is None:
+            return
+        try:
+            due = await self._still_due(schedule, occurrence, datetime.now(timezone.utc))
+        except Exception as e:
+            print(f"[scheduler] ERROR checking retry of {schedule.job} for guild {schedule.guild_id}: {e}")
+            due = True
+        if due:
+            print(f"[scheduler] Retrying {schedule.job} for guild {schedule.guild_id}")
+            await self._fire(schedule, occurrence)
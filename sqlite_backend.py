@@ -0,0 +1,896 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dtime, timedelta, timezone
+
+import perf
+from ranks import SCORE_TIER_SQL, STREAK_TIER_SQL, score_tier_offset_sql, tier_filter_sql
+from riddle_stats import merge_summaries
+from storage import StorageBackend
+
+
+# Store timestamps as fixed-width UTC ISO strings so they sort as text, and
+# turn declared TIMESTAMPTZ/DATE/TIME columns back into Python objects.
+sqlite3.register_adapter(datetime, lambda v: v.astimezone(timezone.utc).isoformat(timespec="microseconds"))
+sqlite3.register_adapter(date, lambda v: v.isoformat())
+sqlite3.register_adapter(dtime, lambda v: v.isoformat())
+sqlite3.register_converter("TIMESTAMPTZ", lambda v: datetime.fromisoformat(v.decode()))
+sqlite3.register_converter("DATE", lambda v: date.fromisoformat(v.decode()))
+sqlite3.register_converter("TIME", lambda v: dtime.fromisoformat(v.decode()))
+# Postgres INTEGER[] columns, stored as comma-separated text
+sqlite3.register_converter("INTLIST", lambda v: [int(n) for n in v.decode().split(",") if n])
+
+# Same window as db.JOB_RUN_STALE
+JOB_RUN_STALE = timedelta(minutes=10)
+
+# Same mapping as db.ROUND_OUTCOMES
+ROUND_OUTCOMES = {"solved": "solved_at", "penalized": "penalized_at"}
+
+# Same job_runs key as db.SETTLE_GUILD_ID and db.SETTLE_JOB
+SETTLE_GUILD_ID = 0
+SETTLE_JOB = "settle_missed_riddles"
+
+# FOLD_EVENTS uses aggregate FILTER clauses on window functions (3.30)
+MIN_SQLITE_VERSION = (3, 30, 0)
+
+# Most writes queued behind one another that share a transaction
+WRITE_BATCH = int(os.getenv("SQLITE_WRITE_BATCH") or 64)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    score INTEGER NOT NULL DEFAULT 0,
+    streak INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS users_score_streak_idx ON users (score DESC, streak DESC);
+DROP INDEX IF EXISTS users_streak_idx;
+
+CREATE TABLE IF NOT EXISTS user_submitted_questions (
+    riddle_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    created_at TIMESTAMPTZ,
+    posted_at TIMESTAMPTZ,
+    posted_channel_id INTEGER,
+    revealed_at TIMESTAMPTZ,
+    closes_at TIMESTAMPTZ
+);
+CREATE UNIQUE INDEX IF NOT EXISTS user_submitted_questions_question_norm_idx
+    ON user_submitted_questions (LOWER(TRIM(question)));
+CREATE INDEX IF NOT EXISTS user_submitted_questions_created_idx
+    ON user_submitted_questions (created_at DESC, riddle_id DESC);
+CREATE INDEX IF NOT EXISTS user_submitted_questions_user_created_idx
+    ON user_submitted_questions (user_id, created_at DESC, riddle_id DESC);
+
+-- Full-text search for /searchriddles, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS riddle_fts USING fts5(
+    question, answer,
+    content='user_submitted_questions', content_rowid='riddle_id',
+    tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS riddle_fts_insert AFTER INSERT ON user_submitted_questions BEGIN
+    INSERT INTO riddle_fts (rowid, question, answer) VALUES (new.riddle_id, new.question, new.answer);
+END;
+CREATE TRIGGER IF NOT EXISTS riddle_fts_delete AFTER DELETE ON user_submitted_questions BEGIN
+    INSERT INTO riddle_fts (riddle_fts, rowid, question, answer) VALUES ('delete', old.riddle_id, old.question, old.answer);
+END;
+CREATE TRIGGER IF NOT EXISTS riddle_fts_update AFTER UPDATE OF question, answer ON user_submitted_questions BEGIN
+    INSERT INTO riddle_fts (riddle_fts, rowid, question, answer) VALUES ('delete', old.riddle_id, old.question, old.answer);
+    INSERT INTO riddle_fts (rowid, question, answer) VALUES (new.riddle_id, new.question, new.answer);
+END;
+
+CREATE TABLE IF NOT EXISTS score_events (
+    event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    score_delta INTEGER NOT NULL DEFAULT 0,
+    streak_delta INTEGER NOT NULL DEFAULT 0,
+    reset_streak INTEGER NOT NULL DEFAULT 0,
+    reason TEXT,
+    created_at TIMESTAMPTZ NOT NULL,
+    compacted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS score_events_user_time_idx ON score_events (user_id, created_at);
+CREATE INDEX IF NOT EXISTS score_events_pending_idx ON score_events (user_id) WHERE compacted = 0;
+
+CREATE TABLE IF NOT EXISTS leaderboard_snapshots (
+    snapshot_date DATE NOT NULL,
+    user_id INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    streak INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    PRIMARY KEY (snapshot_date, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS bot_state (
+    key TEXT PRIMARY KEY,
+    value TEXT,
+    updated_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS job_schedules (
+    guild_id INTEGER NOT NULL,
+    job TEXT NOT NULL,
+    run_time TIME NOT NULL,
+    timezone TEXT NOT NULL DEFAULT 'UTC',
+    channel_id INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, job)
+);
+
+CREATE TABLE IF NOT EXISTS job_runs (
+    guild_id INTEGER NOT NULL,
+    job TEXT NOT NULL,
+    run_date DATE NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ,
+    PRIMARY KEY (guild_id, job, run_date)
+);
+
+CREATE TABLE IF NOT EXISTS riddle_stats (
+    riddle_id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    posted_at TIMESTAMPTZ,
+    revealed_at TIMESTAMPTZ NOT NULL,
+    participants INTEGER NOT NULL,
+    guesses INTEGER NOT NULL,
+    solvers INTEGER NOT NULL,
+    solver_attempts INTEGER NOT NULL,
+    first_solve_seconds REAL,
+    solve_seconds_total REAL NOT NULL,
+    solve_histogram INTLIST NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS round_participants (
+    riddle_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    solved_at TIMESTAMPTZ,
+    penalized_at TIMESTAMPTZ,
+    PRIMARY KEY (riddle_id, user_id)
+);
+"""
+
+def leaderboard_with_movement_sql(where="1", rank_offset="0"):
+    """Same shape as db.leaderboard_with_movement_sql; ?1 is today's date."""
+    return f"""
+    WITH ranked AS (
+        SELECT user_id, score, streak,
+               RANK() OVER (ORDER BY score DESC, streak DESC) + {rank_offset} AS rank,
+               {SCORE_TIER_SQL} AS score_tier,
+               {STREAK_TIER_SQL} AS streak_tier
+        FROM users
+        WHERE (score >= 1 OR streak >= 1) AND {where}
+    ),
+    previous AS (
+        SELECT MAX(snapshot_date) AS snapshot_date
+        FROM leaderboard_snapshots
+        WHERE snapshot_date < ?1
+    )
+    SELECT r.user_id, r.score, r.streak, r.rank, r.score_tier, r.streak_tier, s.rank AS prev_rank
+    FROM ranked r
+    LEFT JOIN leaderboard_snapshots s
+        ON s.snapshot_date = (SELECT snapshot_date FROM previous)
+       AND s.user_id = r.user_id
+    """
+
+
+LEADERBOARD_WITH_MOVEMENT_SQL = leaderboard_with_movement_sql()
+
+# Same per-event clamping fold as db.FOLD_EVENTS, over an `events` CTE
+FOLD_EVENTS = """
+    streak_runs AS (
+        SELECT user_id, event_id, score_delta, streak_delta,
+               event_id >= COALESCE(MAX(event_id) FILTER (WHERE reset_streak) OVER (PARTITION BY user_id), 0) AS counts,
+               MAX(reset_streak) OVER (PARTITION BY user_id) AS reset
+        FROM events
+    ),
+    running AS (
+        SELECT user_id, score_delta, streak_delta, counts, reset,
+               SUM(score_delta) OVER w AS score_run,
+               SUM(CASE WHEN counts THEN streak_delta ELSE 0 END) OVER w AS streak_run
+        FROM streak_runs
+        WINDOW w AS (PARTITION BY user_id ORDER BY event_id)
+    ),
+    folded AS (
+        SELECT user_id,
+               SUM(score_delta) AS score_total,
+               MIN(score_run) AS score_low,
+               SUM(CASE WHEN counts THEN streak_delta ELSE 0 END) AS streak_total,
+               MIN(CASE WHEN counts THEN streak_run END) AS streak_low,
+               MAX(reset) AS reset
+        FROM running
+        GROUP BY user_id
+    )
+"""
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _today():
+    return _now().date()
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def _numbered(sql):
+    """Rewrite asyncpg-style $n placeholders (e.g. from ranks.tier_filter_sql) as ?n."""
+    return re.sub(r"\$(\d+)", r"?\1", sql)
+
+
+def _match_query(text):
+    """websearch_to_tsquery-ish: every word must appear, as an FTS5 query string."""
+    words = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{word}"' for word in words)
+
+
+class SQLiteBackend(StorageBackend):
+    """In-process SQLite storage for small deployments and tests.
+
+    The database runs in WAL mode so readers never block on the writer.
+    Reads run on a small thread pool, one connection per thread. All writes
+    go through a queue drained by a single writer task, which runs whatever
+    has queued up in one transaction (a savepoint per operation), so bursts
+    of guesses cost one fsync rather than one each. Each connection keeps
+    its compiled statements cached.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, readers=None):
+        self.path = path
+        self.memory = path == ":memory:" or path.startswith("file::memory:")
+        self.readers = 1 if self.memory else (readers or int(os.getenv("SQLITE_READERS") or 4))
+        self.write_executor = None
+        self.read_executor = None
+        self.write_conn = None
+        self.write_queue = None
+        self.writer_task = None
+        self.local = threading.local()
+        self.reader_conns = []
+
+    @classmethod
+    def from_dsn(cls, dsn):
+        # sqlite:///relative.db, sqlite:////absolute/path.db, sqlite:///:memory:
+        path = dsn.split("://", 1)[1].split("?", 1)[0]
+        if path.startswith("/"):
+            path = path[1:]
+        return cls(path or ":memory:")
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,  # transactions are managed explicitly
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        conn.row_factory = _dict_row
+        conn.execute("PRAGMA busy_timeout = 5000")
+        return conn
+
+    # -------------------
+    # Plumbing
+    # -------------------
+
+    async def open(self):
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(
+                f"SQLite {sqlite3.sqlite_version} is too old for the sqlite backend; "
+                f"it needs {'.'.join(map(str, MIN_SQLITE_VERSION))} or later"
+            )
+        loop = asyncio.get_running_loop()
+        self.write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+        # An in-memory database only exists on its one connection
+        self.read_executor = self.write_executor if self.memory else ThreadPoolExecutor(
+            max_workers=self.readers, thread_name_prefix="sqlite-reader"
+        )
+        self.write_conn = await loop.run_in_executor(self.write_executor, self._open_writer)
+        self.write_queue = asyncio.Queue()
+        self.writer_task = loop.create_task(self._writer())
+        print(f"[sqlite] Opened {self.path} ({self.readers} reader thread(s))")
+
+    def _open_writer(self):
+        conn = self._connect()
+        if not self.memory:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    async def close(self):
+        if self.writer_task is not None:
+            self.writer_task.cancel()
+            try:
+                await self.writer_task
+            except asyncio.CancelledError:
+                pass
+            self.writer_task = None
+        for conn in self.reader_conns:
+            conn.close()
+        self.reader_conns.clear()
+        if self.write_conn is not None:
+            self.write_conn.close()
+            self.write_conn = None
+        for executor in {self.read_executor, self.write_executor}:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def _reader_conn(self):
+        if self.memory:
+            return self.write_conn
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self._connect()
+            self.reader_conns.append(conn)
+        return conn
+
+    async def _read(self, fn):
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.read_executor, lambda: fn(self._reader_conn())
+            )
+        finally:
+            perf._add_db(time.perf_counter() - started)
+
+    async def _write(self, fn):
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        await self.write_queue.put((fn, future))
+        try:
+            return await future
+        finally:
+            perf._add_db(time.perf_counter() - started)
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.write_queue.get()]
+            while len(batch) < WRITE_BATCH and not self.write_queue.empty():
+                batch.append(self.write_queue.get_nowait())
+            try:
+                results = await loop.run_in_executor(
+                    self.write_executor, self._run_batch, [fn for fn, _ in batch]
+                )
+            except Exception as e:
+                results = [(False, e)] * len(batch)
+            for (_, future), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _run_batch(self, fns):
+        conn = self.write_conn
+        results = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for fn in fns:
+                conn.execute("SAVEPOINT op")
+                try:
+                    results.append((True, fn(conn)))
+                    conn.execute("RELEASE op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    results.append((False, e))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return results
+
+    async def backup_to(self, directory):
+        path = os.path.join(directory, f"riddlebot-{time.strftime('%Y%m%d-%H%M%S')}.sqlite3")
+
+        def copy(conn):
+            target = sqlite3.connect(path)
+            try:
+                conn.backup(target)
+            finally:
+                target.close()
+            return path
+
+        return await self._read(copy)
+
+    # -------------------
+    # Schema and bookkeeping
+    # -------------------
+
+    async def ensure_schema(self):
+        def setup(conn):
+            # executescript manages its own transaction, so run it on the
+            # writer thread outside the batching loop
+            conn.executescript(SCHEMA)
+            return conn.execute("""
+                INSERT INTO score_events (user_id, score_delta, streak_delta, reason, created_at, compacted)
+                SELECT user_id, score, streak, 'baseline', ?, 1
+                FROM users
+                WHERE NOT EXISTS (SELECT 1 FROM score_events)
+            """, (_now(),)).rowcount
+
+        seeded = await asyncio.get_running_loop().run_in_executor(self.write_executor, setup, self.write_conn)
+        print(f"[ensure_schema] SQLite schema ready (seeded {max(seeded, 0)} baseline events)")
+
+    async def get_bot_state(self, key):
+        row = await self._read(lambda c: c.execute(
+            "SELECT value FROM bot_state WHERE key = ?", (key,)
+        ).fetchone())
+        return row["value"] if row else None
+
+    async def set_bot_state(self, key, value):
+        await self._write(lambda c: c.execute("""
+            INSERT INTO bot_state (key, value, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+        """, (key, value, _now())))
+
+    # -------------------
+    # Users
+    # -------------------
+
+    async def upsert_user(self, user_id, score, streak):
+        await self._write(lambda c: c.execute("""
+            INSERT INTO users (user_id, score, streak, created_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET score = excluded.score, streak = excluded.streak
+        """, (user_id, score, streak, _now())))
+
+    async def ensure_user(self, user_id):
+        return await self._write(lambda c: c.execute(
+            "INSERT INTO users (user_id, score, streak, created_at) VALUES (?, 0, 0, ?) ON CONFLICT (user_id) DO NOTHING",
+            (user_id, _now())
+        ).rowcount == 1)
+
+    async def get_user(self, user_id):
+        return await self._read(lambda c: c.execute(
+            "SELECT * FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone())
+
+    async def user_exists(self, user_id, conn=None):
+        return await self._read(lambda c: c.execute(
+            "SELECT 1 FROM users WHERE user_id = ?", (int(user_id),)
+        ).fetchone() is not None)
+
+    async def get_all_streak_users(self):
+        rows = await self._read(lambda c: c.execute(
+            "SELECT user_id FROM users WHERE streak > 0 OR score > 0"
+        ).fetchall())
+        return [str(row["user_id"]) for row in rows]
+
+    async def get_all_scores_and_streaks(self):
+        rows = await self._read(lambda c: c.execute("SELECT user_id, score, streak FROM users").fetchall())
+        return {str(row["user_id"]): {"score": row["score"], "streak": row["streak"]} for row in rows}
+
+    async def get_max_total(self):
+        row = await self._read(lambda c: c.execute(
+            "SELECT COALESCE(MAX(COALESCE(score, 0) + COALESCE(streak, 0)), 0) AS total FROM users"
+        ).fetchone())
+        return row["total"]
+
+    # -------------------
+    # Riddles
+    # -------------------
+
+    async def get_all_submitted_questions(self):
+        return await self._read(lambda c: c.execute("SELECT * FROM user_submitted_questions").fetchall())
+
+    async def get_unused_riddles(self):
+        return await self._read(lambda c: c.execute(
+            "SELECT riddle_id, question, answer, user_id, created_at FROM user_submitted_questions WHERE posted_at IS NULL"
+        ).fetchall())
+
+    async def count_unused_questions_db(self):
+        row = await self._read(lambda c: c.execute(
+            "SELECT COUNT(*) AS n FROM user_submitted_questions WHERE posted_at IS NULL"
+        ).fetchone())
+        return row["n"]
+
+    async def find_riddle_by_question(self, question):
+        return await self._read(lambda c: c.execute(
+            "SELECT * FROM user_submitted_questions WHERE LOWER(TRIM(question)) = LOWER(TRIM(?))", (question,)
+        ).fetchone())
+
+    async def insert_submitted_question(self, user_id, question, answer):
+        try:
+            await self.add_riddle(user_id, question, answer)
+        except Exception as e:
+            print(f"[insert_submitted_question] ERROR inserting riddle: {e}")
+
+    async def add_riddle(self, user_id, question, answer):
+        return await self._write(lambda c: c.execute(
+            "INSERT INTO user_submitted_questions (user_id, question, answer, created_at) VALUES (?, ?, ?, ?)",
+            (user_id, question, answer, _now())
+        ).lastrowid)
+
+    async def delete_riddle(self, riddle_id):
+        return await self._write(lambda c: c.execute(
+            "DELETE FROM user_submitted_questions WHERE riddle_id = ?", (riddle_id,)
+        ).rowcount)
+
+    async def fetch_riddles_page(self, after=None, limit=5, status=None, submitter_id=None):
+        clauses, args = [], []
+        if after is not None:
+            clauses.append("(created_at, riddle_id) < (?, ?)")
+            args.extend(after)
+        if status == "posted":
+            clauses.append("posted_at IS NOT NULL")
+        elif status == "unposted":
+            clauses.append("posted_at IS NULL")
+        if submitter_id is not None:
+            clauses.append("user_id = ?")
+            args.append(submitter_id)
+        args.append(limit)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return await self._read(lambda c: c.execute(f"""
+            SELECT riddle_id, user_id, question, answer, created_at, posted_at
+            FROM user_submitted_questions
+            {where}
+            ORDER BY created_at DESC, riddle_id DESC
+            LIMIT ?
+        """, args).fetchall())
+
+    async def search_riddles(self, query, limit=5, offset=0):
+        match = _match_query(query)
+        if not match:
+            return [], 0
+        rows = await self._read(lambda c: c.execute("""
+            WITH hits AS MATERIALIZED (
+                -- bm25() can't be mixed with the window function in one SELECT
+                SELECT rowid AS riddle_id, -bm25(riddle_fts) AS relevance
+                FROM riddle_fts
+                WHERE riddle_fts MATCH ?
+            )
+            SELECT q.riddle_id, q.user_id, q.question, q.answer, q.created_at, q.posted_at,
+                   h.relevance,
+                   COUNT(*) OVER () AS total
+            FROM hits h
+            JOIN user_submitted_questions q ON q.riddle_id = h.riddle_id
+            ORDER BY h.relevance DESC, q.riddle_id DESC
+            LIMIT ? OFFSET ?
+        """, (match, limit, offset)).fetchall())
+        total = rows[0]["total"] if rows else 0
+        print(f"[search_riddles] '{query}' matched {total} riddles (offset {offset})")
+        return rows, total
+
+    async def import_riddles(self, records):
+        if not records:
+            return 0, 0
+        now = _now()
+        # The normalized-question unique index drops duplicates, both against
+        # the bank and within the file
+        inserted = await self._write(lambda c: c.executemany("""
+            INSERT INTO user_submitted_questions (user_id, question, answer, created_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
+        """, [(user_id, question, answer, now) for question, answer, user_id in records]).rowcount)
+        print(f"[import_riddles] Inserted {inserted} of {len(records)} riddles")
+        return inserted, len(records) - inserted
+
+    async def get_active_riddles(self):
+        cutoff = _now() - timedelta(days=1)
+        return await self._read(lambda c: c.execute("""
+            SELECT riddle_id, question, answer, user_id, posted_channel_id, posted_at, closes_at
+            FROM user_submitted_questions
+            WHERE posted_at >= ? AND revealed_at IS NULL
+            ORDER BY posted_at
+        """, (cutoff,)).fetchall())
+
+    async def mark_riddle_posted(self, riddle_id, channel_id, closes_at=None):
+        await self._write(lambda c: c.execute(
+            "UPDATE user_submitted_questions SET posted_at = ?, posted_channel_id = ?, closes_at = ? WHERE riddle_id = ?",
+            (_now(), channel_id, closes_at, riddle_id)
+        ))
+
+    async def mark_riddle_revealed(self, riddle_id):
+        return await self._write(lambda c: c.execute(
+            "UPDATE user_submitted_questions SET revealed_at = ? WHERE riddle_id = ? AND revealed_at IS NULL",
+            (_now(), riddle_id)
+        ).rowcount == 1)
+
+    async def add_riddle_stats(self, riddle_id, kind, summary):
+        now = _now()
+
+        def add(c):
+            # The single writer makes this read-modify-write atomic
+            stored = c.execute("SELECT * FROM riddle_stats WHERE riddle_id = ?", (riddle_id,)).fetchone()
+            merged = merge_summaries(stored, summary) if stored else summary
+            c.execute("""
+                INSERT INTO riddle_stats (
+                    riddle_id, kind, posted_at, revealed_at, participants, guesses, solvers,
+                    solver_attempts, first_solve_seconds, solve_seconds_total, solve_histogram
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (riddle_id) DO UPDATE
+                SET kind = excluded.kind,
+                    posted_at = excluded.posted_at,
+                    participants = excluded.participants,
+                    guesses = excluded.guesses,
+                    solvers = excluded.solvers,
+                    solver_attempts = excluded.solver_attempts,
+                    first_solve_seconds = excluded.first_solve_seconds,
+                    solve_seconds_total = excluded.solve_seconds_total,
+                    solve_histogram = excluded.solve_histogram
+            """, (riddle_id, kind, merged["posted_at"], now, merged["participants"], merged["guesses"],
+                  merged["solvers"], merged["solver_attempts"], merged["first_solve_seconds"],
+                  merged["solve_seconds_total"], ",".join(map(str, merged["solve_histogram"]))))
+
+        await self._write(add)
+
+    async def get_riddle_stats(self, riddle_id):
+        return await self._read(lambda c: c.execute("""
+            SELECT s.*, q.question, q.answer
+            FROM riddle_stats s
+            LEFT JOIN user_submitted_questions q USING (riddle_id)
+            WHERE s.riddle_id = ?
+        """, (riddle_id,)).fetchone())
+
+    async def get_solve_history(self):
+        return await self._read(lambda c: c.execute("""
+            SELECT q.user_id, q.question, q.answer, s.participants, s.solvers
+            FROM riddle_stats s
+            JOIN user_submitted_questions q USING (riddle_id)
+            WHERE s.participants > 0
+        """).fetchall())
+
+    # -------------------
+    # Job schedules
+    # -------------------
+
+    async def get_job_schedules(self):
+        return await self._read(lambda c: c.execute(
+            "SELECT guild_id, job, run_time, timezone, channel_id FROM job_schedules"
+        ).fetchall())
+
+    async def upsert_job_schedule(self, guild_id, job, run_time, tz, channel_id):
+        await self._write(lambda c: c.execute("""
+            INSERT INTO job_schedules (guild_id, job, run_time, timezone, channel_id) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (guild_id, job) DO UPDATE
+            SET run_time = excluded.run_time, timezone = excluded.timezone, channel_id = excluded.channel_id
+        """, (guild_id, job, run_time, tz, channel_id)))
+        print(f"[upsert_job_schedule] {job} for guild {guild_id} at {run_time} {tz} in channel {channel_id}")
+
+    async def seed_job_schedules(self, guild_id, channel_id, defaults):
+        await self._write(lambda c: c.executemany("""
+            INSERT INTO job_schedules (guild_id, job, run_time, timezone, channel_id) VALUES (?, ?, ?, 'UTC', ?)
+            ON CONFLICT (guild_id, job) DO NOTHING
+        """, [(guild_id, job, run_time, channel_id) for job, run_time in defaults.items()]))
+
+    async def claim_job_run(self, guild_id, job, run_date):
+        now = _now()
+        return await self._write(lambda c: c.execute("""
+            INSERT INTO job_runs (guild_id, job, run_date, started_at) VALUES (?1, ?2, ?3, ?4)
+            ON CONFLICT (guild_id, job, run_date) DO UPDATE
+            SET started_at = excluded.started_at
+            WHERE job_runs.finished_at IS NULL AND job_runs.started_at < ?5
+        """, (guild_id, job, run_date, now, now - JOB_RUN_STALE)).rowcount == 1)
+
+    async def finish_job_run(self, guild_id, job, run_date):
+        await self._write(lambda c: c.execute(
+            "UPDATE job_runs SET finished_at = ? WHERE guild_id = ? AND job = ? AND run_date = ?",
+            (_now(), guild_id, job, run_date)
+        ))
+
+    async def job_run_exists(self, guild_id, job, run_date):
+        cutoff = _now() - JOB_RUN_STALE
+        return await self._read(lambda c: c.execute("""
+            SELECT 1 FROM job_runs
+            WHERE guild_id = ? AND job = ? AND run_date = ?
+              AND (finished_at IS NOT NULL OR started_at >= ?)
+        """, (guild_id, job, run_date, cutoff)).fetchone() is not None)
+
+    # -------------------
+    # Score event ledger
+    # -------------------
+
+    async def insert_score_events(self, records):
+        now = _now()
+        await self._write(lambda c: c.executemany("""
+            INSERT INTO score_events (user_id, score_delta, streak_delta, reset_streak, reason, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(*record, now) for record in records]))
+
+    async def claim_round_outcomes(self, user_id, outcome, awards):
+        column = ROUND_OUTCOMES[outcome]
+        now = _now()
+
+        def claim(c):
+            claimed = set()
+            for riddle_id, score_delta, streak_delta, reset_streak, reason in awards:
+                changed = c.execute(f"""
+                    INSERT INTO round_participants (riddle_id, user_id, {column}) VALUES (?1, ?2, ?3)
+                    ON CONFLICT (riddle_id, user_id) DO UPDATE SET {column} = excluded.{column}
+                    WHERE round_participants.{column} IS NULL
+                """, (riddle_id, user_id, now)).rowcount
+                if changed:
+                    c.execute("""
+                        INSERT INTO score_events (user_id, score_delta, streak_delta, reset_streak, reason, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, (user_id, score_delta, streak_delta, reset_streak, reason, now))
+                    claimed.add(riddle_id)
+            return claimed
+
+        return await self._write(claim)
+
+    async def get_round_participants(self, riddle_id):
+        return await self._read(lambda c: c.execute("""
+            SELECT user_id, solved_at, penalized_at
+            FROM round_participants
+            WHERE riddle_id = ?
+            ORDER BY solved_at IS NULL, solved_at, user_id
+        """, (riddle_id,)).fetchall())
+
+    async def claim_missed_riddles(self, riddle_id):
+        now = _now()
+
+        def settle(c):
+            # Timestamps are stored in UTC, so date() is the UTC day
+            row = c.execute("""
+                SELECT date(posted_at) AS day FROM user_submitted_questions
+                WHERE riddle_id = ? AND closes_at IS NULL
+            """, (riddle_id,)).fetchone()
+            day = row["day"] if row else None
+            if day is None:
+                return None
+            if c.execute("""
+                SELECT 1 FROM user_submitted_questions
+                WHERE date(posted_at) = ? AND closes_at IS NULL AND revealed_at IS NULL
+            """, (day,)).fetchone():
+                return None
+            if not c.execute("""
+                INSERT INTO job_runs (guild_id, job, run_date, started_at, finished_at) VALUES (?1, ?2, ?3, ?4, ?4)
+                ON CONFLICT (guild_id, job, run_date) DO NOTHING
+            """, (SETTLE_GUILD_ID, SETTLE_JOB, day, now)).rowcount:
+                return None
+            missed = [row["user_id"] for row in c.execute("""
+                WITH day_riddles AS (
+                    SELECT riddle_id, user_id FROM user_submitted_questions
+                    WHERE date(posted_at) = ?1 AND closes_at IS NULL
+                )
+                SELECT u.user_id FROM users u
+                WHERE (u.streak > 0 OR u.score > 0)
+                  AND NOT EXISTS (SELECT 1 FROM day_riddles d WHERE d.user_id = u.user_id)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM round_participants p JOIN day_riddles d USING (riddle_id)
+                      WHERE p.user_id = u.user_id
+                  )
+            """, (day,)).fetchall()]
+            c.executemany("""
+                INSERT INTO score_events (user_id, score_delta, streak_delta, reset_streak, reason, created_at)
+                VALUES (?, -1, 0, 1, 'missed_riddle', ?)
+            """, [(user_id, now) for user_id in missed])
+            print(f"[claim_missed_riddles] Settled {day}: {len(missed)} missed")
+            return missed
+
+        return await self._write(settle)
+
+    async def fold_score_events(self):
+        now = _now()
+
+        def fold(c):
+            # The single writer already serializes compactions
+            high = c.execute("SELECT MAX(event_id) AS high FROM score_events WHERE compacted = 0").fetchone()["high"]
+            if high is None:
+                return 0
+            c.execute("""
+                INSERT INTO users (user_id, score, streak, created_at)
+                SELECT DISTINCT user_id, 0, 0, ?2
+                FROM score_events
+                WHERE compacted = 0 AND event_id <= ?1
+                ON CONFLICT (user_id) DO NOTHING
+            """, (high, now))
+            c.execute(f"""
+                WITH events AS (
+                    SELECT user_id, event_id, score_delta, streak_delta, reset_streak
+                    FROM score_events
+                    WHERE compacted = 0 AND event_id <= ?1
+                ),
+                {FOLD_EVENTS}
+                UPDATE users
+                SET score = MAX(users.score + f.score_total, f.score_total - f.score_low),
+                    streak = MAX(CASE WHEN f.reset THEN 0 ELSE users.streak END + f.streak_total,
+                                 f.streak_total - f.streak_low)
+                FROM folded f
+                WHERE users.user_id = f.user_id
+            """, (high,))
+            return c.execute(
+                "UPDATE score_events SET compacted = 1 WHERE compacted = 0 AND event_id <= ?", (high,)
+            ).rowcount
+
+        return await self._write(fold)
+
+    async def get_score_as_of(self, user_id, as_of):
+        row = await self._read(lambda c: c.execute(f"""
+            WITH events AS (
+                SELECT user_id, event_id, score_delta, streak_delta, reset_streak
+                FROM score_events
+                WHERE user_id = ?1 AND created_at <= ?2
+            ),
+            {FOLD_EVENTS}
+            SELECT COALESCE(MAX(score_total - MIN(score_low, 0)), 0) AS score,
+                   COALESCE(MAX(streak_total - MIN(streak_low, 0)), 0) AS streak
+            FROM folded
+        """, (int(user_id), as_of)).fetchone())
+        return {"score": row["score"], "streak": row["streak"]}
+
+    async def get_score_uncached(self, user_id):
+        row = await self._read(lambda c: c.execute(f"""
+            WITH events AS (
+                SELECT user_id, event_id, score_delta, streak_delta, reset_streak
+                FROM score_events WHERE user_id = ?1 AND compacted = 0
+            ),
+            {FOLD_EVENTS}
+            SELECT CASE WHEN f.user_id IS NULL THEN base.score
+                        ELSE MAX(base.score + f.score_total, f.score_total - f.score_low) END AS score
+            FROM (SELECT COALESCE((SELECT score FROM users WHERE user_id = ?1), 0) AS score) base
+            LEFT JOIN folded f ON 1
+        """, (int(user_id),)).fetchone())
+        return row["score"] or 0
+
+    async def get_streak_uncached(self, user_id):
+        row = await self._read(lambda c: c.execute(f"""
+            WITH events AS (
+                SELECT user_id, event_id, score_delta, streak_delta, reset_streak
+                FROM score_events WHERE user_id = ?1 AND compacted = 0
+            ),
+            {FOLD_EVENTS}
+            SELECT CASE WHEN f.user_id IS NULL THEN base.streak
+                        ELSE MAX(CASE WHEN f.reset THEN 0 ELSE base.streak END + f.streak_total,
+                                 f.streak_total - f.streak_low) END AS streak
+            FROM (SELECT COALESCE((SELECT streak FROM users WHERE user_id = ?1), 0) AS streak) base
+            LEFT JOIN folded f ON 1
+        """, (int(user_id),)).fetchone())
+        return row["streak"] or 0
+
+    # -------------------
+    # Leaderboard snapshots
+    # -------------------
+
+    async def snapshot_leaderboard(self, snapshot_date=None):
+        count = await self._write(lambda c: c.execute("""
+            INSERT INTO leaderboard_snapshots (snapshot_date, user_id, score, streak, rank)
+            SELECT ?, user_id, score, streak, RANK() OVER (ORDER BY score DESC, streak DESC)
+            FROM users
+            WHERE score >= 1 OR streak >= 1
+            ON CONFLICT (snapshot_date, user_id) DO UPDATE
+            SET score = excluded.score, streak = excluded.streak, rank = excluded.rank
+        """, (snapshot_date or _today(),)).rowcount)
+        result = f"INSERT 0 {count}"
+        print(f"[snapshot_leaderboard] {result}")
+        return result
+
+    async def get_leaderboard_with_movement(self, tier=None, limit=None, offset=0):
+        tier_sql, args = tier_filter_sql(tier, first_param=2) if tier else (None, [])
+        offset_sql, offset_args = score_tier_offset_sql(tier, 2 + len(args)) if tier else (None, [])
+        if offset_sql is not None:
+            source = leaderboard_with_movement_sql(_numbered(tier_sql), _numbered(offset_sql))
+            where = "1"
+            args += offset_args
+        else:
+            source = LEADERBOARD_WITH_MOVEMENT_SQL
+            where = _numbered(tier_sql) if tier_sql else "1"
+        query = f"""
+            SELECT lb.*, COUNT(*) OVER () AS total, MAX(lb.score) OVER () AS max_score
+            FROM ({source}) lb
+            WHERE {where}
+            ORDER BY rank, user_id
+            LIMIT ?{len(args) + 2} OFFSET ?{len(args) + 3}
+        """
+        # A negative LIMIT is SQLite's "no limit"
+        return await self._read(lambda c: c.execute(
+            query, (_today(), *args, -1 if limit is None else limit, offset)
+        ).fetchall())
+
+    async def get_user_rank_movement(self, user_id):
+        return await self._read(lambda c: c.execute(
+            f"SELECT * FROM ({LEADERBOARD_WITH_MOVEMENT_SQL}) lb WHERE lb.user_id = ?2",
+            (_today(), user_id)
+        ).fetchone())
@@ -0,0 +1,45 @@
+"""Storage backend selection.
+
+The module-level coroutines in db.py marked with @db.backend_op are the
+storage interface the rest of the bot calls. Postgres via asyncpg is the
+built-in implementation; any other backend is an object with coroutine
+methods of the same names, picked from the DATABASE_URL scheme.
+"""
+from urllib.parse import urlsplit
+
+
+POSTGRES_SCHEMES = {"postgres", "postgresql"}
+
+
+class StorageBackend:
+    """Base for non-Postgres backends.
+
+    Subclasses implement every db.backend_op operation as a method with the
+    same signature, plus open/close and backup_to for /exportdata.
+    """
+
+    name = None
+
+    async def open(self):
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+    async def backup_to(self, directory):
+        """Write a consistent copy of the database into directory; return its path."""
+        raise NotImplementedError
+
+    def missing_operations(self, operations):
+        return sorted(op for op in operations if not callable(getattr(self, op, None)))
+
+
+def backend_for_dsn(dsn):
+    """A StorageBackend for dsn, or None for a Postgres DSN handled by asyncpg."""
+    scheme = urlsplit(dsn or "").scheme.lower()
+    if not scheme or scheme in POSTGRES_SCHEMES:
+        return None
+    if scheme == "sqlite":
+        from sqlite_backend import SQLiteBackend
+        return SQLiteBackend.from_dsn(dsn)
+    raise ValueError(f"Unsupported database scheme '{scheme}' in DATABASE_URL")
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlite_backend import SQLiteBackend  # noqa: E402
+
+# Postgres server for the parity tests; each test gets its own schema
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+# ensure_schema only extends these, so the tests create them the way the
+# production database has them
+POSTGRES_BASE_SCHEMA = """
+CREATE TABLE users (
+    user_id BIGINT PRIMARY KEY,
+    score INTEGER NOT NULL DEFAULT 0,
+    streak INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE TABLE user_submitted_questions (
+    riddle_id SERIAL PRIMARY KEY,
+    user_id BIGINT,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    posted_at TIMESTAMPTZ
+);
+"""
+
+
+@pytest.fixture
+def run_with_backend():
+    """Run scenario(backend) against a fresh in-memory SQLite database."""
+    def run(scenario):
+        async def main():
+            backend = SQLiteBackend(":memory:")
+            await backend.open()
+            try:
+                await backend.ensure_schema()
+                return await scenario(backend)
+            finally:
+                await backend.close()
+        return asyncio.run(main())
+    return run
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def run_with_db(request, monkeypatch):
+    """Run scenario() through the db module on a fresh database, once per
+    backend. The Postgres run needs TEST_DATABASE_URL and is skipped without it."""
+    import asyncpg
+    import db
+
+    if request.param == "postgres" and not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    def run(scenario):
+        async def main():
+            schema = None
+            if request.param == "sqlite":
+                monkeypatch.setenv("DATABASE_URL", "sqlite:///:memory:")
+            else:
+                schema = f"riddle_test_{uuid.uuid4().hex[:12]}"
+                conn = await asyncpg.connect(TEST_DATABASE_URL)
+                try:
+                    await conn.execute(f"CREATE SCHEMA {schema}")
+                    await conn.execute(f"SET search_path TO {schema}")
+                    await conn.execute(POSTGRES_BASE_SCHEMA)
+                finally:
+                    await conn.close()
+                separator = "&" if "?" in TEST_DATABASE_URL else "?"
+                monkeypatch.setenv("DATABASE_URL", f"{TEST_DATABASE_URL}{separator}search_path={schema}")
+            try:
+                await db.create_db_pool()
+                await db.ensure_schema()
+                return await scenario()
+            finally:
+                await db.close_db_pools()
+                if schema is not None:
+                    conn = await asyncpg.connect(TEST_DATABASE_URL)
+                    try:
+                        await conn.execute(f"DROP SCHEMA {schema} CASCADE")
+                    finally:
+                        await conn.close()
+        return asyncio.run(main())
+    return run
@@ -0,0 +1,152 @@
+"""The same scenarios through the db module on each backend.
+
+The SQLite backend mirrors the Postgres queries in db.py; these check that
+both give the same answers. The Postgres run needs TEST_DATABASE_URL.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import db
+
+
+def test_fold_matches_uncached_reads(run_with_db):
+    async def scenario():
+        await db.insert_score_events([
+            (5, 1, 1, False, "correct_guess"),
+            (5, 1, 1, False, "correct_guess"),
+            (5, -3, 0, True, "missed_riddle"),
+            (5, 2, 1, False, "correct_guess"),
+            (6, -1, 0, True, "missed_riddle"),
+        ])
+        pending = [await db.get_score_uncached(5), await db.get_streak_uncached(5), await db.get_score_uncached(6)]
+        as_of = await db.get_score_as_of(5, datetime.now(timezone.utc) + timedelta(seconds=1))
+        folded = await db.fold_score_events()
+        user, other = await db.get_user(5), await db.get_user(6)
+        return pending, as_of["score"], folded, (user["score"], user["streak"]), (other["score"], other["streak"])
+
+    pending, as_of, folded, user, other = run_with_db(scenario)
+    # 1, 2, clamped to 0 with the streak reset, then +2
+    assert pending == [2, 1, 0]
+    assert as_of == 2
+    assert folded == 5
+    assert user == (2, 1)
+    assert other == (0, 0)
+
+
+def test_claim_round_outcomes_awards_once(run_with_db):
+    async def scenario():
+        awards = [(1, 1, 1, False, "correct_guess"), (2, 1, 0, False, "rapid_fire_guess")]
+        results = await asyncio.gather(*(db.claim_round_outcomes(42, "solved", awards) for _ in range(10)))
+        penalized = await db.claim_round_outcomes(42, "penalized", [(1, -1, 0, True, "guess_penalty")])
+        again = await db.claim_round_outcomes(42, "solved", awards)
+        participants = await db.get_round_participants(1)
+        await db.fold_score_events()
+        user = await db.get_user(42)
+        return results, penalized, again, len(participants), (user["score"], user["streak"])
+
+    results, penalized, again, participants, user = run_with_db(scenario)
+    assert [set(r) for r in results if r] == [{1, 2}]
+    assert set(penalized) == {1} and not again
+    assert participants == 1
+    assert user == (1, 0)
+
+
+def test_import_and_search_riddles(run_with_db):
+    async def scenario():
+        imported = await db.import_riddles([
+            ("What has keys but can't open locks?", "a piano", 1),
+            ("What has a neck but no head?", "a bottle", 2),
+            ("What has a neck but no arms?", "a shirt", 2),
+            ("what has keys but can't open locks?  ", "a keyboard", 3),
+        ])
+        hits, total = await db.search_riddles("piano")
+        paged, paged_total = await db.search_riddles("neck", limit=1, offset=1)
+        none, no_total = await db.search_riddles("trombone")
+        return imported, [r["answer"] for r in hits], total, len(paged), paged_total, none, no_total
+
+    imported, hits, total, paged, paged_total, none, no_total = run_with_db(scenario)
+    assert tuple(imported) == (3, 1)
+    assert hits == ["a piano"] and total == 1
+    assert paged == 1 and paged_total == 2
+    assert list(none) == [] and no_total == 0
+
+
+def test_missed_riddles_settle_once_across_guilds(run_with_db):
+    async def scenario():
+        for user_id in (1, 2, 3, 4, 5):
+            await db.upsert_user(user_id, 5, 3)
+        # Two guilds' daily riddles (the second written by player 5) and a
+        # rapid-fire riddle, which doesn't hold up the settlement
+        first = await db.add_riddle(9, "What has keys but can't open locks?", "a piano")
+        second = await db.add_riddle(5, "What has a neck but no head?", "a bottle")
+        rapid = await db.add_riddle(9, "What has hands but can't clap?", "a clock")
+        await db.mark_riddle_posted(first, 100)
+        await db.mark_riddle_posted(second, 200)
+        await db.mark_riddle_posted(rapid, 100, datetime.now(timezone.utc) + timedelta(minutes=5))
+        await db.claim_round_outcomes(1, "solved", [(first, 1, 1, False, "correct_guess")])
+        await db.claim_round_outcomes(2, "solved", [(second, 1, 1, False, "correct_guess")])
+        await db.claim_round_outcomes(4, "penalized", [(first, -1, 0, True, "guess_penalty")])
+
+        await db.mark_riddle_revealed(first)
+        early = await db.settle_missed_riddles(first)
+        await db.mark_riddle_revealed(second)
+        settled = await db.settle_missed_riddles(second)
+        again = [await db.settle_missed_riddles(second), await db.settle_missed_riddles(first)]
+        await db.fold_score_events()
+        return early, settled, again, [await db.get_user(user_id) for user_id in (1, 2, 3, 4, 5)]
+
+    early, settled, again, users = run_with_db(scenario)
+    assert early is None
+    # Solving either guild's riddle counts; 4 was already penalized and 5 wrote one
+    assert sorted(settled) == [3]
+    assert again == [None, None]
+    assert [(u["score"], u["streak"]) for u in users] == [(6, 4), (6, 4), (4, 0), (4, 0), (5, 3)]
+
+
+def test_riddle_stats_add_up_across_replicas(run_with_db):
+    posted = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+
+    def summary(participants, solvers, first_solve, histogram, posted_at=posted):
+        return {
+            "posted_at": posted_at, "participants": participants, "guesses": participants * 2,
+            "solvers": solvers, "solver_attempts": solvers * 3, "first_solve_seconds": first_solve,
+            "solve_seconds_total": 100.0 * solvers, "solve_histogram": histogram,
+        }
+
+    async def scenario():
+        riddle_id = await db.add_riddle(9, "What has keys but can't open locks?", "a piano")
+        await db.add_riddle_stats(riddle_id, "daily", summary(4, 2, 30.0, [1, 1, 0, 0, 0, 0, 0, 0, 0]))
+        # A replica that saw guesses but no solves
+        await db.add_riddle_stats(riddle_id, "daily", summary(3, 0, None, [0] * 9, posted + timedelta(seconds=5)))
+        await db.add_riddle_stats(riddle_id, "daily", summary(1, 1, 20.0, [1, 0, 0, 0, 0, 0, 0, 0, 0]))
+        return await db.get_riddle_stats(riddle_id)
+
+    stats = run_with_db(scenario)
+    assert (stats["participants"], stats["guesses"], stats["solvers"], stats["solver_attempts"]) == (8, 16, 3, 9)
+    assert stats["first_solve_seconds"] == 20.0
+    assert stats["solve_seconds_total"] == 300.0
+    assert list(stats["solve_histogram"]) == [2, 1, 0, 0, 0, 0, 0, 0, 0]
+    assert stats["posted_at"] == posted
+
+
+def test_leaderboard_pages(run_with_db):
+    async def scenario():
+        # Scores 30..1, so players 6-15 are in the piece_eater tier (16-25)
+        # and every third player has a 3+ streak (duffer)
+        for user_id in range(1, 31):
+            await db.upsert_user(user_id, 31 - user_id, 3 if user_id % 3 == 0 else 0)
+        everyone = await db.get_leaderboard_with_movement()
+        pages = [await db.get_leaderboard_with_movement(limit=7, offset=offset) for offset in (0, 7, 28)]
+        tier = await db.get_leaderboard_with_movement("piece_eater", limit=3, offset=3)
+        streaks = await db.get_leaderboard_with_movement("duffer", limit=4, offset=8)
+        return everyone, pages, tier, streaks
+
+    everyone, pages, tier, streaks = run_with_db(scenario)
+    assert [row["user_id"] for row in everyone] == list(range(1, 31))
+    assert [[row["rank"] for row in page] for page in pages] == [list(range(1, 8)), list(range(8, 15)), [29, 30]]
+    assert {(row["total"], row["max_score"]) for page in pages for row in page} == {(30, 30)}
+    # Score tiers keep their global ranks
+    assert [(row["user_id"], row["rank"], row["total"], row["max_score"]) for row in tier] == [
+        (9, 9, 10, 25), (10, 10, 10, 25), (11, 11, 10, 25),
+    ]
+    assert [(row["user_id"], row["total"]) for row in streaks] == [(27, 10), (30, 10)]
@@ -0,0 +1,36 @@
+import gzip
+import os
+
+import backup
+
+
+def write_export(directory, name, rows):
+    path = os.path.join(directory, name)
+    with gzip.open(path, "wt") as out:
+        out.write("user_id,score\n" + "".join(f"{row}\n" for row in rows))
+    return path
+
+
+def test_restore_reads_the_exportdata_archive(tmp_path):
+    exported = tmp_path / "export"
+    exported.mkdir()
+    paths = [
+        write_export(exported, "users.0000.csv.gz", ["1,5", "2,3"]),
+        write_export(exported, "users.0001.csv.gz", ["3,1"]),
+        write_export(exported, "bot_state.0000.csv.gz", []),
+    ]
+    archive = backup.bundle(paths, str(tmp_path / "riddle-backup.tar"))
+
+    unpacked = tmp_path / "unpacked"
+    unpacked.mkdir()
+    backup.unpack(archive, str(unpacked))
+
+    users = backup.table_files(str(unpacked), "users")
+    assert [os.path.basename(path) for path in users] == ["users.0000.csv.gz", "users.0001.csv.gz"]
+    assert backup.table_files(str(unpacked), "bot_state")
+    assert backup.table_files(str(unpacked), "score_events") == []
+
+
+def test_table_files_reads_single_file_exports(tmp_path):
+    path = write_export(tmp_path, "users.csv.gz", ["1,5"])
+    assert backup.table_files(str(tmp_path), "users") == [path]
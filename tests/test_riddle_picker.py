@@ -0,0 +1,17 @@
+from datetime import datetime, timedelta, timezone
+
+from riddle_picker import RiddlePicker
+
+
+def test_weight_accepts_naive_created_at():
+    picker = RiddlePicker()
+    now = datetime.now(timezone.utc)
+    created = now - timedelta(days=14)
+    riddle = {"riddle_id": 1, "user_id": 7, "question": "What has keys but can't open locks?", "answer": "a piano"}
+
+    naive = picker.weight({**riddle, "created_at": created.replace(tzinfo=None)}, now)
+    aware = picker.weight({**riddle, "created_at": created}, now)
+
+    # A naive timestamp is read as UTC, so both are two weeks old
+    assert naive == aware
+    assert aware > picker.weight({**riddle, "created_at": now}, now)
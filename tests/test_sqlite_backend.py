@@ -0,0 +1,104 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from sqlite_backend import SQLiteBackend
+
+
+SOLVE = [(1, 1, 1, False, "correct_guess"), (2, 1, 0, False, "rapid_fire_guess")]
+
+
+def test_ensure_schema_is_idempotent(run_with_backend):
+    async def scenario(backend):
+        await backend.ensure_schema()
+        await backend.upsert_user(7, 3, 2)
+        await backend.ensure_schema()
+        return await backend.get_user(7), await backend.get_job_schedules()
+
+    user, schedules = run_with_backend(scenario)
+    assert (user["score"], user["streak"]) == (3, 2)
+    assert schedules == []
+
+
+def test_claim_round_outcomes_awards_once(run_with_backend):
+    async def scenario(backend):
+        results = await asyncio.gather(*(
+            backend.claim_round_outcomes(42, "solved", SOLVE) for _ in range(20)
+        ))
+        # A penalty is a separate outcome for the same player and riddle
+        penalized = await backend.claim_round_outcomes(42, "penalized", [(1, -1, 0, True, "guess_penalty")])
+        again = await backend.claim_round_outcomes(42, "penalized", [(1, -1, 0, True, "guess_penalty")])
+        participants = await backend.get_round_participants(1)
+        await backend.fold_score_events()
+        return results, penalized, again, participants, await backend.get_user(42)
+
+    results, penalized, again, participants, user = run_with_backend(scenario)
+    assert [r for r in results if r] == [{1, 2}]
+    assert penalized == {1} and again == set()
+    assert len(participants) == 1
+    assert participants[0]["solved_at"] is not None and participants[0]["penalized_at"] is not None
+    assert (user["score"], user["streak"]) == (1, 0)
+
+
+def test_fold_score_events_resets_streak(run_with_backend):
+    async def scenario(backend):
+        await backend.insert_score_events([(5, 1, 1, False, "correct_guess")] * 3)
+        first = await backend.fold_score_events()
+        before = await backend.get_user(5)
+        await backend.insert_score_events([
+            (5, -1, 0, True, "missed_riddle"),
+            (5, 1, 1, False, "correct_guess"),
+        ])
+        pending = await backend.get_streak_uncached(5)
+        second = await backend.fold_score_events()
+        return first, before, pending, second, await backend.get_user(5), await backend.fold_score_events()
+
+    first, before, pending, second, after, third = run_with_backend(scenario)
+    assert first == 3 and second == 2 and third == 0
+    assert (before["score"], before["streak"]) == (3, 3)
+    assert pending == 1
+    assert (after["score"], after["streak"]) == (3, 1)
+
+
+def test_score_clamps_at_zero_after_each_event(run_with_backend):
+    async def scenario(backend):
+        await backend.insert_score_events([
+            (9, -1, 0, True, "missed_riddle"),
+            (9, 3, 0, False, "correct_guess"),
+        ])
+        uncached = await backend.get_score_uncached(9)
+        as_of = await backend.get_score_as_of(9, datetime.now(timezone.utc) + timedelta(seconds=1))
+        await backend.fold_score_events()
+        return uncached, as_of["score"], (await backend.get_user(9))["score"]
+
+    # -1 at zero stays at zero, so the +3 lands on 0 everywhere
+    assert run_with_backend(scenario) == (3, 3, 3)
+
+
+def test_import_and_search_riddles(run_with_backend):
+    async def scenario(backend):
+        imported = await backend.import_riddles([
+            ("What has keys but can't open locks?", "a piano", 1),
+            ("What has a neck but no head?", "a bottle", 2),
+            # Same question again, within the file: dropped
+            ("What has keys but can't open locks?", "a keyboard", 3),
+        ])
+        repeat = await backend.import_riddles([("What has a neck but no head?", "a bottle", 2)])
+        hits, total = await backend.search_riddles("piano")
+        none, no_total = await backend.search_riddles("trombone")
+        return imported, repeat, hits, total, none, no_total, await backend.count_unused_questions_db()
+
+    imported, repeat, hits, total, none, no_total, unused = run_with_backend(scenario)
+    assert imported == (2, 1)
+    assert repeat == (0, 1)
+    assert total == 1 and hits[0]["answer"] == "a piano"
+    assert none == [] and no_total == 0
+    assert unused == 2
+
+
+def test_open_rejects_old_sqlite(monkeypatch):
+    monkeypatch.setattr(sqlite3, "sqlite_version_info", (3, 29, 0))
+    with pytest.raises(RuntimeError, match="3.30.0 or later"):
+        asyncio.run(SQLiteBackend(":memory:").open())
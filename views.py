@@ -1,8 +1,11 @@
+from collections import OrderedDict
+
 from discord import app_commands, Interaction, Embed
 from discord.ui import View, Button
 import discord
 import db  
 from db import db_pool
+from ranks import get_score_rank, get_streak_rank
 
 
 
@@ -10,19 +13,6 @@ from db import db_pool
 async def get_streak(user_id: str) -> int:
     return await db.get_streak(user_id) or 0
 
-async def get_rank(score):
-    # You may want to make this async if needed, or pass in pre-fetched max_score/streak
-    if score >= 99:
-        return "🎲⛳ Plato Master"
-    # Add your rank logic as needed
-
-async def get_streak_rank(streak):
-    # Stub or fill in your streak rank logic async if needed
-    if streak >= 30:
-        return "👑⛳ Hole in One Legend (30+ day streak)"
-    return None
-
-
 
 
 class LeaderboardView(View):
@@ -66,8 +56,8 @@ class LeaderboardView(View):
                 if score_val == max_score and max_score > 0:
                     score_line += " - 🎲⛳ Plato Master"
 
-                rank = await get_rank(score_val)
-                streak_rank = await get_streak_rank(streak_val)
+                rank = get_score_rank(score_val)
+                streak_rank = get_streak_rank(streak_val)
                 streak_text = f"🔥{streak_val}"
                 if streak_rank:
                     streak_text += f" - {streak_rank}"
@@ -123,8 +113,8 @@ async def create_leaderboard_embed(client):
             if score_val == max_score and max_score > 0:
                 score_line += " — 🎲⛳ Plato Master"
 
-            rank = await get_rank(score_val)
-            streak_title = await get_streak_rank(streak_val)
+            rank = get_score_rank(score_val)
+            streak_title = get_streak_rank(streak_val)
             streak_line = f"    • Streak: 🔥{streak_val}"
             if streak_title:
                 streak_line += f" — {streak_title}"
@@ -145,14 +135,19 @@ async def create_leaderboard_embed(client):
 
 
 class ListRiddlesView(View):
-    def __init__(self, riddles, user_id, client, per_page=5):
+    def __init__(self, user_id, client, per_page=5, status=None, submitter_id=None, cache_pages=3):
         super().__init__(timeout=300)
-        self.riddles = riddles  # list of riddles dicts
         self.user_id = user_id
         self.client = client
         self.per_page = per_page
+        self.status = status
+        self.submitter_id = submitter_id
         self.current_page = 0
-        self.total_pages = (len(riddles) - 1) // per_page + 1
+        # cursors[i] is the keyset position page i starts after (None = newest)
+        self.cursors = [None]
+        self.has_next = False
+        self.cache_pages = cache_pages
+        self.page_cache = OrderedDict()
 
         self.prev_button = Button(label="⬅️ Previous", style=discord.ButtonStyle.secondary)
         self.next_button = Button(label="Next ➡️", style=discord.ButtonStyle.secondary)
@@ -163,8 +158,93 @@ class ListRiddlesView(View):
         self.add_item(self.prev_button)
         self.add_item(self.next_button)
 
+    def update_buttons(self):
+        self.prev_button.disabled = self.current_page == 0
+        self.next_button.disabled = not self.has_next
+
+    async def go_previous(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("You're not authorized to control this view.", ephemeral=True)
+            return
+
+        self.current_page -= 1
+        embed = await self.get_page_embed()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    async def go_next(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("You're not authorized to control this view.", ephemeral=True)
+            return
+
+        self.current_page += 1
+        embed = await self.get_page_embed()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    async def fetch_page(self, page):
+        cached = self.page_cache.get(page)
+        if cached is not None:
+            self.page_cache.move_to_end(page)
+            return cached
+
+        # One extra row tells us whether there is a next page
+        rows = await db.fetch_riddles_page(
+            after=self.cursors[page],
+            limit=self.per_page + 1,
+            status=self.status,
+            submitter_id=self.submitter_id,
+        )
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if has_next and len(self.cursors) == page + 1:
+            last = rows[-1]
+            self.cursors.append((last["created_at"], last["riddle_id"]))
+
+        self.page_cache[page] = (rows, has_next)
+        if len(self.page_cache) > self.cache_pages:
+            self.page_cache.popitem(last=False)
+        return rows, has_next
+
+    async def get_page_embed(self):
+        page_riddles, self.has_next = await self.fetch_page(self.current_page)
         self.update_buttons()
 
+        embed = Embed(
+            title=f"📜 Submitted Riddles (Page {self.current_page + 1})",
+            color=discord.Color.blurple()
+        )
+
+        for riddle in page_riddles:
+            embed.add_field(
+                name=f"🧩 Riddle #{riddle['riddle_id']}",
+                value=f"**Question:** {riddle['question']}\n**Answer:** ||{riddle['answer']}||\n_Submitted by: <@{riddle['user_id']}>_",
+                inline=False
+            )
+
+        return embed
+
+class SearchRiddlesView(View):
+    def __init__(self, query, user_id, client, per_page=5):
+        super().__init__(timeout=300)
+        self.query = query
+        self.user_id = user_id
+        self.client = client
+        self.per_page = per_page
+        self.current_page = 0
+        self.total = 0  # filled in by each page fetch
+
+        self.prev_button = Button(label="⬅️ Previous", style=discord.ButtonStyle.secondary)
+        self.next_button = Button(label="Next ➡️", style=discord.ButtonStyle.secondary)
+
+        self.prev_button.callback = self.go_previous
+        self.next_button.callback = self.go_next
+
+        self.add_item(self.prev_button)
+        self.add_item(self.next_button)
+
+    @property
+    def total_pages(self):
+        return max(1, (self.total - 1) // self.per_page + 1)
+
     def update_buttons(self):
         self.prev_button.disabled = self.current_page == 0
         self.next_button.disabled = self.current_page >= self.total_pages - 1
@@ -175,7 +255,6 @@ class ListRiddlesView(View):
             return
 
         self.current_page -= 1
-        self.update_buttons()
         embed = await self.get_page_embed()
         await interaction.response.edit_message(embed=embed, view=self)
 
@@ -185,25 +264,31 @@ class ListRiddlesView(View):
             return
 
         self.current_page += 1
-        self.update_buttons()
         embed = await self.get_page_embed()
         await interaction.response.edit_message(embed=embed, view=self)
 
     async def get_page_embed(self):
-        start = self.current_page * self.per_page
-        end = start + self.per_page
-        page_riddles = self.riddles[start:end]
+        # Only the current page is ever fetched; nothing is held between clicks
+        rows, self.total = await db.search_riddles(
+            self.query, limit=self.per_page, offset=self.current_page * self.per_page
+        )
+        self.update_buttons()
 
         embed = Embed(
-            title=f"📜 Submitted Riddles (Page {self.current_page + 1}/{self.total_pages})",
+            title=f"🔎 Riddles matching \"{self.query}\" (Page {self.current_page + 1}/{self.total_pages})",
             color=discord.Color.blurple()
         )
+        if not rows:
+            embed.description = "No riddles matched your search."
+            return embed
 
-        for riddle in page_riddles:
+        embed.set_footer(text=f"{self.total} match(es). Use /removeriddle with the riddle number to remove one.")
+        for riddle in rows:
             submitter = self.client.get_user(int(riddle["user_id"]))
             submitter_name = submitter.display_name if submitter else f"User ID {riddle['user_id']}"
+            status = "Posted" if riddle["posted_at"] else "Unposted"
             embed.add_field(
-                name=f"🧩 Riddle #{riddle['riddle_id']}",
+                name=f"🧩 Riddle #{riddle['riddle_id']} ({status})",
                 value=f"**Question:** {riddle['question']}\n**Answer:** ||{riddle['answer']}||\n_Submitted by: {submitter_name}_",
                 inline=False
             )